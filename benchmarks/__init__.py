@@ -0,0 +1,71 @@
+"""Benchmarks for the controller hot paths and the ingest pipeline.
+
+Every benchmark produces one result dict keyed by a dotted name, with
+us_per_op as the figure compared against a baseline (lower is better)
+plus whatever context helps read it (payload sizes, rows per second).
+Controller numbers are CPython timings of the unmodified firmware code
+running under the simulator: they are for comparing two revisions on
+the same host, not a prediction of Pico timings.
+
+    python3 -m benchmarks.run --output bench.json
+    python3 -m benchmarks.run --baseline bench.json --dsn postgresql://localhost/bench
+"""
+
+import time
+
+
+def measure(function, number, repeat=5, **extra):
+    """Time number calls of function, best of repeat runs.
+
+    Returns:
+        A result dict with us_per_op, ops_per_s and any extra fields
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return result(best, number, **extra)
+
+
+def result(elapsed, operations, **extra):
+    """Build a result dict from a wall time and an operation count."""
+    per_op = elapsed / operations if operations else 0.0
+    return dict(
+        us_per_op=round(per_op * 1e6, 4),
+        ops_per_s=round(1 / per_op, 1) if per_op else None,
+        **extra,
+    )
+
+
+def compare(results, baseline, tolerance=0.20):
+    """Compare us_per_op of every result present in both runs.
+
+    A benchmark more than tolerance (as a fraction) slower than the
+    baseline is a regression; more than tolerance faster an improvement.
+
+    Returns:
+        Dict of name -> {baseline_us, us, change, status}
+    """
+    comparison = {}
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if not previous or not previous.get("us_per_op") or current.get("us_per_op") is None:
+            continue
+        change = current["us_per_op"] / previous["us_per_op"] - 1
+        if change > tolerance:
+            status = "regression"
+        elif change < -tolerance:
+            status = "improvement"
+        else:
+            status = "ok"
+        comparison[name] = {
+            "baseline_us": previous["us_per_op"],
+            "us": current["us_per_op"],
+            "change": round(change, 4),
+            "status": status,
+        }
+    return comparison
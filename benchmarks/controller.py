@@ -0,0 +1,179 @@
+"""Controller hot paths, timed under the simulator.
+
+Covers sensor decode, telemetry encoding, publish batching, scheduler
+dispatch, control engine ticks and .env parsing, each on the same code
+the Pico runs.
+"""
+
+import os
+
+import simulator
+from simulator import AHT21Model
+
+from . import measure
+
+SAMPLE = {
+    "device": "SOUTH_RACK_BARLEY",
+    "status": "active",
+    "timestamp": 1767225600,
+    "temperature": 22.41,
+    "humidity": 58.73,
+    "supply_pump": 1,
+    "salt_pump": 0,
+    "light": 1,
+}
+
+
+def bench_sensor(sim, number):
+    from machine import I2C
+    from periphials import AHT21
+
+    model = sim.add_i2c_device(1, 0x38, AHT21Model(sim.clock, 22.41, 58.73))
+    sensor = AHT21(I2C(1), 0x38)
+    model.write(b"\xAC\x33\x00")
+    sim.clock.sleep_ms(model.conversion_ms)
+    frame = bytearray(model.read(7))
+    data = bytes(frame[:6])
+
+    def decode_float():
+        sensor.get_temperature(data)
+        sensor.get_humidity(data)
+
+    return {
+        "sensor.aht21_decode_fixed": measure(lambda: sensor.decode_fixed(frame), number),
+        "sensor.aht21_decode_float": measure(decode_float, number),
+    }
+
+
+def bench_encoding(number):
+    import ujson
+    import telemetry_frame
+
+    encoder = telemetry_frame.FrameEncoder(1)
+    metrics = (
+        (telemetry_frame.TEMPERATURE, 2241),
+        (telemetry_frame.HUMIDITY, 5873),
+        (telemetry_frame.SUPPLY_PUMP, 100),
+        (telemetry_frame.SALT_PUMP, 0),
+        (telemetry_frame.LIGHT, 100),
+    )
+    return {
+        "encode.json": measure(
+            lambda: ujson.dumps(SAMPLE), number, payload_bytes=len(ujson.dumps(SAMPLE))
+        ),
+        "encode.frame": measure(
+            lambda: encoder.pack(SAMPLE["timestamp"], metrics), number,
+            payload_bytes=len(encoder.pack(SAMPLE["timestamp"], metrics)),
+        ),
+    }
+
+
+def bench_publish(sim, number, batch_sizes=(1, 8, 32)):
+    import telemetry_frame
+    from mqtt_publisher import MQTTPublisher
+
+    payload = telemetry_frame.FrameEncoder(1).pack(SAMPLE["timestamp"], ((1, 2241), (2, 5873)))
+    topic = "home/garden/bench/status"
+    results = {}
+    for batch_size in batch_sizes:
+        publisher = MQTTPublisher(
+            "bench", "sim-broker", 1883, "sim", "sim",
+            max_queue=max(32, batch_size), batch_size=batch_size, flush_interval_ms=1 << 29,
+        )
+
+        def publish():
+            publisher.publish(topic, payload)
+
+        result = measure(publish, number)
+        publisher.disconnect()
+        result["flushes_per_message"] = round(1 / batch_size, 4)
+        results[f"publish.batch_{batch_size}"] = result
+        sim.bus.messages.clear()
+    return results
+
+
+def bench_scheduler(number, sizes=(10, 100, 1000)):
+    from scheduler import Scheduler
+
+    results = {}
+    for size in sizes:
+        scheduler = Scheduler()
+        for i in range(size):
+            # Spread due times over the period so the heap is reordered on every pass
+            scheduler.call_at(i * 1000 // size, lambda: None, period=1000)
+        now = [0]
+
+        def dispatch():
+            now[0] += 1000
+            scheduler.run_pending(now[0])
+
+        passes = max(1, number // size)
+        result = measure(dispatch, passes)
+        # Each pass dispatches every event once
+        result["us_per_op"] = round(result["us_per_op"] / size, 4)
+        result["ops_per_s"] = round(result["ops_per_s"] * size, 1)
+        result["events"] = size
+        results[f"scheduler.dispatch_{size}"] = result
+    return results
+
+
+def bench_control_engine(number):
+    import telemetry_frame
+    from control_core import ControlCore, RecordRing
+    from control_engine import ControlEngine, DoseLoop, DutyCap, PID, PulseLoop, RuleLoop
+    from periphials import I2CBusManager, Lights, Pump
+
+    control = ControlCore(
+        I2CBusManager(),
+        {telemetry_frame.SUPPLY_PUMP: Pump(1), telemetry_frame.SALT_PUMP: Pump(2), telemetry_frame.LIGHT: Lights(3)},
+        RecordRing(64),
+        RecordRing(16),
+    )
+    control.schedule_cycle(telemetry_frame.SUPPLY_PUMP, 5000, 600000, 600000)
+    engine = ControlEngine(control, budget_us=1 << 29)
+    engine.add(PulseLoop(
+        control, telemetry_frame.SUPPLY_PUMP, telemetry_frame.HUMIDITY,
+        PID(kp=10000, ki=10, kd=0, setpoint=6500, out_min=1000, out_max=15000, bias=5000, rate=33),
+        max_duty_permille=50,
+    ))
+    engine.add(DoseLoop(control, telemetry_frame.SALT_PUMP, telemetry_frame.SUPPLY_PUMP, 40,
+                        cap=DutyCap(10, 3600000)))
+    engine.add(RuleLoop(control, telemetry_frame.LIGHT, telemetry_frame.TEMPERATURE, high=3000, low=2800))
+    now = [0]
+
+    def tick():
+        # A fresh reading each round so the PID does its full update
+        now[0] += 10000
+        control._reading(telemetry_frame.HUMIDITY, 6400 + now[0] // 10000 % 200, now[0])
+        control._reading(telemetry_frame.TEMPERATURE, 2200, now[0])
+        engine.tick(now[0])
+
+    return {"control.engine_tick": measure(tick, number, loops=len(engine.loops))}
+
+
+def bench_load_env(sim, number):
+    from utils import load_env
+
+    path = os.path.join(sim.workdir, "bench.env")
+    with open(path, "w") as f:
+        f.write("# Benchmark configuration\n")
+        for key in ("MQTT_SERVER", "MQTT_PORT", "MQTT_USER", "MQTT_PASSWORD",
+                    "WIFI_SSID", "WIFI_PASSWORD", "DEVICE_ID", "TELEMETRY_FORMAT"):
+            f.write(f"{key}='value-for-{key.lower()}'\n")
+    return {"config.load_env": measure(lambda: load_env(path), max(1, number // 10))}
+
+
+def run(number=20000):
+    """Run every controller benchmark and return the results by name."""
+    sim = simulator.install()
+    try:
+        results = {}
+        results.update(bench_sensor(sim, number))
+        results.update(bench_encoding(number))
+        results.update(bench_publish(sim, number))
+        results.update(bench_scheduler(number))
+        results.update(bench_control_engine(number))
+        results.update(bench_load_env(sim, number))
+        return results
+    finally:
+        simulator.uninstall()
@@ -0,0 +1,132 @@
+"""Ingest pipeline throughput for 1 to 500 simulated racks.
+
+Decode benchmarks need only the standard library. The insert benchmark
+pushes every rack's messages through decode_payload() and the ingest
+daemon's BatchWriter into a real Postgres (pass --dsn), so it measures
+the same COPY path and batch sizes the daemon uses. Rows are written
+under bench-rack-* device names and deleted afterwards.
+"""
+
+import os
+import queue
+import sys
+import time
+
+from . import measure, result
+
+TELEMETRY_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "telemetry_db")
+BENCH_DEVICE = "bench-rack-"
+
+
+def _server_path():
+    if TELEMETRY_DB not in sys.path:
+        sys.path.insert(0, TELEMETRY_DB)
+
+
+def rack_messages(racks, samples, start=None, interval=10, boot=0):
+    """Build samples binary frames per rack, interleaved as a broker would deliver them.
+
+    A fresh boot id per run keeps its messages apart from an earlier
+    run's in the dedup tracker and the readings unique index.
+
+    Returns:
+        List of (topic, payload) pairs
+    """
+    _server_path()
+    from telemetry_frame import encode_frame
+
+    start = int(start if start is not None else time.time() - samples * interval)
+    messages = []
+    for sample in range(samples):
+        for rack in range(racks):
+            metrics = {
+                "temperature": 20 + (rack % 50) / 10,
+                "humidity": 55 + sample % 10,
+                "supply_pump": sample % 2,
+                "salt_pump": 0,
+                "light": 1,
+                "rssi": -60,
+            }
+            messages.append((
+                f"home/garden/{BENCH_DEVICE}{rack:03d}/status",
+                encode_frame(rack + 1, sample + 1, start + sample * interval, metrics, boot=boot),
+            ))
+    return messages
+
+
+def bench_decode(number):
+    _server_path()
+    import json
+    from telemetry_frame import decode_frame
+
+    topic, frame = rack_messages(1, 1)[0]
+    text = json.dumps({"device": "bench", "timestamp": 1767225600, "temperature": 22.41,
+                       "humidity": 58.73, "supply_pump": 1, "salt_pump": 0, "light": 1}).encode()
+    results = {
+        "ingest.decode_frame": measure(lambda: decode_frame(frame), number),
+        "ingest.decode_json": measure(lambda: json.loads(text), number),
+    }
+    try:
+        from ingest import decode_payload
+    except ImportError as e:
+        print(f"Skipping decode_payload benchmark: {e}", file=sys.stderr)
+        return results
+    results["ingest.decode_payload"] = measure(lambda: decode_payload(topic, frame), number)
+    return results
+
+
+def bench_insert(dsn, rack_counts=(1, 10, 100, 500), samples=20, batch_size=1000, pool_size=2):
+    """Time decode plus COPY of samples messages from each rack count.
+
+    Returns:
+        Results keyed ingest.insert_<racks>_racks, with us_per_op per
+        message and the rows per second reached
+    """
+    _server_path()
+    from psycopg_pool import ConnectionPool
+
+    from ingest import BatchWriter, IngestMetrics, decode_payload
+    from rollups import create_rollups
+    from schema import READINGS_TABLE, create_schema
+
+    results = {}
+    with ConnectionPool(dsn, min_size=1, max_size=pool_size, open=True) as pool:
+        with pool.connection() as conn:
+            create_schema(conn)
+            create_rollups(conn)
+        for racks in rack_counts:
+            messages = rack_messages(racks, samples)
+            metrics = IngestMetrics()
+            rows = queue.Queue(maxsize=20000)
+            writer = BatchWriter(pool, rows, metrics, batch_size, batch_interval=0.1)
+            started = time.perf_counter()
+            writer.start()
+            for topic, payload in messages:
+                received = time.monotonic()
+                for row in decode_payload(topic, payload):
+                    rows.put((received, row))
+            writer.stop()
+            writer.join()
+            elapsed = time.perf_counter() - started
+            snapshot = metrics.snapshot()
+            results[f"ingest.insert_{racks}_racks"] = result(
+                elapsed, len(messages),
+                racks=racks,
+                messages=len(messages),
+                rows=snapshot["rows"],
+                rows_per_s=round(snapshot["rows"] / elapsed, 1),
+                batches=snapshot["batches"],
+                max_lag_ms=snapshot["max_lag_ms"],
+                write_errors=snapshot["write_errors"],
+            )
+            with pool.connection() as conn:
+                conn.execute(f"DELETE FROM {READINGS_TABLE} WHERE device LIKE %s", (BENCH_DEVICE + "%",))
+    return results
+
+
+def run(number=20000, dsn=None, rack_counts=(1, 10, 100, 500), samples=20):
+    """Run the decode benchmarks, plus the insert benchmark when dsn is set."""
+    results = bench_decode(number)
+    if dsn:
+        results.update(bench_insert(dsn, rack_counts, samples))
+    return results
@@ -0,0 +1,135 @@
+"""End-to-end ingest throughput against 1 to N worker processes.
+
+Starts ingest.py with --workers N against a real broker and Postgres,
+publishes bench-rack-* frames from several publisher processes at QoS 1
+and times how long it takes until every row is in the readings table.
+Each run uses a fresh boot id, so nothing is dropped as a duplicate of
+an earlier run. On a host with a local broker and database the rows per
+second should grow close to linearly with the worker count until the
+cores, the broker or the publishers run out; publish_rows_per_s shows
+when the publishers are the limit.
+
+Needs paho-mqtt, psycopg and psycopg_pool, a broker on --mqtt-host and
+a database on --dsn. Rows and sequence counters are deleted afterwards.
+"""
+
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from . import result
+from .ingest import BENCH_DEVICE, TELEMETRY_DB, _server_path, rack_messages
+
+METRICS_PER_MESSAGE = 6  # As built by rack_messages()
+
+
+def _publish(host, port, messages, counter):
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.max_inflight_messages_set(1000)
+    client.connect(host, port)
+    client.loop_start()
+    infos = [client.publish(topic, payload, qos=1) for topic, payload in messages]
+    for info in infos:
+        info.wait_for_publish()
+    with counter.get_lock():
+        counter.value += len(messages)
+    client.disconnect()
+    client.loop_stop()
+
+
+def _count_rows(conn, boot):
+    from schema import READINGS_TABLE
+
+    return conn.execute(
+        f"SELECT count(*) FROM {READINGS_TABLE} WHERE device LIKE %s AND boot = %s",
+        (BENCH_DEVICE + "%", boot),
+    ).fetchone()[0]
+
+
+def _start_ingest(dsn, mqtt_host, mqtt_port, workers, shard_mode, client_id):
+    return subprocess.Popen(
+        [sys.executable, os.path.join(TELEMETRY_DB, "ingest.py"),
+         "--dsn", dsn, "--mqtt-host", mqtt_host, "--mqtt-port", str(mqtt_port),
+         "--client-id", client_id, "--workers", str(workers), "--shard-mode", shard_mode,
+         "--share-group", client_id, "--batch-interval", "0.2", "--report-interval", "3600"],
+        cwd=TELEMETRY_DB, stdout=subprocess.DEVNULL,
+    )
+
+
+def bench_load(dsn, mqtt_host, mqtt_port=1883, worker_counts=(1, 2, 4, 8), racks=200, samples=50,
+               publishers=4, shard_mode="hash", startup=3.0, timeout=300.0):
+    """Time racks * samples messages through the ingest daemon at each worker count.
+
+    Returns:
+        Results keyed ingest.load_<workers>_workers, with us_per_op per
+        message, rows per second and the speedup over the first count
+    """
+    _server_path()
+    import psycopg
+
+    from schema import READINGS_TABLE
+    from sequences import SEQUENCES_TABLE
+
+    results = {}
+    first_rate = None
+    expected = racks * samples * METRICS_PER_MESSAGE
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        for workers in worker_counts:
+            boot = int(time.time()) & 0xFFFF
+            client_id = f"bench-ingest-{os.getpid()}-{workers}"
+            ingest = _start_ingest(dsn, mqtt_host, mqtt_port, workers, shard_mode, client_id)
+            try:
+                time.sleep(startup)  # Let every worker connect and subscribe
+                messages = rack_messages(racks, samples, boot=boot)
+                published = multiprocessing.Value("i", 0)
+                senders = [
+                    multiprocessing.Process(
+                        target=_publish, args=(mqtt_host, mqtt_port, messages[i::publishers], published)
+                    )
+                    for i in range(publishers)
+                ]
+                started = time.perf_counter()
+                for sender in senders:
+                    sender.start()
+                for sender in senders:
+                    sender.join()
+                publish_elapsed = time.perf_counter() - started
+                rows = _count_rows(conn, boot)
+                while rows < expected and time.perf_counter() - started < timeout:
+                    time.sleep(0.1)
+                    rows = _count_rows(conn, boot)
+                elapsed = time.perf_counter() - started
+            finally:
+                ingest.send_signal(signal.SIGINT)
+                try:
+                    ingest.wait(60)
+                except subprocess.TimeoutExpired:
+                    ingest.kill()
+            if rows < expected:
+                print(f"{workers} workers stored {rows} of {expected} rows in {timeout} s", file=sys.stderr)
+            rate = rows / elapsed
+            if first_rate is None:
+                first_rate = rate
+            speedup = rate / first_rate if first_rate else 0.0
+            results[f"ingest.load_{workers}_workers"] = result(
+                elapsed, len(messages),
+                workers=workers,
+                shard_mode=shard_mode,
+                racks=racks,
+                messages=len(messages),
+                publishers=publishers,
+                rows=rows,
+                rows_per_s=round(rate, 1),
+                publish_rows_per_s=round(len(messages) * METRICS_PER_MESSAGE / publish_elapsed, 1),
+                speedup=round(speedup, 2),
+                efficiency=round(speedup / (workers / worker_counts[0]), 2),
+            )
+            conn.execute(f"DELETE FROM {READINGS_TABLE} WHERE device LIKE %s", (BENCH_DEVICE + "%",))
+            conn.execute(f"DELETE FROM {SEQUENCES_TABLE} WHERE device LIKE %s", (BENCH_DEVICE + "%",))
+            time.sleep(1)  # Next run gets a different boot id
+    return results
@@ -0,0 +1,98 @@
+"""Run the benchmark suite and print or save the results as JSON.
+
+    python3 -m benchmarks.run --output baseline.json
+    python3 -m benchmarks.run --baseline baseline.json --fail-on-regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from . import compare, controller, ingest, ingest_load
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suite", choices=("all", "controller", "ingest", "load"), default="all",
+                        help="load (multi-worker ingest against a broker) only runs when asked for")
+    parser.add_argument("--number", type=int, default=20000, help="calls per timing run")
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="Postgres for the insert benchmark; skipped when unset")
+    parser.add_argument("--racks", default="1,10,100,500", help="comma separated rack counts")
+    parser.add_argument("--samples", type=int, default=20, help="messages per rack")
+    parser.add_argument("--mqtt-host", default=os.environ.get("BENCH_MQTT_HOST", "localhost"),
+                        help="broker for the load benchmark")
+    parser.add_argument("--mqtt-port", type=int, default=1883)
+    parser.add_argument("--workers", default="1,2,4,8", help="comma separated ingest worker counts")
+    parser.add_argument("--publishers", type=int, default=4, help="load generator processes")
+    parser.add_argument("--shard-mode", choices=("hash", "share"), default="hash")
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against a previous results file")
+    parser.add_argument("--tolerance", type=float, default=0.20,
+                        help="fractional slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    if args.suite in ("all", "controller"):
+        results.update(controller.run(args.number))
+    if args.suite in ("all", "ingest"):
+        rack_counts = tuple(int(racks) for racks in args.racks.split(","))
+        results.update(ingest.run(args.number, args.dsn, rack_counts, args.samples))
+    if args.suite == "load":
+        if not args.dsn:
+            parser.error("the load suite needs --dsn or BENCH_DATABASE_URL")
+        worker_counts = tuple(int(workers) for workers in args.workers.split(","))
+        racks = max(int(racks) for racks in args.racks.split(","))
+        results.update(ingest_load.bench_load(
+            args.dsn, args.mqtt_host, args.mqtt_port, worker_counts, racks, args.samples,
+            args.publishers, args.shard_mode,
+        ))
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "number": args.number,
+        },
+        "results": results,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline"] = baseline.get("meta", {})
+        report["comparison"] = compare(results, baseline.get("results", {}), args.tolerance)
+        regressions = [name for name, row in report["comparison"].items() if row["status"] == "regression"]
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    for name in regressions:
+        row = report["comparison"][name]
+        print(f"Regression: {name} {row['baseline_us']} -> {row['us']} us/op ({row['change']:+.1%})",
+              file=sys.stderr)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
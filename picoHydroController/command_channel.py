@@ -0,0 +1,217 @@
+import time
+import ujson as json
+
+from control_core import ACK, COMMAND, COMMAND_OFF, COMMAND_ON, MAX_COMMAND_MS, UNSCHEDULE
+
+
+class CommandChannel:
+    """
+    Remote device control over MQTT.
+
+    Commands arrive on <prefix>/cmd/<device>, where device is a name such
+    as supply_pump. The payload is either "on"/"off" or a JSON object:
+
+        {"action": "run", "duration_ms": 5000, "id": 17}
+        {"action": "schedule", "duration_ms": 5000, "period_ms": 600000}
+        {"action": "unschedule"}
+
+    Each command is stamped with its receipt tick and pushed onto the
+    control loop's command ring; the loop acknowledges it on its own ack
+    ring once it has been applied, and an ack with the command id and the
+    receipt-to-actuation latency is published on <prefix>/ack. Nothing
+    here blocks: messages are fetched with check_msg() from the main loop,
+    and acks are only flushed straight away while Wi-Fi is up.
+
+    "on" leaves lights on until "off", but a pump only for the control
+    loop's max_pump_on_ms. Runs and schedules are refused past max_run_ms
+    for the device, and past MAX_COMMAND_MS for any device.
+    """
+    ACTIONS = ("on", "off", "run", "schedule", "unschedule")
+
+    def __init__(self, publisher, commands, devices: dict, prefix: str,
+                 max_pending: int = 8, ack_timeout_ms: int = 2000, budget_ms: int = 100, wifi=None,
+                 max_run_ms: dict = None):
+        """
+        Initialize the channel without subscribing.
+
+        Args:
+            publisher: MQTTPublisher whose connection carries the commands
+            commands: RecordRing the control loop reads commands from
+            devices: Device name (e.g. "supply_pump") -> device id on the ring
+            prefix: Per-rack topic prefix, e.g. home/garden/south_rack_barley
+            max_pending: Commands awaiting an ack before new ones are refused
+            ack_timeout_ms: Time after which an unacknowledged command fails
+            budget_ms: Receipt-to-actuation latency target; slower commands
+                are counted in over_budget
+            wifi: WiFiManager whose link gates the immediate ack flush; a
+                flush while it is down would block on the MQTT connect
+            max_run_ms: Device name -> longest run a command may ask for,
+                e.g. the pumps' max_pump_on_ms
+        """
+        self.publisher = publisher
+        self.wifi = wifi
+        self.commands = commands
+        self.devices = devices
+        self.names = {code: name for name, code in devices.items()}
+        self.max_run_ms = max_run_ms or {}
+        self.topic = prefix + "/cmd/+"
+        self.ack_topic = prefix + "/ack"
+        self.max_pending = max_pending
+        self.ack_timeout_ms = ack_timeout_ms
+        self.budget_ms = budget_ms
+        self.pending = []  # [receipt ticks, device id, command id, action], oldest first
+
+        # Counters
+        self.received = 0
+        self.rejected = 0
+        self.acked = 0
+        self.timeouts = 0
+        self.last_latency_ms = 0
+        self.max_latency_ms = 0
+        self.over_budget = 0
+
+    def start(self) -> None:
+        """
+        Subscribe to this rack's command topics.
+        """
+        self.publisher.subscribe(self.topic, self._on_message)
+
+    def _parse(self, payload) -> dict:
+        text = payload.decode() if isinstance(payload, (bytes, bytearray)) else payload
+        text = text.strip()
+        if text in ("on", "off"):
+            return {"action": text}
+        command = json.loads(text)
+        if not isinstance(command, dict):
+            raise ValueError("command must be a JSON object")
+        return command
+
+    def _on_message(self, topic: str, payload) -> None:
+        received = time.ticks_ms()
+        self.received += 1
+        name = topic[topic.rfind("/") + 1:]
+        command_id = None
+        action = None
+        try:
+            command = self._parse(payload)
+            command_id = command.get("id")
+            action = command.get("action")
+            code = self.devices.get(name)
+            if code is None:
+                raise ValueError("unknown device")
+            if action not in self.ACTIONS:
+                raise ValueError("unknown action")
+            value, arg = self._encode(action, command, self.max_run_ms.get(name, MAX_COMMAND_MS))
+        except (ValueError, TypeError) as e:
+            self._reject(name, command_id, action, str(e) or "bad command")
+            return
+        if len(self.pending) >= self.max_pending:
+            self._reject(name, command_id, action, "busy")
+            return
+        if not self.commands.push(COMMAND, code, value, arg, received):
+            self._reject(name, command_id, action, "busy")
+            return
+        self.pending.append([received, code, command_id, action])
+
+    def _encode(self, action: str, command: dict, max_run_ms: int = MAX_COMMAND_MS) -> tuple:
+        """
+        Turn a command into the (value, arg) pair carried on the ring.
+
+        Durations and periods are bounded here, so a command the control
+        loop could not apply is refused with an ack instead of failing there.
+        """
+        if action == "on":
+            return COMMAND_ON, 0
+        if action == "off":
+            return COMMAND_OFF, 0
+        if action == "unschedule":
+            return COMMAND_OFF, UNSCHEDULE
+        duration_ms = int(command.get("duration_ms") or 0)
+        if duration_ms <= 0:
+            raise ValueError("duration_ms must be positive")
+        if duration_ms > min(max_run_ms, MAX_COMMAND_MS):
+            raise ValueError("duration_ms too long")
+        if action == "run":
+            return duration_ms, 0
+        period_ms = int(command.get("period_ms") or 0)
+        if period_ms <= duration_ms:
+            raise ValueError("period_ms must exceed duration_ms")
+        if period_ms > MAX_COMMAND_MS:
+            raise ValueError("period_ms too long")
+        return duration_ms, period_ms
+
+    def _reject(self, name: str, command_id, action, error: str) -> None:
+        self.rejected += 1
+        self._publish_ack({"id": command_id, "device": name, "action": action, "ok": False, "error": error})
+
+    def _publish_ack(self, ack: dict) -> None:
+        # Acks go out straight away instead of waiting for the next batch,
+        # unless the link is down; then they wait in the queue like telemetry
+        self.publisher.publish(self.ack_topic, ack)
+        if self.wifi is None or self.wifi.is_connected():
+            self.publisher.flush()
+
+    def handle_record(self, record) -> bool:
+        """
+        Publish the ack for an ACK record drained from the ack ring.
+
+        Args:
+            record: (kind, code, value, arg, ticks) from RecordRing.pop()
+
+        Returns:
+            True if the record was an ack
+        """
+        kind, code, latency_ms, applied, ticks = record
+        if kind != ACK:
+            return False
+        for i, entry in enumerate(self.pending):
+            if entry[0] == ticks and entry[1] == code:
+                del self.pending[i]
+                break
+        else:
+            return True  # Already timed out
+        self.acked += 1
+        self.last_latency_ms = latency_ms
+        if latency_ms > self.max_latency_ms:
+            self.max_latency_ms = latency_ms
+        if latency_ms > self.budget_ms:
+            self.over_budget += 1
+        self._publish_ack({
+            "id": entry[2],
+            "device": self.names.get(code),
+            "action": entry[3],
+            "ok": bool(applied),
+            "latency_ms": latency_ms,
+        })
+        return True
+
+    def expire(self) -> None:
+        """
+        Fail commands the control loop has not acknowledged in time.
+        """
+        now = time.ticks_ms()
+        while self.pending and time.ticks_diff(now, self.pending[0][0]) >= self.ack_timeout_ms:
+            received, code, command_id, action = self.pending.pop(0)
+            self.timeouts += 1
+            self._publish_ack({
+                "id": command_id, "device": self.names.get(code), "action": action,
+                "ok": False, "error": "timeout",
+            })
+
+    def stats(self) -> dict:
+        """
+        Get the command counters.
+
+        Returns:
+            Dict of command counts and latencies
+        """
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "acked": self.acked,
+            "timeouts": self.timeouts,
+            "pending": len(self.pending),
+            "last_latency_ms": self.last_latency_ms,
+            "max_latency_ms": self.max_latency_ms,
+            "over_budget": self.over_budget,
+        }
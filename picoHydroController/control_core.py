@@ -0,0 +1,464 @@
+import struct
+import time
+import _thread
+
+from scheduler import Scheduler
+import telemetry_frame
+
+
+# Record layout shared by both rings, little-endian:
+#
+#   kind    B   TELEMETRY, COMMAND or ACK
+#   code    B   telemetry_frame metric id; for commands the id of the device
+#   value   i   fixed-point reading (value / 100), or a command argument
+#   arg     i   second command argument, 0 for telemetry
+#   ticks   I   ticks_ms when the record was written; an ACK carries the
+#               ticks of the command it acknowledges
+RECORD_FORMAT = "<BBiiI"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+TELEMETRY = 1
+COMMAND = 2
+ACK = 3  # value is the command-to-actuation latency in ms, arg 1 if applied
+
+# Command values: run for value ms when positive, otherwise these
+COMMAND_OFF = 0
+COMMAND_ON = -1  # Stay on until an off command; pumps are still cut off after max_pump_on_ms
+# Command arg: a positive arg makes the command a schedule of a value ms
+# run every arg ms; UNSCHEDULE cancels the device's schedule
+UNSCHEDULE = -1
+# Longest run or period a command may carry: time.ticks_add() only takes
+# offsets below half the 2**30 ticks period
+MAX_COMMAND_MS = 2**29 - 1
+
+
+class RecordRing:
+    """
+    Lock-protected single-producer/single-consumer ring of fixed-size records.
+
+    Records are packed into one preallocated bytearray, so pushing never
+    allocates and is safe from the core 1 loop. The lock is held only for
+    the pack/unpack and index update, a few microseconds, so neither core
+    can stall the other for longer than that.
+    """
+    def __init__(self, slots: int = 32):
+        """
+        Initialize an empty ring.
+
+        Args:
+            slots: Number of records the ring holds
+        """
+        self.slots = slots
+        self.buf = bytearray(slots * RECORD_SIZE)
+        self.lock = _thread.allocate_lock()
+        self.head = 0  # Next slot to read
+        self.count = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def push(self, kind: int, code: int, value: int, arg: int = 0, ticks: int = None) -> bool:
+        """
+        Append a record. A full ring drops the new record, never an old one.
+
+        Args:
+            kind: TELEMETRY or COMMAND
+            code: Metric or device id
+            value: Fixed-point reading or command argument
+            arg: Second command argument
+            ticks: ticks_ms stamp (read from the clock if omitted)
+
+        Returns:
+            True if the record was stored
+        """
+        if ticks is None:
+            ticks = time.ticks_ms()
+        with self.lock:
+            if self.count == self.slots:
+                self.dropped += 1
+                return False
+            slot = (self.head + self.count) % self.slots
+            struct.pack_into(RECORD_FORMAT, self.buf, slot * RECORD_SIZE, kind, code, value, arg, ticks)
+            self.count += 1
+            if self.count > self.high_water:
+                self.high_water = self.count
+        return True
+
+    def pop(self):
+        """
+        Remove the oldest record.
+
+        Returns:
+            (kind, code, value, arg, ticks), or None when the ring is empty
+        """
+        with self.lock:
+            if not self.count:
+                return None
+            record = struct.unpack_from(RECORD_FORMAT, self.buf, self.head * RECORD_SIZE)
+            self.head = (self.head + 1) % self.slots
+            self.count -= 1
+        return record
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class ControlCore:
+    """
+    Sensing and actuation loop that can run alone on the second core.
+
+    The loop owns the sensor polling and the device schedules. It talks
+    to the networking side only through two RecordRings: readings go out
+    on telemetry, device commands come in on commands. Nothing on this
+    side waits on Wi-Fi, MQTT or time sync, so pump cutoffs and commands
+    keep their timing through network stalls.
+
+    In single-core mode the same object shares the main loop's scheduler
+    and main() calls step() after each run_pending().
+    """
+    def __init__(self, sensors, devices: dict, telemetry: RecordRing, commands: RecordRing,
+                 scheduler: Scheduler = None, command_poll_ms: int = 20, max_pump_on_ms: int = 300000,
+                 acks: RecordRing = None):
+        """
+        Initialize the control loop without starting it.
+
+        Args:
+            sensors: I2CBusManager holding the sensors to poll
+            devices: Metric id (telemetry_frame.SUPPLY_PUMP etc.) -> the
+                DeviceController reported and commanded under that id
+            telemetry: Ring readings are pushed to
+            commands: Ring commands are read from
+            scheduler: Scheduler to share; a private one is created if omitted
+            command_poll_ms: Longest the loop sleeps before checking for commands
+            max_pump_on_ms: Cutoff armed by an open-ended "on" command to a
+                pump, so a lost "off" cannot leave it running
+            acks: Ring command acks are written to; defaults to telemetry,
+                where a backlog of readings can crowd them out
+        """
+        self.sensors = sensors
+        self.devices = devices
+        self.telemetry = telemetry
+        self.commands = commands
+        self.acks = acks if acks is not None else telemetry
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.command_poll_ms = command_poll_ms
+        self.max_pump_on_ms = max_pump_on_ms
+        self.running = False
+        self._reads = []  # Per-sensor read counts at the last collect
+        self._pumps = [device for device in devices.values() if hasattr(device, "enforce_deadline")]
+        self.cycles = {}  # Device id -> recurring Event from schedule_cycle()
+        self.plans = {}  # Device id -> (duration_ms, period_ms) of its cycle
+        self.inhibited = {}  # Device id -> True while automatic runs are held off
+        self.on_ms = {code: 0 for code in devices}  # Run time started by cycles, start_run() and commands
+        self.readings = {}  # Metric id -> latest fixed-point reading
+        self.readings_at = {}  # Metric id -> ticks_ms of that reading
+        self.after_collect = None  # Called with the ticks of each sensor round
+        self.sample_event = None  # Recurring sensor round from start_sampling()
+        self.sample_interval_ms = 0  # Interval step() keeps sample_event at
+        self._poll = None
+
+        # Counters
+        self.rounds = 0
+        self.commands_applied = 0
+        self.max_command_latency_ms = 0
+        self.late_cutoffs = 0
+
+    def start_sampling(self, interval_ms: int = 10000):
+        """
+        Poll every sensor on the control scheduler and report each round.
+
+        Args:
+            interval_ms: Milliseconds between polling rounds
+
+        Returns:
+            The recurring Event
+        """
+        scheduler = self.scheduler
+
+        def poll():
+            if self.sensors.collecting:
+                return  # Previous round still converting
+            scheduler.call_later(self.sensors.trigger_all(), self._collect)
+        self._poll = poll
+        self.sample_interval_ms = interval_ms
+        self.sample_event = scheduler.call_every(interval_ms, poll, 0)
+        return self.sample_event
+
+    def set_sample_interval(self, interval_ms: int) -> None:
+        """
+        Change the time between sensor rounds.
+
+        Only records the request; step() re-arms the round on the control
+        loop's own scheduler, so this is safe to call from the other core.
+
+        Args:
+            interval_ms: Milliseconds between polling rounds
+        """
+        self.sample_interval_ms = interval_ms
+
+    def _apply_sample_interval(self) -> None:
+        event = self.sample_event
+        interval_ms = self.sample_interval_ms
+        self.scheduler.cancel(event)
+        # Never wait longer than the round that was already due
+        first = min(interval_ms, max(0, time.ticks_diff(event.due, time.ticks_ms())))
+        self.sample_event = self.scheduler.call_every(interval_ms, self._poll, first)
+
+    def _collect(self) -> None:
+        sensors = self.sensors
+        sensors.collect_all()
+        now = time.ticks_ms()
+        push = self.telemetry.push
+        for i, sensor in enumerate(sensors.sensors):
+            if i == len(self._reads):
+                self._reads.append(0)
+            reads = sensors.stats[i]["reads"]
+            if reads == self._reads[i]:
+                continue  # No fresh reading from this sensor
+            self._reads[i] = reads
+            if hasattr(sensor, "temperature_c100"):
+                push(TELEMETRY, telemetry_frame.TEMPERATURE, sensor.temperature_c100, 0, now)
+                push(TELEMETRY, telemetry_frame.HUMIDITY, sensor.humidity_c100, 0, now)
+                self._reading(telemetry_frame.TEMPERATURE, sensor.temperature_c100, now)
+                self._reading(telemetry_frame.HUMIDITY, sensor.humidity_c100, now)
+        for code, device in self.devices.items():
+            push(TELEMETRY, code, telemetry_frame.SCALE if device.on else 0, 0, now)
+        self.rounds += 1
+        if self.after_collect is not None:
+            self.after_collect(now)
+
+    def _reading(self, metric: int, value: int, now: int) -> None:
+        self.readings[metric] = value
+        self.readings_at[metric] = now
+
+    def schedule_cycle(self, code: int, duration_ms: int, period_ms: int, first_delay_ms: int = 0):
+        """
+        Replace a device's recurring run, e.g. 5 s every 10 minutes.
+
+        Args:
+            code: Device id in devices
+            duration_ms: Milliseconds the device stays on each cycle
+            period_ms: Milliseconds between the start of each run
+            first_delay_ms: Milliseconds from now until the first run
+
+        Returns:
+            The recurring Event
+        """
+        self.unschedule(code)
+        self.devices[code].set_alarm(first_delay_ms)
+        # Each run reads its length from plans, so set_duration() applies from the next run
+        event = self.scheduler.call_every(period_ms, lambda: self._run_cycle(code), first_delay_ms)
+        self.cycles[code] = event
+        self.plans[code] = (duration_ms, period_ms)
+        return event
+
+    def _run_cycle(self, code: int) -> None:
+        duration_ms, period_ms = self.plans[code]
+        device = self.devices[code]
+        if duration_ms <= 0 or self.inhibited.get(code):
+            device.next_alarm = time.ticks_add(time.ticks_ms(), period_ms)
+            return
+        device._run_for(self.scheduler, duration_ms, period_ms)
+        self.on_ms[code] += duration_ms
+
+    def set_duration(self, code: int, duration_ms: int) -> bool:
+        """
+        Change the run length of a device's cycle, keeping its period and phase.
+
+        Returns:
+            False if the device has no cycle
+        """
+        plan = self.plans.get(code)
+        if plan is None:
+            return False
+        self.plans[code] = (duration_ms, plan[1])
+        return True
+
+    def start_run(self, code: int, duration_ms: int) -> bool:
+        """
+        Run a device once for duration_ms, unless it is inhibited.
+
+        Returns:
+            True if the run was started
+        """
+        if duration_ms <= 0 or self.inhibited.get(code):
+            return False
+        self.devices[code]._start_run(self.scheduler, duration_ms)
+        self.on_ms[code] += duration_ms
+        return True
+
+    def inhibit(self, code: int, hold: bool) -> None:
+        """
+        Hold a device off (switching it off now), or release it.
+
+        While held, its cycle skips runs and start_run() refuses to start one;
+        remote commands still apply.
+        """
+        self.inhibited[code] = hold
+        device = self.devices[code]
+        if hold and device.on:
+            device.device_off()
+
+    def unschedule(self, code: int) -> None:
+        """
+        Cancel a device's recurring run, if it has one.
+        """
+        event = self.cycles.pop(code, None)
+        self.plans.pop(code, None)
+        if event is not None:
+            self.scheduler.cancel(event)
+
+    def devices_on(self) -> bool:
+        """
+        Check whether any device is on.
+        """
+        for device in self.devices.values():
+            if device.on:
+                return True
+        return False
+
+    def next_cutoff(self, now: int = None):
+        """
+        Get the time until the earliest pump deadline.
+
+        Returns:
+            Milliseconds until the cutoff (0 if overdue), or None if no pump is running
+        """
+        if now is None:
+            now = time.ticks_ms()
+        wait = None
+        for pump in self._pumps:
+            if pump.on and pump.deadline:
+                remaining = max(0, time.ticks_diff(pump.deadline, now))
+                if wait is None or remaining < wait:
+                    wait = remaining
+        return wait
+
+    def snapshot(self) -> list:
+        """
+        Get the device cycles to carry across a deep sleep.
+
+        Returns:
+            List of [device id, duration ms, period ms, ms until the next run]
+        """
+        now = time.ticks_ms()
+        return [
+            [code, duration_ms, period_ms, max(0, time.ticks_diff(self.cycles[code].due, now))]
+            for code, (duration_ms, period_ms) in self.plans.items()
+        ]
+
+    def restore(self, cycles: list, slept_ms: int) -> None:
+        """
+        Re-create the cycles saved by snapshot(), keeping their phase.
+
+        Args:
+            cycles: Value returned by snapshot()
+            slept_ms: Time spent asleep since the snapshot
+        """
+        for code, duration_ms, period_ms, remaining_ms in cycles:
+            if code in self.devices:
+                self.schedule_cycle(code, duration_ms, period_ms, max(0, remaining_ms - slept_ms))
+
+    def _apply(self, code: int, device, value: int, arg: int) -> None:
+        if arg > 0:
+            self.schedule_cycle(code, value, arg)
+        elif arg == UNSCHEDULE:
+            self.unschedule(code)
+        elif value > 0:
+            device._start_run(self.scheduler, value)
+            self.on_ms[code] += value
+        elif value == COMMAND_ON:
+            if device in self._pumps:
+                # Same timer and deadline as a timed run, so the pump cannot be left on
+                device.device_on(self.max_pump_on_ms)
+                self.on_ms[code] += self.max_pump_on_ms
+            else:
+                device.device_on()
+        else:
+            device.device_off()
+
+    def apply_commands(self) -> int:
+        """
+        Apply every queued device command and acknowledge it on the ack ring.
+
+        Returns:
+            Number of commands applied
+        """
+        applied = 0
+        while True:
+            record = self.commands.pop()
+            if record is None:
+                break
+            kind, code, value, arg, ticks = record
+            if kind != COMMAND:
+                continue
+            device = self.devices.get(code)
+            ok = device is not None
+            if ok:
+                self._apply(code, device, value, arg)
+            latency = time.ticks_diff(time.ticks_ms(), ticks)
+            if latency > self.max_command_latency_ms:
+                self.max_command_latency_ms = latency
+            self.acks.push(ACK, code, latency, 1 if ok else 0, ticks)
+            applied += 1
+        self.commands_applied += applied
+        return applied
+
+    def enforce_cutoffs(self) -> None:
+        """
+        End any pump run that is past its deadline.
+
+        Backs up the pumps' hard machine.Timer interrupt, which is held
+        off while core 0 has interrupts masked, so a pump is never left on.
+        """
+        now = time.ticks_ms()
+        for pump in self._pumps:
+            if pump.enforce_deadline(now):
+                self.late_cutoffs += 1
+
+    def step(self) -> None:
+        """
+        Do the control work that is not on the scheduler: commands, cutoffs
+        and sampling interval changes.
+        """
+        if len(self.commands):
+            self.apply_commands()
+        self.enforce_cutoffs()
+        if self.sample_event is not None and self.sample_event.period != self.sample_interval_ms:
+            self._apply_sample_interval()
+
+    def run(self) -> None:
+        """
+        Run the control loop until stop() is called.
+        """
+        self.running = True
+        scheduler = self.scheduler
+        while self.running:
+            scheduler.run_pending()
+            self.step()
+            scheduler.sleep_until_next(self.command_poll_ms)
+
+    def start_thread(self) -> None:
+        """
+        Run the control loop on the second core.
+        """
+        _thread.start_new_thread(self.run, ())
+
+    def stop(self) -> None:
+        self.running = False
+
+    def stats(self) -> dict:
+        """
+        Get the control loop counters.
+
+        Returns:
+            Dict of rounds, command and ring counters
+        """
+        return {
+            "rounds": self.rounds,
+            "sample_interval_ms": self.sample_interval_ms,
+            "commands": self.commands_applied,
+            "max_command_latency_ms": self.max_command_latency_ms,
+            "late_cutoffs": self.late_cutoffs,
+            "telemetry_dropped": self.telemetry.dropped,
+            "telemetry_high_water": self.telemetry.high_water,
+            "commands_dropped": self.commands.dropped,
+        }
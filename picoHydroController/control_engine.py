@@ -0,0 +1,423 @@
+import time
+
+
+def clamp(value: int, low: int, high: int) -> int:
+    return low if value < low else high if value > high else value
+
+
+class PID:
+    """
+    Integer PID controller for fixed-point readings.
+
+    Everything is kept in integers so an update never allocates on the
+    Pico: the measurement is in telemetry fixed-point units (hundredths)
+    and the gains are scaled by `scale`, so kp=2000 with scale=1000 means
+    2 output units per unit of error.
+
+    The derivative acts on the measurement rather than the error, so a
+    setpoint change does not kick the output. The integral is only
+    accumulated while the output is not saturated in the direction of
+    the error (conditional integration) and is clamped to what the output
+    range can use, so it does not wind up while an actuator is held at
+    its limit. `rate` limits how far the output may move per second.
+    """
+    def __init__(self, kp: int, ki: int, kd: int, setpoint: int, out_min: int, out_max: int,
+                 bias: int = 0, rate: int = 0, reverse: bool = False, scale: int = 1000):
+        """
+        Initialize the controller with no history.
+
+        Args:
+            kp: Proportional gain, output units per `scale` units of error
+            ki: Integral gain, output units per `scale` unit-seconds of error
+            kd: Derivative gain, output units per `scale` units/s of change
+            setpoint: Target in measurement units
+            out_min: Lowest output
+            out_max: Highest output
+            bias: Output at zero error, e.g. the open-loop setting
+            rate: Largest output change per second, 0 for no limit
+            reverse: True when raising the output lowers the measurement
+            scale: Divisor applied to the gains
+        """
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.setpoint = setpoint
+        self.out_min = out_min
+        self.out_max = out_max
+        self.bias = bias
+        self.rate = rate
+        self.sign = -1 if reverse else 1
+        self.scale = scale
+        # Largest integral whose term still fits the output range
+        self.integral_max = (out_max - out_min) * scale // ki if ki else 0
+        self.integral = 0  # Error unit-seconds
+        self.last = None  # Previous measurement
+        self.output = None
+
+    def update(self, measurement: int, dt_ms: int) -> int:
+        """
+        Compute the output for a new measurement.
+
+        Args:
+            measurement: Latest reading in fixed-point units
+            dt_ms: Milliseconds since the previous update (0 on the first)
+
+        Returns:
+            Output clamped to [out_min, out_max] and rate limited
+        """
+        error = self.sign * (self.setpoint - measurement)
+        integral = clamp(self.integral + error * dt_ms // 1000, -self.integral_max, self.integral_max)
+        derivative = 0
+        if self.last is not None and dt_ms > 0:
+            derivative = -self.sign * (measurement - self.last) * 1000 // dt_ms
+        self.last = measurement
+        raw = self.bias + (self.kp * error + self.ki * integral + self.kd * derivative) // self.scale
+        output = clamp(raw, self.out_min, self.out_max)
+        # Anti-windup: don't integrate further into a limit the output is already at
+        if not ((raw > self.out_max and error > 0) or (raw < self.out_min and error < 0)):
+            self.integral = integral
+        if self.rate and self.output is not None:
+            step = self.rate * dt_ms // 1000
+            output = clamp(output, self.output - step, self.output + step)
+        self.output = output
+        return output
+
+    def reset(self) -> None:
+        self.integral = 0
+        self.last = None
+        self.output = None
+
+
+class DutyCap:
+    """
+    Token bucket limiting an actuator to a share of its running time.
+
+    Credit accrues at duty_permille ms per second, up to one window's
+    worth, and each run spends its duration. A pump capped at 20 per
+    mille over an hour can therefore run 72 s in one go, but no more
+    than that on average.
+    """
+    def __init__(self, duty_permille: int, window_ms: int):
+        """
+        Initialize a full bucket.
+
+        Args:
+            duty_permille: Longest on time per 1000 ms, on average
+            window_ms: Window the average is taken over
+        """
+        self.duty = duty_permille
+        self.capacity = window_ms * duty_permille // 1000
+        self.credit = self.capacity
+        self.refilled = time.ticks_ms()
+
+    def available(self, now: int = None) -> int:
+        """
+        Get the longest run allowed now, in ms.
+        """
+        if now is None:
+            now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self.refilled)
+        if elapsed > 0:
+            self.credit = min(self.capacity, self.credit + elapsed * self.duty // 1000)
+            self.refilled = now
+        return self.credit
+
+    def take(self, duration_ms: int) -> None:
+        self.credit -= duration_ms
+
+
+class PulseLoop:
+    """
+    Stretches or shortens a device's recurring run from a reading.
+
+    E.g. the supply pump's irrigation pulse lengthens while the humidity
+    over the trays is below target and shortens above it. The cycle's
+    period and phase are left alone, so remote schedule commands and deep
+    sleep carry on as before; only the run length changes. The PID output
+    is the run length in ms, capped at max_duty_permille of the period.
+    """
+    def __init__(self, control, code: int, metric: int, pid: PID, max_duty_permille: int = 1000):
+        """
+        Args:
+            control: ControlCore owning the device and its cycle
+            code: Device id whose cycle is adjusted
+            metric: telemetry_frame metric id of the controlled reading
+            pid: Controller whose output is the run length in ms
+            max_duty_permille: Longest run as a share of the cycle period
+        """
+        self.control = control
+        self.code = code
+        self.metric = metric
+        self.pid = pid
+        self.max_duty = max_duty_permille
+        self.seen = None  # ticks of the reading last used
+        self.output = 0
+        self.updates = 0
+
+    def update(self, now: int) -> None:
+        control = self.control
+        plan = control.plans.get(self.code)
+        at = control.readings_at.get(self.metric)
+        if plan is None or at is None or at == self.seen:
+            return  # No cycle to adjust, or no fresh reading
+        dt = time.ticks_diff(at, self.seen) if self.seen is not None else 0
+        self.seen = at
+        duration_ms = self.pid.update(control.readings[self.metric], dt)
+        duration_ms = min(duration_ms, plan[1] * self.max_duty // 1000)
+        if duration_ms != plan[0]:
+            control.set_duration(self.code, duration_ms)
+        self.output = duration_ms
+        self.updates += 1
+
+    def snapshot(self) -> list:
+        return [self.pid.integral, self.pid.last, self.pid.output]
+
+    def restore(self, saved: list, slept_ms: int) -> None:
+        self.pid.integral, self.pid.last, self.pid.output = saved
+
+    def stats(self) -> dict:
+        return {"out": self.output, "i": self.pid.integral, "updates": self.updates}
+
+
+class DoseLoop:
+    """
+    Doses one device in proportion to another's run time.
+
+    The salt pump is run for ratio_permille ms per second the supply pump
+    has run, which holds the feed at a target concentration without a
+    conductivity sensor. The owed dose is batched into runs of at least
+    min_dose_ms, no closer together than min_interval_ms and within the
+    duty cap, and never while the source device is running.
+    """
+    def __init__(self, control, code: int, source: int, ratio_permille: int, min_dose_ms: int = 250,
+                 max_dose_ms: int = 5000, min_interval_ms: int = 600000, cap: DutyCap = None):
+        """
+        Args:
+            control: ControlCore owning both devices
+            code: Device id of the dosing pump
+            source: Device id whose commanded run time is dosed against
+            ratio_permille: Dose ms per 1000 ms of source run time
+            min_dose_ms: Smallest run worth starting
+            max_dose_ms: Longest single run
+            min_interval_ms: Shortest time between the starts of two runs
+            cap: Optional DutyCap on the dosing pump
+        """
+        self.control = control
+        self.code = code
+        self.source = source
+        self.ratio = ratio_permille
+        self.min_dose_ms = min_dose_ms
+        self.max_dose_ms = max_dose_ms
+        self.min_interval_ms = min_interval_ms
+        self.cap = cap
+        self.seen = None  # Source run time already accounted for
+        self.owed = 0  # Dose ms not yet given
+        self.last_dose = None  # ticks_ms of the last run
+
+        # Counters
+        self.doses = 0
+        self.dosed_ms = 0
+        self.capped = 0
+
+    def update(self, now: int) -> None:
+        control = self.control
+        run_ms = control.on_ms[self.source]
+        if self.seen is None or run_ms < self.seen:
+            self.seen = run_ms
+        self.owed += (run_ms - self.seen) * self.ratio // 1000
+        self.seen = run_ms
+        if self.owed < self.min_dose_ms:
+            return
+        if self.last_dose is not None and time.ticks_diff(now, self.last_dose) < self.min_interval_ms:
+            return
+        if control.devices[self.source].on or control.devices[self.code].on:
+            return
+        dose_ms = min(self.owed, self.max_dose_ms)
+        if self.cap is not None:
+            dose_ms = min(dose_ms, self.cap.available(now))
+        if dose_ms < self.min_dose_ms:
+            self.capped += 1
+            return
+        if not control.start_run(self.code, dose_ms):
+            return
+        if self.cap is not None:
+            self.cap.take(dose_ms)
+        self.owed -= dose_ms
+        self.last_dose = now
+        self.doses += 1
+        self.dosed_ms += dose_ms
+
+    def snapshot(self) -> list:
+        owed = self.owed
+        if self.seen is not None:
+            owed += (self.control.on_ms[self.source] - self.seen) * self.ratio // 1000
+        age = None if self.last_dose is None else time.ticks_diff(time.ticks_ms(), self.last_dose)
+        return [owed, age]
+
+    def restore(self, saved: list, slept_ms: int) -> None:
+        self.owed, age = saved
+        self.seen = 0  # Run time counts from 0 again after the reset
+        if age is not None and age + slept_ms < self.min_interval_ms:
+            self.last_dose = time.ticks_add(time.ticks_ms(), -(age + slept_ms))
+
+    def stats(self) -> dict:
+        return {"owed": self.owed, "doses": self.doses, "ms": self.dosed_ms, "capped": self.capped}
+
+
+class RuleLoop:
+    """
+    Holds a device off while a reading is above a limit.
+
+    E.g. the lights are kept off while the trays are above 30 C and
+    allowed back once they have cooled below 28 C. The gap between high
+    and low is the hysteresis, and a hold lasts at least min_hold_ms so
+    the device is not switched on and off around the limit.
+    """
+    def __init__(self, control, code: int, metric: int, high: int, low: int, min_hold_ms: int = 600000):
+        """
+        Args:
+            control: ControlCore owning the device
+            code: Device id to hold off
+            metric: telemetry_frame metric id of the reading
+            high: Hold the device off above this (fixed-point)
+            low: Release it below this
+            min_hold_ms: Shortest hold
+        """
+        self.control = control
+        self.code = code
+        self.metric = metric
+        self.high = high
+        self.low = low
+        self.min_hold_ms = min_hold_ms
+        self.held_at = None  # ticks_ms the current hold started, None when released
+        self.holds = 0
+
+    def update(self, now: int) -> None:
+        value = self.control.readings.get(self.metric)
+        if value is None:
+            return
+        if self.held_at is None:
+            if value > self.high:
+                self.held_at = now
+                self.holds += 1
+                self.control.inhibit(self.code, True)
+        elif value < self.low and time.ticks_diff(now, self.held_at) >= self.min_hold_ms:
+            self.held_at = None
+            self.control.inhibit(self.code, False)
+
+    def snapshot(self) -> list:
+        return [self.held_at is not None]
+
+    def restore(self, saved: list, slept_ms: int) -> None:
+        if saved[0]:
+            self.held_at = time.ticks_ms()
+            self.control.inhibit(self.code, True)
+
+    def stats(self) -> dict:
+        return {"held": self.held_at is not None, "holds": self.holds}
+
+
+class ControlEngine:
+    """
+    Runs closed-loop control after every sensor round.
+
+    Loops are updated in turn on the control loop's core, straight after
+    ControlCore collects the readings, so they always act on fresh data
+    and add no wakes of their own. Each tick has a CPU budget: once
+    budget_us has been spent, the loops not yet updated wait for the next
+    tick and resume first, so control can never starve the pump cutoffs
+    and command handling that share the loop.
+    """
+    def __init__(self, control, budget_us: int = 2000):
+        """
+        Initialize the engine with no loops.
+
+        Args:
+            control: ControlCore whose readings and devices the loops use
+            budget_us: CPU time one tick may spend on loop updates
+        """
+        self.control = control
+        self.budget_us = budget_us
+        self.loops = []
+        self.next = 0  # Loop to start the next tick with
+
+        # Counters
+        self.ticks = 0
+        self.deferred = 0  # Loop updates pushed to a later tick by the budget
+        self.over_budget = 0
+        self.last_us = 0
+        self.max_us = 0
+
+    def add(self, loop):
+        """
+        Add a loop; loops are updated in the order they are added.
+
+        Returns:
+            The loop
+        """
+        self.loops.append(loop)
+        return loop
+
+    def start(self) -> None:
+        """
+        Tick after every sensor round of the control loop.
+        """
+        self.control.after_collect = self.tick
+
+    def tick(self, now: int = None) -> None:
+        """
+        Update the loops until they are all done or the budget is spent.
+        """
+        if now is None:
+            now = time.ticks_ms()
+        started = time.ticks_us()
+        loops = self.loops
+        count = len(loops)
+        index = self.next
+        done = 0
+        elapsed = 0
+        while done < count:
+            loops[index].update(now)
+            index = (index + 1) % count
+            done += 1
+            elapsed = time.ticks_diff(time.ticks_us(), started)
+            if elapsed >= self.budget_us:
+                break
+        self.next = index
+        self.deferred += count - done
+        self.ticks += 1
+        self.last_us = elapsed
+        if elapsed > self.max_us:
+            self.max_us = elapsed
+        if elapsed > self.budget_us:
+            self.over_budget += 1
+
+    def snapshot(self) -> list:
+        """
+        Get the loop state to carry across a deep sleep.
+        """
+        return [loop.snapshot() for loop in self.loops]
+
+    def restore(self, saved: list, slept_ms: int) -> None:
+        """
+        Restore the loop state saved by snapshot().
+        """
+        for loop, state in zip(self.loops, saved):
+            loop.restore(state, slept_ms)
+
+    def stats(self) -> dict:
+        """
+        Get the engine counters and each loop's state.
+
+        Returns:
+            Dict of tick timings and budget counters, plus a list of
+            per-loop stats in the order the loops were added
+        """
+        return {
+            "ticks": self.ticks,
+            "last_us": self.last_us,
+            "max_us": self.max_us,
+            "over_budget": self.over_budget,
+            "deferred": self.deferred,
+            "loops": [loop.stats() for loop in self.loops],
+        }
@@ -1,8 +1,20 @@
 import utime
-import requests
 
-from periphials import Pump, Lights
-from utils import load_env, publish_mqtt_message, connect_wifi, set_rtc
+from periphials import Pump, Lights, I2CBusManager, AHT21
+from control_core import ControlCore, RecordRing, TELEMETRY
+from control_engine import ControlEngine, DoseLoop, DutyCap, PID, PulseLoop, RuleLoop
+from command_channel import CommandChannel
+import utils
+from utils import load_env, connect_wifi
+from mqtt_publisher import MQTTPublisher
+from power import PowerManager
+from profiler import Profiler
+from report_policy import ReportPolicy
+from telemetry_log import TelemetryLog
+from scheduler import Scheduler
+from wifi_manager import WifiManager
+from sntp import TimeSync
+import telemetry_frame
 
 mqtt_config = load_env()
 
@@ -10,52 +22,284 @@ MQTT_SERVER = mqtt_config.get('MQTT_SERVER')
 MQTT_PORT = mqtt_config.get('MQTT_PORT')
 MQTT_USER = mqtt_config.get('MQTT_USER')
 MQTT_PASSWORD = mqtt_config.get('MQTT_PASSWORD')
-MQTT_CLIENT_ID = 'SOUTH_RACK_BARLEY'
+# Each rack sets its own name; it picks the topics and, by default, the MQTT client id
+RACK = mqtt_config.get('RACK', 'south_rack_barley')
+MQTT_CLIENT_ID = mqtt_config.get('MQTT_CLIENT_ID', RACK.upper())
 WIFI_SSID = mqtt_config.get('WIFI_SSID')
 WIFI_PASSWORD = mqtt_config.get('WIFI_PASSWORD')
+DEVICE_ID = int(mqtt_config.get('DEVICE_ID', 1))
+# 'binary' sends compact telemetry frames; 'json' keeps the readable debug payload
+TELEMETRY_FORMAT = mqtt_config.get('TELEMETRY_FORMAT', 'binary')
+# 'light' sleeps between events with the radio off unless there is something to send,
+# 'deep' also deep-sleeps through idle gaps of DEEP_SLEEP_MIN_MS; empty stays awake and online
+LOW_POWER = mqtt_config.get('LOW_POWER', '')
+DEEP_SLEEP_MIN_MS = int(mqtt_config.get('DEEP_SLEEP_MIN_MS', 120000))
+# Sensor rounds run this often; low-power mode defaults to a slower rate so it can sleep
+SAMPLE_INTERVAL_MS = int(mqtt_config.get('SAMPLE_INTERVAL_MS', 60000 if LOW_POWER else 10000))
+# ...and this often while a reading is in alarm or changing faster than its rate limit
+FAST_SAMPLE_INTERVAL_MS = min(SAMPLE_INTERVAL_MS, int(mqtt_config.get('FAST_SAMPLE_INTERVAL_MS', 10000)))
+# Diagnostics (loop timings, heap, GC pauses) go out this often; 0 turns profiling off
+PROFILE_INTERVAL_MS = int(mqtt_config.get('PROFILE_INTERVAL_MS', 900000 if LOW_POWER else 60000))
+RACK_TOPIC = "home/garden/" + RACK
+STATUS_TOPIC = RACK_TOPIC + "/status"
+DIAGNOSTICS_TOPIC = RACK_TOPIC + "/diag"
+# Run sensing and actuation on core 1 so network stalls on core 0 can't delay them
+DUAL_CORE = mqtt_config.get('DUAL_CORE', '0') == '1'
+if DUAL_CORE and LOW_POWER:
+   print("LOW_POWER needs the single-core loop, staying awake")
+   LOW_POWER = ''
+# Longest the loop sleeps while online, which bounds how long a remote command waits
+COMMAND_POLL_MS = int(mqtt_config.get('COMMAND_POLL_MS', 50))
+# A remote "on" to a pump is still cut off after this long, and longer remote runs are refused
+MAX_PUMP_ON_MS = int(mqtt_config.get('MAX_PUMP_ON_MS', 300000))
+# Every metric is reported at least this often; REPORT_POLICY=0 reports every sample in full
+REPORT_HEARTBEAT_MS = int(mqtt_config.get('REPORT_HEARTBEAT_MS', 900000))
+REPORT_POLICY = mqtt_config.get('REPORT_POLICY', '1') == '1'
+# Closed-loop control: irrigation pulses follow the humidity over the trays, the salt pump
+# doses against the water pumped and the lights are held off while the trays run hot
+CONTROL_ENGINE = mqtt_config.get('CONTROL_ENGINE', '0') == '1'
+IRRIGATION_RH = int(float(mqtt_config.get('IRRIGATION_RH', 65)) * 100)
+# Salt pump ms per second of supply pump run time
+DOSE_PER_MILLE = int(mqtt_config.get('DOSE_PER_MILLE', 40))
+CONTROL_BUDGET_US = int(mqtt_config.get('CONTROL_BUDGET_US', 2000))
 
 supplyPump = Pump(1)
 saltPump = Pump(2)
 light = Lights(3)
 
+sensors = I2CBusManager()
+sensors.bus(1, serial_clock_pin=3, serial_data_pin=2, frequency=100000)
+
+scheduler = Scheduler()
+wifi = WifiManager(WIFI_SSID, WIFI_PASSWORD)
+timesync = TimeSync(
+   "Chicago",
+   host=mqtt_config.get('NTP_SERVER', 'pool.ntp.org'),
+   port=int(mqtt_config.get('NTP_PORT', 123)),
+)
+frame_encoder = telemetry_frame.FrameEncoder(DEVICE_ID)
+
+# Thresholds are fixed-point hundredths: report temperature on a 0.2 C move, or every
+# sample outside 15-30 C or when changing faster than 0.5 C a minute
+report_policy = ReportPolicy(REPORT_HEARTBEAT_MS, enabled=REPORT_POLICY)
+report_policy.configure(telemetry_frame.TEMPERATURE, deadband=20, low=1500, high=3000, rate=50)
+report_policy.configure(telemetry_frame.HUMIDITY, deadband=100, low=3000, high=8500, rate=200)
+report_policy.configure(telemetry_frame.RSSI, deadband=500)
+
+telemetry_ring = RecordRing(64)
+command_ring = RecordRing(16)
+# Acks get their own ring so a telemetry backlog cannot drop them
+ack_ring = RecordRing(16)
+control = ControlCore(
+   sensors,
+   {
+      telemetry_frame.SUPPLY_PUMP: supplyPump,
+      telemetry_frame.SALT_PUMP: saltPump,
+      telemetry_frame.LIGHT: light,
+   },
+   telemetry_ring,
+   command_ring,
+   # In single-core mode the control work shares the main loop's scheduler
+   scheduler=None if DUAL_CORE else scheduler,
+   max_pump_on_ms=MAX_PUMP_ON_MS,
+   acks=ack_ring,
+)
+
+engine = None
+if CONTROL_ENGINE:
+   engine = ControlEngine(control, budget_us=CONTROL_BUDGET_US)
+   # 5 s at target as before, 1 s more per 1 %RH below it; 1-15 s, moving at most 2 s a minute
+   engine.add(PulseLoop(
+      control, telemetry_frame.SUPPLY_PUMP, telemetry_frame.HUMIDITY,
+      PID(kp=10000, ki=10, kd=0, setpoint=IRRIGATION_RH, out_min=1000, out_max=15000, bias=5000, rate=33),
+      max_duty_permille=50,
+   ))
+   engine.add(DoseLoop(
+      control, telemetry_frame.SALT_PUMP, telemetry_frame.SUPPLY_PUMP, DOSE_PER_MILLE,
+      cap=DutyCap(10, 3600000),
+   ))
+   engine.add(RuleLoop(control, telemetry_frame.LIGHT, telemetry_frame.TEMPERATURE, high=3000, low=2800))
+
+publisher = MQTTPublisher(
+   client_id=MQTT_CLIENT_ID,
+   broker=MQTT_SERVER,
+   port=int(MQTT_PORT or 1883),
+   user=MQTT_USER,
+   password=MQTT_PASSWORD,
+   store=TelemetryLog(),
+   link=wifi,
+)
+commands = CommandChannel(
+   publisher,
+   command_ring,
+   {telemetry_frame.METRIC_NAMES[code]: code for code in control.devices},
+   RACK_TOPIC,
+   wifi=wifi,
+   max_run_ms={
+      telemetry_frame.METRIC_NAMES[telemetry_frame.SUPPLY_PUMP]: MAX_PUMP_ON_MS,
+      telemetry_frame.METRIC_NAMES[telemetry_frame.SALT_PUMP]: MAX_PUMP_ON_MS,
+   },
+)
+
+power = None
+if LOW_POWER:
+   power = PowerManager(scheduler, wifi, publisher, control, mode=LOW_POWER, deep_sleep_ms=DEEP_SLEEP_MIN_MS)
+
+profiler = Profiler(enabled=PROFILE_INTERVAL_MS > 0)
+loop_probe = profiler.probe("loop")
+if PROFILE_INTERVAL_MS:
+   profiler.instrument(AHT21, "trigger", "aht21.trigger", 1)
+   profiler.instrument(AHT21, "collect", "aht21.collect", 1)
+   profiler.instrument(MQTTPublisher, "flush", "mqtt.flush", 1)
+   profiler.instrument(utils, "publish_mqtt_message", "mqtt.oneshot")
+   connect_wifi = profiler.wrap("wifi.connect")(connect_wifi)
+
+
+def restoreSequence(saved, slept_ms):
+   frame_encoder.boot, frame_encoder.seq = saved
+
+
+if power is not None:
+   # What a deep sleep must not lose; restored by power.boot() on wake
+   power.register("seq", lambda: [frame_encoder.boot, frame_encoder.seq], restoreSequence)
+   power.register("cycles", control.snapshot, control.restore)
+   power.register("sync", timesync.snapshot, timesync.restore)
+   power.register("report", report_policy.snapshot, report_policy.restore)
+   power.register("diag", profiler.snapshot, profiler.restore)
+   if engine is not None:
+      power.register("engine", engine.snapshot, engine.restore)
+
+
+def publishDiagnostics(report):
+   if engine is not None:
+      report["ce"] = engine.stats()
+   if power is not None:
+      # The radio is off most of the time; queueing the report brings it up to send it
+      report["pw"] = power.stats()
+      publisher.publish(DIAGNOSTICS_TOPIC, report)
+   # Otherwise diagnostics are only useful live; skip them rather than queue them offline
+   elif wifi.is_connected():
+      publisher.publish(DIAGNOSTICS_TOPIC, report)
+
+
+def publishAcks():
+   record = ack_ring.pop()
+   while record is not None:
+      commands.handle_record(record)
+      record = ack_ring.pop()
+
+
+def publishTelemetry():
+   # The control loop pushes one record per metric each sensor round; send the latest reading of each metric
+   latest = {}
+   record = telemetry_ring.pop()
+   while record is not None:
+      if record[0] == TELEMETRY:
+         latest[record[1]] = record[2]
+      record = telemetry_ring.pop()
+   if not latest:
+      return
+   rssi = wifi.rssi()
+   if rssi is not None:
+      latest[telemetry_frame.RSSI] = rssi * telemetry_frame.SCALE
+   metrics, full = report_policy.select(latest)
+   if REPORT_POLICY:
+      control.set_sample_interval(FAST_SAMPLE_INTERVAL_MS if report_policy.fast else SAMPLE_INTERVAL_MS)
+   if not metrics:
+      return
+   if TELEMETRY_FORMAT == 'json':
+      message = {
+         "device": MQTT_CLIENT_ID,
+         "timestamp": utime.time(),
+         "boot": frame_encoder.boot,
+         "seq": frame_encoder.next_seq(),
+      }
+      for metric_id, value in metrics:
+         message[telemetry_frame.METRIC_NAMES[metric_id]] = value / telemetry_frame.SCALE
+   else:
+      flags = 0 if full else telemetry_frame.FLAG_PARTIAL
+      message = frame_encoder.pack(utime.time(), metrics, flags)
+   publisher.publish(STATUS_TOPIC, message)
+
 
 def controlSupplyPump():
-   current_time = supplyPump.get_current_time()
-   if not supplyPump.on and supplyPump.get_alarm() == 0:
-      supplyPump.device_on()
-      supplyPump.set_runtime_duration(5000)  # Run for 5 seconds
-      print("Supply Pump ON")
+   # Run for 5 seconds every 10 minutes, starting now; a remote "schedule" command replaces it
+   control.schedule_cycle(telemetry_frame.SUPPLY_PUMP, duration_ms=5000, period_ms=600000)
+   print("Supply Pump scheduled")
 
 
-if connect_wifi(WIFI_SSID, WIFI_PASSWORD):
-   
+def syncTimeIfDue():
+   if timesync.due():
+      timesync.sync(scheduler)
 
 
 def main():
-   # check if wifi is connected
-   if connect_wifi(WIFI_SSID, WIFI_PASSWORD):
-      # set the RTC
-      set_rtc("Chicago")
-
-   
+   # After a deep sleep this restores the schedules, RTC and sync state instead of starting over
+   warm = power is not None and power.boot()
+   if not warm:
+      # A new boot id restarts the sequence numbers; a warm boot carries both on
+      frame_encoder.boot = utils.next_boot_id()
+   # Wi-Fi connects in the background; the RTC re-syncs on an interval set by its drift
+   wifi.start(scheduler)
+   if power is not None:
+      # The radio comes up only when there is something to send or the RTC is due a sync
+      wifi.suspend()
+      wifi.on_connect = syncTimeIfDue
+      power.want_radio(timesync.due)
+      power.keep_awake(lambda: commands.pending)
+   else:
+      timesync.start(scheduler)
+   sensors.scan(1)
+   control.start_sampling(SAMPLE_INTERVAL_MS)
+   if engine is not None:
+      engine.start()
+   if not warm:
+      controlSupplyPump()
+   if DUAL_CORE:
+      control.start_thread()
+   if PROFILE_INTERVAL_MS:
+      profiler.start(scheduler, publishDiagnostics, PROFILE_INTERVAL_MS,
+                     PROFILE_INTERVAL_MS if power is not None else 10000)
+   commands.start()
+   while True:
+      with loop_probe:
+         scheduler.run_pending()
+         connected = wifi.is_connected()
+         # Fetch commands before the control step so they are applied in this pass
+         if connected:
+            publisher.check_msg()
+         if not DUAL_CORE:
+            control.step()
+         publishAcks()
+         publishTelemetry()
+         if commands.pending:
+            commands.expire()
+         if connected:
+            publisher.poll()
+      if power is not None:
+         power.idle(COMMAND_POLL_MS)
+      else:
+         # Sleep until the next device event, waking often enough to pick up commands
+         scheduler.sleep_until_next(COMMAND_POLL_MS if connected else 1000)
 
 
 def mqtt_test():
 
    if connect_wifi(WIFI_SSID, WIFI_PASSWORD):
      
-      message = {
-         "device": "SOUTH_RACK_BARLEY",
-         "status": "active",
-         "timestamp": utime.time()
-      }
-      publish_mqtt_message(
-         client_id=MQTT_CLIENT_ID,
-         broker=MQTT_SERVER,
-         port=int(MQTT_PORT),
-         user=MQTT_USER,
-         password=MQTT_PASSWORD,
-         topic="home/garden/south_rack_barley/status",
-         message=message
-      )
+      if TELEMETRY_FORMAT == 'json':
+         message = {
+            "device": MQTT_CLIENT_ID,
+            "status": "active",
+            "timestamp": utime.time()
+         }
+      else:
+         message = frame_encoder.pack(utime.time(), (
+            (telemetry_frame.SUPPLY_PUMP, supplyPump.on * telemetry_frame.SCALE),
+            (telemetry_frame.SALT_PUMP, saltPump.on * telemetry_frame.SCALE),
+            (telemetry_frame.LIGHT, light.on * telemetry_frame.SCALE),
+         ))
+      publisher.publish(STATUS_TOPIC, message)
+      publisher.poll()
+      print("Messages per connect:", publisher.messages_per_connect())
 
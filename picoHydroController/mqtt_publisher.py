@@ -0,0 +1,398 @@
+import utime
+import ujson as json
+from umqtt.simple import MQTTClient
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """
+    Match a topic against a subscription pattern with + and # wildcards.
+    """
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class MQTTPublisher:
+    """
+    Long-lived MQTT publisher that batches messages over one connection.
+
+    Messages are queued in a fixed-size in-RAM ring and flushed together
+    when either the batch size or the flush interval is reached. The
+    broker connection is kept open between flushes with keepalive pings
+    and re-established transparently after a failure.
+
+    The same connection carries subscriptions: they are renewed on every
+    connect, and check_msg() delivers incoming messages without blocking.
+
+    Nothing tries to connect while the link reports it is down: messages
+    stay queued, and overflow or a flush goes to the store instead.
+    Replay order: once reconnected, live messages are sent as they come
+    and the stored backlog is replayed behind them a few per poll(), so a
+    topic can see newer messages before older ones. Telemetry carries its
+    own timestamp, boot id and sequence number, and the server files
+    replayed readings by those (late arrivals fill gaps, and never
+    overwrite newer values), so live data is not held up behind an
+    outage's backlog.
+    """
+    def __init__(
+        self,
+        client_id: str,
+        broker: str,
+        port: int,
+        user: str,
+        password: str,
+        keepalive: int = 60,
+        max_queue: int = 32,
+        batch_size: int = 8,
+        flush_interval_ms: int = 5000,
+        store=None,
+        replay_batch: int = 4,
+        link=None,
+    ):
+        """
+        Initialize the publisher without connecting.
+
+        Args:
+            client_id: MQTT client id presented to the broker
+            broker: Broker host name or IP address
+            port: Broker TCP port
+            user: Broker username
+            password: Broker password
+            keepalive: MQTT keepalive interval in seconds
+            max_queue: Maximum number of messages held in RAM
+            batch_size: Queue depth that triggers an immediate flush
+            flush_interval_ms: Maximum time a message waits before a flush
+            store: Optional TelemetryLog that holds messages while the
+                broker is unreachable
+            replay_batch: Stored messages replayed per poll once reconnected
+            link: Optional WiFiManager; while its is_connected() is False
+                no flush tries to connect, which would block the loop
+        """
+        self.client_id = client_id
+        self.broker = broker
+        self.port = port
+        self.user = user
+        self.password = password
+        self.keepalive = keepalive
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.client = None
+        self.store = store
+        self.replay_batch = replay_batch
+        self.link = link
+        self.subscriptions = []  # (topic pattern, callback, qos)
+
+        # Preallocated ring of (topic, payload) slots
+        self.max_queue = max_queue
+        self.queue = [None] * max_queue
+        self.head = 0  # Index of the oldest queued message
+        self.count = 0  # Number of queued messages
+
+        now = utime.ticks_ms()
+        self.last_flush = now
+        self.last_activity = now
+        self.last_attempt = utime.ticks_add(now, -flush_interval_ms)  # Last connect attempt
+
+        # Counters
+        self.connects = 0
+        self.published = 0
+        self.dropped = 0
+        self.failures = 0
+        self.stored = 0
+        self.replayed = 0
+        self.received = 0
+
+    def connect(self) -> bool:
+        """
+        Open the broker connection if it is not already open.
+
+        Returns:
+            True if a connection is available
+        """
+        if self.client is not None:
+            return True
+        self.last_attempt = utime.ticks_ms()
+        client = MQTTClient(
+            self.client_id, self.broker, self.port, self.user, self.password,
+            keepalive=self.keepalive,
+        )
+        try:
+            client.connect()
+            # Sessions are clean, so subscriptions are renewed on every connect
+            if self.subscriptions:
+                client.set_callback(self._dispatch)
+                for topic, _, qos in self.subscriptions:
+                    client.subscribe(topic, qos)
+        except Exception as e:
+            print(f"MQTT connect failed: {e}")
+            self.failures += 1
+            return False
+        self.client = client
+        self.connects += 1
+        self.last_activity = utime.ticks_ms()
+        return True
+
+    def disconnect(self) -> None:
+        """
+        Flush anything queued and close the broker connection.
+        """
+        self.flush()
+        if self.client is not None:
+            try:
+                self.client.disconnect()
+            except Exception:
+                pass
+            self.client = None
+
+    def _drop_connection(self) -> None:
+        """
+        Discard a broken connection so the next flush reconnects.
+        """
+        try:
+            self.client.sock.close()
+        except Exception:
+            pass
+        self.client = None
+        self.failures += 1
+
+    def publish(self, topic: str, message) -> bool:
+        """
+        Queue a message for publishing.
+
+        Dict messages are JSON encoded; str/bytes payloads (such as binary
+        telemetry frames) are sent as-is.
+        When the queue is full the oldest message is moved to the store,
+        or dropped if there is no store.
+
+        Args:
+            topic: MQTT topic to publish to
+            message: Message payload
+
+        Returns:
+            True if the message was queued without dropping another
+        """
+        if isinstance(message, dict):
+            message = json.dumps(message)
+        elif isinstance(message, memoryview):
+            # Encoder views alias a reused buffer, so take a copy to queue
+            message = bytes(message)
+        dropped = False
+        if self.count == self.max_queue:
+            oldest = self.queue[self.head]
+            self.queue[self.head] = None
+            self.head = (self.head + 1) % self.max_queue
+            self.count -= 1
+            if self.store is not None and self.store.append(*oldest):
+                self.stored += 1
+            else:
+                self.dropped += 1
+                dropped = True
+        self.queue[(self.head + self.count) % self.max_queue] = (topic, message)
+        self.count += 1
+        if self.count >= self.batch_size and self._link_up():
+            self.flush()
+        return not dropped
+
+    def _link_up(self) -> bool:
+        return self.link is None or self.link.is_connected()
+
+    def flush(self) -> int:
+        """
+        Publish all queued messages over the open connection.
+
+        Messages stay queued until the broker accepts them, so a failure
+        part way through a batch loses nothing. With the link down, or the
+        broker unreachable, they move to the store instead.
+
+        Returns:
+            Number of messages published
+        """
+        self.last_flush = utime.ticks_ms()
+        if self.count == 0 and not self._backlog():
+            return 0
+        if not self._link_up() or not self.connect():
+            self._spill()
+            return 0
+        sent = 0
+        while self.count:
+            topic, payload = self.queue[self.head]
+            try:
+                self.client.publish(topic, payload)
+            except Exception as e:
+                print(f"Failed to publish message: {e}")
+                self._drop_connection()
+                break
+            self.queue[self.head] = None
+            self.head = (self.head + 1) % self.max_queue
+            self.count -= 1
+            sent += 1
+        if sent:
+            self.published += sent
+            self.last_activity = utime.ticks_ms()
+        return sent
+
+    def pending(self) -> int:
+        """
+        Get the number of messages not yet sent, queued or stored.
+        """
+        return self.count + self._backlog()
+
+    def _backlog(self) -> int:
+        """
+        Get the number of stored messages waiting for replay.
+        """
+        if self.store is None:
+            return 0
+        return self.store.pending()
+
+    def _spill(self) -> None:
+        """
+        Move every queued message into the store while offline.
+        """
+        if self.store is None:
+            return
+        while self.count:
+            if not self.store.append(*self.queue[self.head]):
+                self.dropped += 1
+            else:
+                self.stored += 1
+            self.queue[self.head] = None
+            self.head = (self.head + 1) % self.max_queue
+            self.count -= 1
+
+    def _send_now(self, topic: str, payload) -> bool:
+        """
+        Publish one message immediately over the open connection.
+        """
+        try:
+            self.client.publish(topic, payload)
+        except Exception as e:
+            print(f"Failed to replay message: {e}")
+            self._drop_connection()
+            return False
+        self.published += 1
+        self.last_activity = utime.ticks_ms()
+        return True
+
+    def subscribe(self, topic: str, callback, qos: int = 1) -> None:
+        """
+        Subscribe to a topic on this and every later connection.
+
+        Args:
+            topic: Topic pattern, may use + and # wildcards
+            callback: Called as callback(topic, payload) with str topic and
+                bytes payload from check_msg()
+            qos: Subscription QoS
+        """
+        self.subscriptions.append((topic, callback, qos))
+        if self.client is not None:
+            self.client.set_callback(self._dispatch)
+            try:
+                self.client.subscribe(topic, qos)
+            except Exception as e:
+                print(f"MQTT subscribe failed: {e}")
+                self._drop_connection()
+
+    def _dispatch(self, topic, payload) -> None:
+        """
+        umqtt callback: route a received message to its subscription.
+        """
+        self.received += 1
+        if isinstance(topic, bytes):
+            topic = topic.decode()
+        for pattern, callback, _ in self.subscriptions:
+            if topic_matches(pattern, topic):
+                try:
+                    callback(topic, payload)
+                except Exception as e:
+                    print(f"Message handler failed for {topic}: {e}")
+                return
+
+    def check_msg(self, max_messages: int = 4) -> int:
+        """
+        Deliver waiting messages to their callbacks without blocking.
+
+        Args:
+            max_messages: Most messages handled per call, so a burst of
+                commands cannot hold up the loop
+
+        Returns:
+            Number of messages delivered
+        """
+        if self.client is None:
+            return 0
+        start = self.received
+        try:
+            for _ in range(max_messages):
+                before = self.received
+                self.client.check_msg()
+                if self.received == before:
+                    break
+        except Exception as e:
+            print(f"MQTT receive failed: {e}")
+            self._drop_connection()
+        return self.received - start
+
+    def poll(self) -> None:
+        """
+        Run the time-based flush and keepalive. Call this from the main loop.
+        """
+        now = utime.ticks_ms()
+        if (self.count or self._backlog()) and utime.ticks_diff(now, self.last_flush) >= self.flush_interval_ms:
+            self.flush()
+        # Subscribers need the connection even with nothing to send; retry at the flush interval
+        if self.client is None and self.subscriptions and self._link_up() and \
+                utime.ticks_diff(now, self.last_attempt) >= self.flush_interval_ms:
+            self.connect()
+        if self.client is None:
+            return
+        # Drain stored messages a few at a time so replay never hogs the loop
+        if self._backlog():
+            self.replayed += self.store.replay(self._send_now, self.replay_batch)
+            if self.client is None:
+                return
+        if not self.keepalive:
+            return
+        # Ping at half the keepalive so the broker never times us out
+        if utime.ticks_diff(now, self.last_activity) >= self.keepalive * 500:
+            try:
+                self.client.ping()
+                self.last_activity = now
+            except Exception as e:
+                print(f"MQTT ping failed: {e}")
+                self._drop_connection()
+
+    def messages_per_connect(self) -> float:
+        """
+        Get the average number of messages published per broker connect.
+
+        Returns:
+            Published messages divided by successful connects
+        """
+        if not self.connects:
+            return 0.0
+        return self.published / self.connects
+
+    def stats(self) -> dict:
+        """
+        Get the publisher counters.
+
+        Returns:
+            Dict of connect, publish, drop and failure counters
+        """
+        return {
+            "connects": self.connects,
+            "published": self.published,
+            "queued": self.count,
+            "dropped": self.dropped,
+            "failures": self.failures,
+            "stored": self.stored,
+            "replayed": self.replayed,
+            "received": self.received,
+            "per_connect": self.messages_per_connect(),
+        }
@@ -1,8 +1,32 @@
-from machine import Pin, I2C
+from machine import Pin, I2C, Timer
+from array import array
 import time
+import uasyncio as asyncio
 #from abc import ABC, abstractmethod
 
 
+def crc8(data, length: int) -> int:
+    """
+    Compute the CRC-8 used by the AHT2x sensors (poly 0x31, init 0xFF).
+
+    Args:
+        data: Buffer to checksum
+        length: Number of leading bytes to include
+
+    Returns:
+        The 8-bit CRC
+    """
+    crc = 0xFF
+    for i in range(length):
+        crc ^= data[i]
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x31) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+    return crc
+
+
 class I2CInit:
     """
     Initialize and manage I2C communication for sensors and devices.
@@ -43,6 +67,8 @@ class I2CSensor:
     Provides a common interface for working with various I2C sensors,
     defining the core methods that all sensors should implement.
     """
+    conversion_ms = 0  # Time between trigger() and collect() for a valid reading
+
     def __init__(self, i2c: I2C, address: int):
         """
         Initialize the I2C sensor with communication parameters.
@@ -91,14 +117,105 @@ class I2CSensor:
         """
         pass
 
+    def trigger(self) -> bool:
+        """
+        Start a measurement without waiting for it to complete.
+
+        Returns:
+            True if the measurement was started
+        """
+        pass
+
+    def collect(self) -> bool:
+        """
+        Read and decode the result of a measurement started by trigger().
+
+        Returns:
+            True if a valid reading was decoded
+        """
+        pass
 
-class AHT21(I2CSensor):
+
+class AHT21Codec:
+    """
+    Commands and decoding shared by the blocking and uasyncio AHT21 drivers.
+
+    Expects the driver to provide crc_errors, temperature_c100 and
+    humidity_c100.
+    """
+    STATUS_COMMAND = b'\x71'
+    MEASURE_COMMAND = b'\xAC\x33\x00'
+    BUSY_BIT = 0x80
+    CALIBRATED_BIT = 0x08
+    STARTUP_MS = 110  # Power-on time before the sensor accepts commands
+
+    def get_humidity(self, data: bytes) -> float:
+        """
+        Calculate relative humidity from raw sensor data.
+        
+        Args:
+            data: Raw measurement data from read_measurement()
+            
+        Returns:
+            Relative humidity as a percentage (0-100%)
+        """
+        # Extract 20-bit humidity value from bytes 1-3
+        humidity_raw = (data[1] << 12) | (data[2] << 4) | (data[3] >> 4)
+        # Convert to relative humidity percentage
+        humidity = (humidity_raw / 2**20) * 100
+        return humidity
+    
+    def get_temperature(self, data: bytes) -> float:
+        """
+        Calculate temperature from raw sensor data.
+        
+        Args:
+            data: Raw measurement data from read_measurement()
+            
+        Returns:
+            Temperature in degrees Celsius
+        """
+        # Extract 20-bit temperature value from bytes 3-5
+        # The lower 4 bits of byte 3 and all of bytes 4-5
+        temperature_raw = ((data[3] & 0x0F) << 16) | (data[4] << 8) | data[5]
+        # Convert to temperature in Celsius
+        temperature = ((temperature_raw / 2**20) * 200) - 50
+        return temperature
+
+    def decode_fixed(self, data) -> bool:
+        """
+        Validate a 7-byte measurement and decode both values in one pass.
+
+        Args:
+            data: Status byte, 5 data bytes and the CRC-8 byte
+
+        Returns:
+            True if the data was ready and its CRC matched
+        """
+        if data[0] & self.BUSY_BIT:  # Busy bit still set, conversion not finished
+            return False
+        if crc8(data, 6) != data[6]:
+            self.crc_errors += 1
+            return False
+        middle = data[3]
+        humidity_raw = (data[1] << 12) | (data[2] << 4) | (middle >> 4)
+        temperature_raw = ((middle & 0x0F) << 16) | (data[4] << 8) | data[5]
+        # 10000 / 2**20 == 625 / 2**16 and 20000 / 2**20 == 625 / 2**15;
+        # the reduced forms keep every product inside a small int
+        self.humidity_c100 = (humidity_raw * 625) >> 16
+        self.temperature_c100 = ((temperature_raw * 625) >> 15) - 5000
+        return True
+
+
+class AHT21(AHT21Codec, I2CSensor):
     """
     Implementation for the AHT21 Temperature and Humidity Sensor.
     
     This sensor communicates via I2C and provides both temperature
     and humidity readings.
     """
+    conversion_ms = 80
+
     def __init__(self, i2c: I2C, address: int):
         """
         Initialize the AHT21 sensor.
@@ -108,7 +225,11 @@ class AHT21(I2CSensor):
             address: The I2C address (typically 0x38)
         """
         super().__init__(i2c, address)
-        time.sleep_ms(110)  # Startup delay needed for sensor initialization
+        time.sleep_ms(self.STARTUP_MS)  # Startup delay needed for sensor initialization
+        self.buffer = bytearray(7)  # Status, 5 data bytes and CRC, reused every read
+        self.temperature_c100 = 0  # Last valid temperature in hundredths of a degree C
+        self.humidity_c100 = 0  # Last valid humidity in hundredths of a percent
+        self.crc_errors = 0
 
     def request_status(self, command: bytes) -> bool:
         """
@@ -165,41 +286,332 @@ class AHT21(I2CSensor):
         except Exception as e:
             return b''
         
-    def get_humidity(self, data: bytes) -> float:
+    def read_fixed(self) -> bool:
         """
-        Calculate relative humidity from raw sensor data.
-        
+        Read a measurement into the preallocated buffer and decode it.
+
+        This is the allocation-free hot path: no bytes objects or floats
+        are created, so sampling leaves nothing for the GC to collect.
+        Results are stored in temperature_c100 and humidity_c100.
+
+        Returns:
+            True if a ready, CRC-valid measurement was decoded
+        """
+        try:
+            self.i2c.readfrom_into(self.address, self.buffer)
+        except OSError:
+            return False
+        return self.decode_fixed(self.buffer)
+
+    def trigger(self) -> bool:
+        """
+        Send the measurement command without sleeping.
+
+        Returns:
+            True if the command was accepted
+        """
+        try:
+            self.i2c.writeto(self.address, self.MEASURE_COMMAND)
+        except OSError:
+            return False
+        return True
+
+    def collect(self) -> bool:
+        """
+        Read the measurement started by trigger().
+
+        Returns:
+            True if a ready, CRC-valid measurement was decoded
+        """
+        return self.read_fixed()
+
+
+class AsyncI2CSensor:
+    """
+    Abstract base class for I2C sensors driven from uasyncio.
+
+    Mirrors the I2CSensor interface, but every method that has to wait
+    on the sensor is a coroutine that yields to other tasks instead of
+    blocking the CPU.
+    """
+    def __init__(self, i2c: I2C, address: int):
+        """
+        Initialize the I2C sensor with communication parameters.
+
         Args:
-            data: Raw measurement data from read_measurement()
-            
+            i2c: An initialized I2C object for communication
+            address: The I2C address of the sensor (typically 7-bit)
+        """
+        self.i2c = i2c
+        self.address = address
+
+    async def request_status(self, command: bytes) -> bool:
+        """
+        Request the status from the sensor.
+
+        Args:
+            command: The command bytes to send for status request
+
         Returns:
-            Relative humidity as a percentage (0-100%)
+            True if the status is valid/ready, False otherwise
         """
-        # Extract 20-bit humidity value from bytes 1-3
-        humidity_raw = (data[1] << 12) | (data[2] << 4) | (data[3] >> 4)
-        # Convert to relative humidity percentage
-        humidity = (humidity_raw / 2**20) * 100
-        return humidity
-    
-    def get_temperature(self, data: bytes) -> float:
+        pass
+
+    async def request_measurement(self, command: bytes) -> bool:
         """
-        Calculate temperature from raw sensor data.
-        
+        Trigger a measurement and wait, without blocking, until it completes.
+
         Args:
-            data: Raw measurement data from read_measurement()
-            
+            command: The command bytes to trigger a measurement
+
         Returns:
-            Temperature in degrees Celsius
+            True if the measurement completed, False otherwise
         """
-        # Extract 20-bit temperature value from bytes 3-5
-        # The lower 4 bits of byte 3 and all of bytes 4-5
-        temperature_raw = ((data[3] & 0x0F) << 16) | (data[4] << 8) | data[5]
-        # Convert to temperature in Celsius
-        temperature = ((temperature_raw / 2**20) * 200) - 50
-        return temperature
+        pass
 
+    async def read(self):
+        """
+        Take a complete reading from the sensor.
 
-    
+        Returns:
+            The decoded reading, or None on error
+        """
+        pass
+
+
+class AsyncAHT21(AHT21Codec, AsyncI2CSensor):
+    """
+    Non-blocking AHT21 driver for uasyncio.
+
+    Instead of sleeping a fixed 100 ms per reading, the driver polls the
+    status busy bit and yields to the scheduler between polls, so other
+    sensors, devices and the network stack keep running while the
+    conversion is in progress.
+    """
+    def __init__(self, i2c: I2C, address: int, poll_ms: int = 10, timeout_ms: int = 200):
+        """
+        Initialize the AHT21 sensor without waiting for it to start up.
+
+        Args:
+            i2c: An initialized I2C object (already configured)
+            address: The I2C address (typically 0x38)
+            poll_ms: Interval between busy bit polls in milliseconds
+            timeout_ms: Maximum time to wait for a conversion in milliseconds
+        """
+        super().__init__(i2c, address)
+        self.poll_ms = poll_ms
+        self.timeout_ms = timeout_ms
+        self.ready_at = time.ticks_add(time.ticks_ms(), self.STARTUP_MS)
+        self.status = bytearray(1)
+        self.buffer = bytearray(7)
+        self.temperature_c100 = 0
+        self.humidity_c100 = 0
+        self.crc_errors = 0
+
+    async def _wait_startup(self) -> None:
+        """
+        Yield until the power-on delay has elapsed.
+        """
+        remaining = time.ticks_diff(self.ready_at, time.ticks_ms())
+        if remaining > 0:
+            await asyncio.sleep_ms(remaining)
+
+    def _read_status(self) -> int:
+        """
+        Read the status byte, or return -1 on a bus error.
+        """
+        try:
+            self.i2c.readfrom_into(self.address, self.status)
+        except OSError:
+            return -1
+        return self.status[0]
+
+    async def request_status(self, command: bytes = AHT21Codec.STATUS_COMMAND) -> bool:
+        """
+        Check if the sensor is calibrated and ready.
+
+        Args:
+            command: Status request command (typically b'\x71')
+
+        Returns:
+            True if the sensor is calibrated and ready
+        """
+        await self._wait_startup()
+        try:
+            self.i2c.writeto(self.address, command)
+        except OSError:
+            return False
+        status = self._read_status()
+        return status >= 0 and status & self.CALIBRATED_BIT != 0
+
+    async def request_measurement(self, command: bytes = AHT21Codec.MEASURE_COMMAND) -> bool:
+        """
+        Trigger a measurement and poll the busy bit until it clears.
+
+        Args:
+            command: Measurement trigger command (typically b'\xAC\x33\x00')
+
+        Returns:
+            True if the measurement completed within the timeout
+        """
+        await self._wait_startup()
+        try:
+            self.i2c.writeto(self.address, command)
+        except OSError:
+            return False
+        started = time.ticks_ms()
+        while True:
+            await asyncio.sleep_ms(self.poll_ms)
+            status = self._read_status()
+            if status < 0:
+                return False
+            if not status & self.BUSY_BIT:
+                return True
+            if time.ticks_diff(time.ticks_ms(), started) >= self.timeout_ms:
+                return False
+
+    async def read(self):
+        """
+        Take a temperature and humidity reading.
+
+        Returns:
+            Tuple of (temperature in Celsius, relative humidity in %),
+            or None if the sensor did not respond
+        """
+        if not await self.request_measurement():
+            return None
+        try:
+            self.i2c.readfrom_into(self.address, self.buffer)
+        except OSError:
+            return None
+        if not self.decode_fixed(self.buffer):
+            return None
+        return self.temperature_c100 / 100, self.humidity_c100 / 100
+
+
+class I2CBusManager:
+    """
+    Owner of the physical I2C buses and the sensors attached to them.
+
+    Every driver shares one I2C object per bus instead of constructing
+    its own. Sensors are polled as a pipeline: each poll triggers every
+    registered sensor, waits once for the slowest conversion, then
+    collects all the results, so N sensors cost about one conversion
+    time rather than N of them. ControlCore.start_sampling() runs the
+    rounds on the control scheduler.
+    """
+    # Drivers created automatically for addresses found by scan()
+    DRIVERS = {0x38: AHT21}
+
+    def __init__(self):
+        """
+        Initialize the manager with no buses or sensors.
+        """
+        self.buses = {}  # Bus number -> I2C
+        self.sensors = []
+        self.stats = []  # Per-sensor counters, parallel to sensors
+        self.collecting = False
+
+    def bus(self, bus: int, serial_clock_pin: int = None, serial_data_pin: int = None,
+            frequency: int = 100000) -> I2C:
+        """
+        Get the shared I2C object for a bus, creating it on first use.
+
+        Args:
+            bus: The I2C bus number (0 or 1)
+            serial_clock_pin: The GPIO pin number for SCL (first use only)
+            serial_data_pin: The GPIO pin number for SDA (first use only)
+            frequency: The I2C bus frequency in Hz (first use only)
+
+        Returns:
+            The initialized I2C object for the bus
+        """
+        i2c = self.buses.get(bus)
+        if i2c is None:
+            if serial_clock_pin is None or serial_data_pin is None:
+                raise ValueError(f"I2C bus {bus} has not been initialized")
+            i2c = I2CInit(bus, serial_clock_pin, serial_data_pin, frequency).initiate_i2c()
+            self.buses[bus] = i2c
+        return i2c
+
+    def register(self, sensor: I2CSensor) -> I2CSensor:
+        """
+        Add a sensor to the polling pipeline.
+
+        Args:
+            sensor: A sensor constructed on one of the managed buses
+
+        Returns:
+            The registered sensor
+        """
+        self.sensors.append(sensor)
+        self.stats.append({
+            "reads": 0,
+            "errors": 0,
+            "last_latency_us": 0,
+            "max_latency_us": 0,
+        })
+        return sensor
+
+    def scan(self, bus: int) -> list:
+        """
+        Scan a bus and register a driver for every known address found.
+
+        Args:
+            bus: The I2C bus number to scan
+
+        Returns:
+            The sensors registered by this scan
+        """
+        i2c = self.bus(bus)
+        known = [sensor.address for sensor in self.sensors if sensor.i2c is i2c]
+        found = []
+        for address in i2c.scan():
+            driver = self.DRIVERS.get(address)
+            if driver is not None and address not in known:
+                found.append(self.register(driver(i2c, address)))
+        return found
+
+    def trigger_all(self) -> int:
+        """
+        Start a measurement on every registered sensor.
+
+        Returns:
+            Milliseconds to wait before collect_all()
+        """
+        wait_ms = 0
+        for i, sensor in enumerate(self.sensors):
+            if sensor.trigger():
+                if sensor.conversion_ms > wait_ms:
+                    wait_ms = sensor.conversion_ms
+            else:
+                self.stats[i]["errors"] += 1
+        self.collecting = True
+        return wait_ms
+
+    def collect_all(self) -> int:
+        """
+        Read the results of the last trigger_all() from every sensor.
+
+        Returns:
+            Number of sensors that returned a valid reading
+        """
+        valid = 0
+        for i, sensor in enumerate(self.sensors):
+            stats = self.stats[i]
+            started = time.ticks_us()
+            ok = sensor.collect()
+            latency = time.ticks_diff(time.ticks_us(), started)
+            stats["last_latency_us"] = latency
+            if latency > stats["max_latency_us"]:
+                stats["max_latency_us"] = latency
+            if ok:
+                stats["reads"] += 1
+                valid += 1
+            else:
+                stats["errors"] += 1
+        self.collecting = False
+        return valid
 
 
 class DeviceController:
@@ -220,6 +632,8 @@ class DeviceController:
         self.on = False  # Current device state (on/off)
         self.next_alarm = 0  # Next time to change device state
         self.runtime = 0  # Duration device should remain in current state
+        self.scheduler = None  # Scheduler holding off_event
+        self.off_event = None  # Pending turn-off from _start_run()
 
     def get_current_time(self) -> int:
         """
@@ -255,21 +669,52 @@ class DeviceController:
         return self.runtime
 
     def device_on(self):
+        self._cancel_off()
         self.pin.on()
         self.on = True
 
     def device_off(self):
+        self._cancel_off()
         self.pin.off()
         self.on = False
 
+    def _cancel_off(self) -> None:
+        """
+        Drop the turn-off of an earlier run so it cannot end a newer one.
+        """
+        if self.off_event is not None:
+            self.scheduler.cancel(self.off_event)
+            self.off_event = None
+
+    def _run_for(self, scheduler, duration_ms: int, period_ms: int = 0) -> None:
+        """
+        Turn the device on for a run and set the next alarm.
+        """
+        self._start_run(scheduler, duration_ms)
+        self.next_alarm = time.ticks_add(self.get_current_time(), period_ms) if period_ms else 0
+
+    def _start_run(self, scheduler, duration_ms: int) -> None:
+        """
+        Turn the device on and schedule the matching turn-off.
+        """
+        self.device_on()
+        self.set_runtime_duration(duration_ms)
+        self.scheduler = scheduler
+        self.off_event = scheduler.call_later(duration_ms, self.device_off)
+
 
 class IsquaredCsensor:
-    def __init__(self, serial_clock_pin: int, serial_data_pin: int, frequency: int, address: int):
+    def __init__(self, serial_clock_pin: int, serial_data_pin: int, frequency: int, address: int,
+                 bus: int = 0, manager: I2CBusManager = None):
         self.scl = serial_clock_pin
         self.sda = serial_data_pin
         self.freq = frequency
         self.address = address
-        self.i2c = I2C(0, scl=Pin(self.scl), sda=Pin(self.sda), freq=self.freq)
+        if manager is not None:
+            # Share the bus with every other device on it
+            self.i2c = manager.bus(bus, self.scl, self.sda, self.freq)
+        else:
+            self.i2c = I2C(bus, scl=Pin(self.scl), sda=Pin(self.sda), freq=self.freq)
     
 
     
@@ -278,8 +723,108 @@ class IsquaredCsensor:
 
 
 class Pump(DeviceController):
-    def __init__(self, pin_number):
+    """
+    Pump whose runtime cutoff is enforced by a hardware timer.
+
+    device_on(duration_ms) arms a one-shot machine.Timer(-1). On the
+    RP2350 that is an alarm-pool timer, and with hard=True (passed
+    explicitly, though it is the rp2 default) its callback switches the
+    pin off at the deadline from interrupt context, so the pump stops on
+    time even while the main loop is stuck in a Wi-Fi reconnect, an HTTP
+    call or a sensor read. The callback therefore must not allocate.
+    """
+    def __init__(self, pin_number: int, history: int = 16):
+        """
+        Initialize a pump connected to a GPIO pin.
+
+        Args:
+            pin_number: The GPIO pin number the pump is connected to
+            history: Number of recent cutoff overruns to keep
+        """
         super().__init__(pin_number)
+        self.timer = Timer(-1)
+        self.deadline = 0  # ticks_ms at which the current run must end
+        # Preallocated so the timer callback never allocates
+        self.overruns = array('i', [0] * history)  # Recent cutoff overruns in ms
+        self.activations = 0
+        self.max_overrun_ms = 0
+        self._cutoff_callback = self._cutoff  # Bind once, not on every device_on
+
+    def device_on(self, duration_ms: int = 0):
+        """
+        Turn the pump on, optionally for a fixed duration.
+
+        Args:
+            duration_ms: Milliseconds until the timer cuts the pump off,
+                or 0 to run until device_off() is called
+        """
+        self.timer.deinit()
+        super().device_on()
+        self.deadline = 0
+        if duration_ms > 0:
+            self.set_runtime_duration(duration_ms)
+            self.deadline = self.runtime
+            self.timer.init(mode=Timer.ONE_SHOT, period=duration_ms, callback=self._cutoff_callback, hard=True)
+
+    def device_off(self):
+        self.timer.deinit()
+        super().device_off()
+
+    def _cutoff(self, timer) -> None:
+        """
+        Timer callback that ends a run and records how late it fired.
+
+        Runs as a hard interrupt: small-int arithmetic and preallocated
+        storage only.
+        """
+        self.pin.off()
+        self.on = False
+        overrun = time.ticks_diff(time.ticks_ms(), self.deadline)
+        self.overruns[self.activations % len(self.overruns)] = overrun
+        self.activations += 1
+        if overrun > self.max_overrun_ms:
+            self.max_overrun_ms = overrun
+
+    def _start_run(self, scheduler, duration_ms: int) -> None:
+        # The hardware timer ends the run, no scheduler turn-off needed
+        self.device_on(duration_ms)
+
+    def enforce_deadline(self, now: int = None) -> bool:
+        """
+        End the current run if its deadline has passed without the timer firing.
+
+        A backstop for the hard timer interrupt, which is held off while
+        interrupts are masked on core 0 (flash writes, for one); the
+        control loop calls this after every pass.
+
+        Args:
+            now: Current ticks_ms value (read from the clock if omitted)
+
+        Returns:
+            True if the run was cut off here
+        """
+        if not self.on or not self.deadline:
+            return False
+        if now is None:
+            now = time.ticks_ms()
+        if time.ticks_diff(now, self.deadline) < 0:
+            return False
+        self.timer.deinit()
+        self._cutoff(self.timer)
+        return True
+
+    def get_overruns(self) -> list:
+        """
+        Get the cutoff overruns of the most recent activations.
+
+        Returns:
+            Overruns in milliseconds, oldest first
+        """
+        size = len(self.overruns)
+        count = min(self.activations, size)
+        start = self.activations - count
+        return [self.overruns[(start + i) % size] for i in range(count)]
+
 
 class Lights(DeviceController):
     def __init__(self, pin_number):
@@ -0,0 +1,333 @@
+import os
+import time
+import ujson as json
+import utime
+import machine
+
+from sntp import set_rtc
+
+
+SNAPSHOT_PATH = "warm_state.json"
+SNAPSHOT_VERSION = 1
+
+# Power states that time is accounted to
+ACTIVE = 0  # Awake, radio off
+RADIO = 1  # Awake, radio on
+LIGHT = 2  # In machine.lightsleep()
+DEEP = 3  # In machine.deepsleep()
+STATE_NAMES = ("active", "radio", "light", "deep")
+
+
+class PowerManager:
+    """
+    Duty-cycles the controller between short bursts of work and sleep.
+
+    Instead of polling, the main loop calls idle(), which sleeps until the
+    next scheduled event (sensor round, pump cycle, report) or pump cutoff.
+    The radio is powered only while there is something to send or the
+    RTC is due a sync, and is shut down before every sleep; commands are
+    therefore only picked up while the radio is up.
+
+    In "light" mode the sleep is machine.lightsleep(), which keeps RAM,
+    GPIO state and the running pump timers. In "deep" mode idle gaps of at
+    least deep_sleep_ms with every device off use machine.deepsleep()
+    instead. That resets the chip, so the state needed to carry on (frame
+    sequence number, device cycles and their phase, RTC sync age, report
+    policy) is written to a small JSON snapshot in flash first, and boot()
+    restores it on wake so main() can skip the cold-boot work.
+
+    Time is accounted to the four power states and weighted by a
+    per-state current to give the average draw, and the latency from
+    each wake to the first message published after it is measured. The
+    currents are estimates for a Pico 2 W; calibrate them with a meter.
+    """
+    def __init__(
+        self,
+        scheduler,
+        wifi,
+        publisher,
+        control,
+        mode: str = "light",
+        min_sleep_ms: int = 500,
+        deep_sleep_ms: int = 120000,
+        max_sleep_ms: int = 3600000,
+        radio_timeout_ms: int = 30000,
+        radio_retry_ms: int = 300000,
+        current_ma: tuple = (22.0, 48.0, 1.4, 0.9),
+        path: str = SNAPSHOT_PATH,
+    ):
+        """
+        Initialize the manager; call boot() before starting any schedules.
+
+        Args:
+            scheduler: The Scheduler driving the main loop
+            wifi: WifiManager, suspended whenever the radio is not needed
+            publisher: MQTTPublisher whose pending messages need the radio
+            control: ControlCore holding the devices and their cycles
+            mode: "light" or "deep"
+            min_sleep_ms: Shorter idle gaps are slept with time.sleep_ms()
+            deep_sleep_ms: Shortest idle gap worth a deep sleep and reboot
+            max_sleep_ms: Longest single sleep
+            radio_timeout_ms: Longest the radio stays up for one burst of work
+            radio_retry_ms: Time after a radio timeout before the radio is
+                powered up again
+            current_ma: Draw in mA while active, with the radio on, in
+                light sleep and in deep sleep
+            path: Flash file holding the deep sleep snapshot
+        """
+        self.scheduler = scheduler
+        self.wifi = wifi
+        self.publisher = publisher
+        self.control = control
+        self.mode = mode
+        self.min_sleep_ms = min_sleep_ms
+        self.deep_sleep_ms = deep_sleep_ms
+        self.max_sleep_ms = max_sleep_ms
+        self.radio_timeout_ms = radio_timeout_ms
+        self.radio_retry_ms = radio_retry_ms
+        self.current_ma = current_ma
+        self.path = path
+        self.parts = []  # (name, save, restore) carried across deep sleep
+        self.holds = []  # Checks that keep the loop awake while any is true
+        self.radio_checks = []  # Checks that power the radio while any is true
+
+        now = time.ticks_ms()
+        self.warm = False
+        self.state_ms = [0, 0, 0, 0]  # Time spent in each power state
+        self.last_mark = now
+        self.radio_started = now
+        self.radio_gave_up = None  # ticks_ms of the last radio timeout
+        # Ticks start at 0 on reset, so a boot is timed from the moment the chip started
+        self.wake_started = 0
+        self.wake_published = publisher.published
+        self.awaiting = True  # Waiting for the first publish since the wake
+
+        # Counters
+        self.warm_boots = 0
+        self.light_sleeps = 0
+        self.deep_sleeps = 0
+        self.radio_timeouts = 0
+        self.boot_ms = None  # Boot to first publish
+        self.wakes = 0  # Wakes that published something
+        self.last_wake_ms = 0  # Wake to first publish
+        self.max_wake_ms = 0
+        self.total_wake_ms = 0
+
+    def register(self, name: str, save, restore) -> None:
+        """
+        Carry a piece of state across deep sleep.
+
+        Args:
+            name: Key in the snapshot
+            save: Zero-argument callable returning JSON-serialisable state
+            restore: Callable taking (state, slept_ms) that puts it back
+        """
+        self.parts.append((name, save, restore))
+
+    def keep_awake(self, check) -> None:
+        """
+        Stay awake (no sleep at all) while a check returns True.
+        """
+        self.holds.append(check)
+
+    def want_radio(self, check) -> None:
+        """
+        Keep the radio up while a check returns True.
+        """
+        self.radio_checks.append(check)
+
+    def boot(self) -> bool:
+        """
+        Restore the snapshot left by a deep sleep, if this boot is a wake from one.
+
+        Returns:
+            True on a warm boot; main() should then skip the cold-boot
+            schedule set-up
+        """
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            os.remove(self.path)  # One use only: a later power cut must boot cold
+        except (OSError, ValueError):
+            return False
+        if state.get("v") != SNAPSHOT_VERSION:
+            return False
+        # A power-on reset means the sleep was cut short; the snapshot is stale
+        if hasattr(machine, "reset_cause") and machine.reset_cause() == getattr(machine, "PWRON_RESET", None):
+            return False
+        slept_ms = state["sleep_ms"]
+        wake_time = state["time"] + slept_ms // 1000
+        if utime.time() < wake_time - 1:
+            set_rtc(wake_time)  # The RTC did not survive the reset
+        self.state_ms = state["energy"]
+        self.state_ms[DEEP] += slept_ms
+        (self.warm_boots, self.light_sleeps, self.deep_sleeps, self.radio_timeouts,
+         self.wakes, self.max_wake_ms, self.total_wake_ms) = state["counters"]
+        self.warm_boots += 1
+        for name, _, restore in self.parts:
+            if name in state:
+                restore(state[name], slept_ms)
+        self.warm = True
+        return True
+
+    def _save(self, sleep_ms: int) -> None:
+        state = {
+            "v": SNAPSHOT_VERSION,
+            "time": utime.time(),
+            "sleep_ms": sleep_ms,
+            "energy": self.state_ms,
+            "counters": [
+                self.warm_boots, self.light_sleeps, self.deep_sleeps, self.radio_timeouts,
+                self.wakes, self.max_wake_ms, self.total_wake_ms,
+            ],
+        }
+        for name, save, _ in self.parts:
+            state[name] = save()
+        with open(self.path, "w") as f:
+            json.dump(state, f)
+
+    def _account(self, now: int) -> None:
+        self.state_ms[ACTIVE if self.wifi.suspended else RADIO] += time.ticks_diff(now, self.last_mark)
+        self.last_mark = now
+
+    def _check_published(self, now: int) -> None:
+        if not self.awaiting or self.publisher.published == self.wake_published:
+            return
+        self.awaiting = False
+        latency = time.ticks_diff(now, self.wake_started)
+        if self.boot_ms is None:
+            self.boot_ms = latency
+        self.wakes += 1
+        self.last_wake_ms = latency
+        self.total_wake_ms += latency
+        if latency > self.max_wake_ms:
+            self.max_wake_ms = latency
+
+    def _radio_wanted(self, now: int) -> bool:
+        if self.radio_gave_up is not None:
+            if time.ticks_diff(now, self.radio_gave_up) < self.radio_retry_ms:
+                return False
+            self.radio_gave_up = None
+        if self.publisher.pending():
+            return True
+        for check in self.radio_checks:
+            if check():
+                return True
+        return False
+
+    def idle(self, poll_ms: int = 50) -> None:
+        """
+        Wait for the next piece of work, sleeping as deeply as it allows.
+
+        Call at the end of every main loop pass in place of
+        scheduler.sleep_until_next().
+
+        Args:
+            poll_ms: Longest wait while staying awake for the radio or a hold
+        """
+        now = time.ticks_ms()
+        self._account(now)
+        self._check_published(now)
+        scheduler = self.scheduler
+        for check in self.holds:
+            if check():
+                scheduler.sleep_until_next(poll_ms)
+                return
+
+        wifi = self.wifi
+        if self._radio_wanted(now):
+            if wifi.suspended:
+                wifi.resume()
+                self.radio_started = now
+            if wifi.is_connected() and self.publisher.count:
+                # Send straight away rather than at the flush interval
+                self.publisher.flush()
+                self._check_published(time.ticks_ms())
+            if time.ticks_diff(now, self.radio_started) < self.radio_timeout_ms:
+                scheduler.sleep_until_next(poll_ms)
+                return
+            print(f"Radio up for {self.radio_timeout_ms} ms without finishing, retrying later")
+            self.radio_timeouts += 1
+            self.radio_gave_up = now
+
+        if not wifi.suspended:
+            # Sends anything still queued, or moves it to the flash store
+            self.publisher.disconnect()
+            wifi.suspend()
+            now = time.ticks_ms()
+            self._account(now)
+
+        wait = scheduler.time_until_next(now)
+        if wait is None or wait > self.max_sleep_ms:
+            wait = self.max_sleep_ms
+        # Lightsleep may hold off the pump timer, so wake for the cutoff
+        cutoff = self.control.next_cutoff(now)
+        if cutoff is not None and cutoff < wait:
+            wait = cutoff
+        if wait < self.min_sleep_ms:
+            if wait > 0:
+                time.sleep_ms(wait)
+            return
+        if self.mode == "deep" and wait >= self.deep_sleep_ms and not self.control.devices_on():
+            self._deep_sleep(wait)
+            return
+        self._light_sleep(wait)
+
+    def _light_sleep(self, sleep_ms: int) -> None:
+        started = time.ticks_ms()
+        machine.lightsleep(sleep_ms)
+        now = time.ticks_ms()
+        self.state_ms[LIGHT] += time.ticks_diff(now, started)
+        self.light_sleeps += 1
+        self.last_mark = now
+        self.wake_started = now
+        self.wake_published = self.publisher.published
+        self.awaiting = True
+
+    def _deep_sleep(self, sleep_ms: int) -> None:
+        self.deep_sleeps += 1
+        self._save(sleep_ms)
+        if self.publisher.store is not None:
+            self.publisher.store.close()
+        print(f"Deep sleep for {sleep_ms} ms")
+        machine.deepsleep(sleep_ms)  # Resets the chip on wake; boot() picks up from here
+
+    def average_ma(self) -> float:
+        """
+        Get the average current draw since the first cold boot.
+
+        Returns:
+            Time-weighted average of the per-state currents in mA
+        """
+        total = 0
+        weighted = 0.0
+        for state, ms in enumerate(self.state_ms):
+            total += ms
+            weighted += ms * self.current_ma[state]
+        return weighted / total if total else 0.0
+
+    def stats(self) -> dict:
+        """
+        Get the sleep, wake latency and energy counters.
+
+        Returns:
+            Dict of counters, wake-to-first-publish latencies, time per
+            power state and the average current
+        """
+        message = {
+            "mode": self.mode,
+            "warm": self.warm,
+            "warm_boots": self.warm_boots,
+            "light_sleeps": self.light_sleeps,
+            "deep_sleeps": self.deep_sleeps,
+            "radio_timeouts": self.radio_timeouts,
+            "boot_ms": self.boot_ms,
+            "wakes": self.wakes,
+            "wake_ms": self.last_wake_ms,
+            "wake_max_ms": self.max_wake_ms,
+            "wake_avg_ms": self.total_wake_ms // self.wakes if self.wakes else 0,
+            "avg_ma": round(self.average_ma(), 2),
+        }
+        for state, name in enumerate(STATE_NAMES):
+            message[name + "_s"] = self.state_ms[state] // 1000
+        return message
@@ -0,0 +1,326 @@
+import gc
+import time
+from array import array
+
+
+class Probe:
+    """
+    Context manager that times one block of code into a Profiler slot.
+
+    Probes are created once per name and reused, so entering and leaving
+    one allocates nothing. A probe is not reentrant; use a separate name
+    for code that can nest inside itself.
+    """
+    def __init__(self, profiler, slot: int):
+        self.profiler = profiler
+        self.slot = slot
+        self.started = 0
+
+    def __enter__(self):
+        self.started = time.ticks_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.slot, time.ticks_diff(time.ticks_us(), self.started))
+        return False
+
+
+class Profiler:
+    """
+    Fixed-size ticks_us histograms for the control loop and its callees.
+
+    Every probe owns a row of log2 buckets in one preallocated array:
+    bucket 0 counts calls under 2 us, bucket i calls of 2**i up to
+    2**(i+1) us, and the last bucket everything slower. Recording is a
+    couple of ticks_us reads and a few integer operations, and a report()
+    goes out at most once per interval, so the profiler's own cost stays
+    bounded however often the probes fire.
+
+    Alongside the timings it samples gc.mem_free()/mem_alloc(), the heap
+    churn between samples and the pause of a full gc.collect().
+    """
+    def __init__(self, max_probes: int = 12, buckets: int = 16, enabled: bool = True):
+        """
+        Initialize the profiler with empty histograms.
+
+        Args:
+            max_probes: Largest number of distinct probe names
+            buckets: Histogram buckets per probe; the last one covers
+                everything from 2**(buckets-1) us up
+            enabled: Record timings; when False probes cost two ticks reads
+        """
+        self.max_probes = max_probes
+        self.buckets = buckets
+        self.enabled = enabled
+        self.names = []
+        self.probes = {}
+        self.histograms = array('I', [0] * (max_probes * buckets))
+        self.counts = array('I', [0] * max_probes)
+        self.total_us = array('I', [0] * max_probes)
+        self.max_us = array('I', [0] * max_probes)
+
+        # Memory samples for the current reporting window
+        self.window_started = time.ticks_ms()
+        self.mem_free = 0
+        self.mem_alloc = 0
+        self.min_free = 0
+        self.churn_bytes = 0  # Allocated since the previous sample
+        self.gc_pause_us = 0
+        self.max_gc_pause_us = 0
+        self.last_alloc = gc.mem_alloc()  # Heap in use after the last timed collection
+        self.reports = 0
+        self.report_event = None  # Recurring report Event from start()
+        self.first_report_ms = None  # Delay of the first report, restored after a deep sleep
+
+    def _slot(self, name: str) -> int:
+        slot = self.probes.get(name)
+        if slot is None:
+            if len(self.names) == self.max_probes:
+                raise ValueError("too many profiler probes")
+            slot = len(self.names)
+            self.names.append(name)
+            self.probes[name] = slot
+        return slot
+
+    def probe(self, name: str) -> Probe:
+        """
+        Get the reusable context manager for a probe name.
+
+        Create probes at startup and keep them; looking one up in a hot
+        loop costs a dict lookup per call.
+
+        Args:
+            name: Short probe name, sent in the diagnostics report
+
+        Returns:
+            The Probe, usable as "with probe:"
+        """
+        return Probe(self, self._slot(name))
+
+    def record(self, slot: int, elapsed_us: int) -> None:
+        """
+        Add one timing to a probe's histogram.
+
+        Args:
+            slot: Probe slot from probe()
+            elapsed_us: Measured duration in microseconds
+        """
+        if not self.enabled:
+            return
+        if elapsed_us < 0:
+            elapsed_us = 0
+        bucket = 0
+        value = elapsed_us >> 1
+        last = self.buckets - 1
+        while value and bucket < last:
+            value >>= 1
+            bucket += 1
+        self.histograms[slot * self.buckets + bucket] += 1
+        self.counts[slot] += 1
+        self.total_us[slot] = (self.total_us[slot] + elapsed_us) & 0xFFFFFFFF
+        if elapsed_us > self.max_us[slot]:
+            self.max_us[slot] = elapsed_us
+
+    def wrap(self, name: str, arity: int = -1):
+        """
+        Decorator that times every call of a function.
+
+        A *args/**kwargs wrapper builds an argument tuple (and a dict when
+        keywords are passed) on every call. Pass the number of positional
+        arguments, self included, to get a fixed-arity wrapper that
+        allocates nothing; wrappers for 0 to 3 arguments are available.
+
+        Args:
+            name: Probe name for the function
+            arity: Positional argument count, or -1 for any arguments
+
+        Returns:
+            A decorator producing the timed wrapper
+        """
+        slot = self._slot(name)
+        record = self.record
+
+        def decorator(function):
+            if arity == 0:
+                def timed():
+                    started = time.ticks_us()
+                    try:
+                        return function()
+                    finally:
+                        record(slot, time.ticks_diff(time.ticks_us(), started))
+            elif arity == 1:
+                def timed(a):
+                    started = time.ticks_us()
+                    try:
+                        return function(a)
+                    finally:
+                        record(slot, time.ticks_diff(time.ticks_us(), started))
+            elif arity == 2:
+                def timed(a, b):
+                    started = time.ticks_us()
+                    try:
+                        return function(a, b)
+                    finally:
+                        record(slot, time.ticks_diff(time.ticks_us(), started))
+            elif arity == 3:
+                def timed(a, b, c):
+                    started = time.ticks_us()
+                    try:
+                        return function(a, b, c)
+                    finally:
+                        record(slot, time.ticks_diff(time.ticks_us(), started))
+            elif arity < 0:
+                def timed(*args, **kwargs):
+                    started = time.ticks_us()
+                    try:
+                        return function(*args, **kwargs)
+                    finally:
+                        record(slot, time.ticks_diff(time.ticks_us(), started))
+            else:
+                raise ValueError("no fixed-arity wrapper for that many arguments")
+            return timed
+        return decorator
+
+    def instrument(self, owner, attribute: str, name: str = None, arity: int = -1):
+        """
+        Replace a function or method on a class or module with a timed wrapper.
+
+        This instruments existing code without editing it, e.g.
+        instrument(AHT21, "collect").
+
+        Args:
+            owner: Class or module holding the function
+            attribute: Name of the function to wrap
+            name: Probe name (defaults to attribute)
+            arity: Positional argument count, see wrap()
+
+        Returns:
+            The wrapper that was installed
+        """
+        timed = self.wrap(name or attribute, arity)(getattr(owner, attribute))
+        setattr(owner, attribute, timed)
+        return timed
+
+    def sample_memory(self, collect: bool = False) -> None:
+        """
+        Sample heap usage and, if collect is set, time a full collection.
+
+        At a collection the churn is the allocation count just before it
+        minus what survived the previous one, i.e. the bytes allocated in
+        between (an under-estimate if the GC also ran on its own).
+
+        Args:
+            collect: Run and time gc.collect() as part of the sample
+        """
+        if collect:
+            self.churn_bytes = max(0, gc.mem_alloc() - self.last_alloc)
+            started = time.ticks_us()
+            gc.collect()
+            self.gc_pause_us = time.ticks_diff(time.ticks_us(), started)
+            if self.gc_pause_us > self.max_gc_pause_us:
+                self.max_gc_pause_us = self.gc_pause_us
+            self.last_alloc = gc.mem_alloc()
+        self.mem_alloc = gc.mem_alloc()
+        self.mem_free = gc.mem_free()
+        if not self.min_free or self.mem_free < self.min_free:
+            self.min_free = self.mem_free
+
+    def report(self, reset: bool = True) -> dict:
+        """
+        Build the diagnostics message for the current window.
+
+        Keys are kept short to keep the payload small. "p" maps each
+        probe with calls in the window to [count, mean_us, max_us,
+        buckets...], with trailing empty buckets trimmed.
+
+        Args:
+            reset: Clear the histograms so the next report covers a new window
+
+        Returns:
+            Dict ready to publish as JSON
+        """
+        probes = {}
+        for slot, name in enumerate(self.names):
+            count = self.counts[slot]
+            if not count:
+                continue
+            base = slot * self.buckets
+            end = base + self.buckets
+            while end > base and not self.histograms[end - 1]:
+                end -= 1
+            probes[name] = [count, self.total_us[slot] // count, self.max_us[slot]] + list(self.histograms[base:end])
+        now = time.ticks_ms()
+        message = {
+            "win": time.ticks_diff(now, self.window_started) // 1000,
+            "free": self.mem_free,
+            "alloc": self.mem_alloc,
+            "min_free": self.min_free,
+            "churn": self.churn_bytes,
+            "gc_us": self.gc_pause_us,
+            "gc_max_us": self.max_gc_pause_us,
+            "p": probes,
+        }
+        self.reports += 1
+        if reset:
+            self.reset()
+            self.window_started = now
+        return message
+
+    def reset(self) -> None:
+        """
+        Clear every histogram and counter.
+        """
+        for i in range(len(self.histograms)):
+            self.histograms[i] = 0
+        for i in range(self.max_probes):
+            self.counts[i] = 0
+            self.total_us[i] = 0
+            self.max_us[i] = 0
+        self.max_gc_pause_us = 0
+
+    def start(self, scheduler, publish, interval_ms: int = 60000, sample_ms: int = 10000):
+        """
+        Sample memory and publish reports on a scheduler.
+
+        The heap is sampled every sample_ms; the timed full collection
+        runs once per report so its pause is paid once per interval.
+
+        Args:
+            scheduler: The Scheduler driving the main loop
+            publish: Callable taking the report dict, e.g. a closure over
+                MQTTPublisher.publish with the diagnostics topic
+            interval_ms: Milliseconds between reports
+            sample_ms: Milliseconds between memory samples
+
+        Returns:
+            The recurring report Event
+        """
+        def publish_report():
+            self.sample_memory(True)
+            publish(self.report())
+
+        scheduler.call_every(sample_ms, self.sample_memory, 0)
+        self.report_event = scheduler.call_every(interval_ms, publish_report, self.first_report_ms)
+        return self.report_event
+
+    def snapshot(self):
+        """
+        Get the time until the next report, to carry across a deep sleep.
+
+        Returns:
+            Milliseconds until the next report, or None if not started
+        """
+        if self.report_event is None:
+            return None
+        return max(0, time.ticks_diff(self.report_event.due, time.ticks_ms()))
+
+    def restore(self, remaining_ms, slept_ms: int) -> None:
+        """
+        Keep the report interval running across a deep sleep; call before start().
+
+        Args:
+            remaining_ms: Value returned by snapshot()
+            slept_ms: Time spent asleep since the snapshot
+        """
+        if remaining_ms is not None:
+            self.first_report_ms = max(0, remaining_ms - slept_ms)
@@ -0,0 +1,200 @@
+import time
+
+
+class ReportPolicy:
+    """
+    Decides which sampled metrics are worth publishing.
+
+    A metric is reported when it has moved by at least its deadband since
+    it was last reported, while it is outside its alarm band (and once
+    more when it comes back in), or while it is changing faster than its
+    rate limit. Everything is reported together at least once per
+    heartbeat, so a reader can carry each value forward for up to one
+    heartbeat and know that any longer silence is a real gap.
+
+    On a steady day this cuts messages by an order of magnitude compared
+    with publishing every sample, while an excursion is still reported at
+    the full sampling rate. fast is set while any metric is in alarm or
+    over its rate limit, so the caller can shorten the sampling interval
+    for the excursion as well.
+    """
+    # Per-metric state slots
+    DEADBAND = 0
+    LOW = 1
+    HIGH = 2
+    RATE = 3
+    SENT_VALUE = 4
+    SENT_AT = 5
+    LAST_VALUE = 6
+    LAST_AT = 7
+    ALARM = 8
+
+    def __init__(self, heartbeat_ms: int = 900000, enabled: bool = True):
+        """
+        Initialize the policy with no metrics configured.
+
+        Args:
+            heartbeat_ms: Longest any metric goes unreported
+            enabled: When False every sample is reported in full
+        """
+        self.heartbeat_ms = heartbeat_ms
+        self.enabled = enabled
+        self.metrics = {}  # Metric id -> state list, see the slots above
+        self.last_full = None  # ticks_ms of the last full report
+        self.fast = False  # Some metric was in alarm or moving fast at the last sample
+
+        # Counters
+        self.samples = 0
+        self.reports = 0
+        self.values_sent = 0
+        self.values_suppressed = 0
+
+    def configure(self, metric_id: int, deadband: int = 0, low: int = None, high: int = None,
+                  rate: int = None) -> None:
+        """
+        Set the reporting thresholds for a metric.
+
+        All values are fixed-point, in the same units as the telemetry.
+
+        Args:
+            metric_id: telemetry_frame metric id
+            deadband: Smallest change worth reporting; 0 reports any change
+            low: Report every sample while the value is below this
+            high: Report every sample while the value is above this
+            rate: Report every sample while the value changes faster than
+                this many units per minute
+        """
+        self.metrics[metric_id] = [deadband, low, high, rate, None, 0, None, 0, False]
+
+    def _state(self, metric_id: int) -> list:
+        state = self.metrics.get(metric_id)
+        if state is None:
+            self.configure(metric_id)
+            state = self.metrics[metric_id]
+        return state
+
+    def select(self, sample: dict, now: int = None):
+        """
+        Pick the metrics of one sample to report.
+
+        Args:
+            sample: Metric id -> fixed-point value for the latest readings
+            now: Current ticks_ms value (read from the clock if omitted)
+
+        Returns:
+            (metrics, full) where metrics is a list of (metric_id, value)
+            pairs to send, empty if nothing is due, and full is True when
+            the list is a full heartbeat report
+        """
+        if now is None:
+            now = time.ticks_ms()
+        self.samples += 1
+        full = (not self.enabled or self.last_full is None
+                or time.ticks_diff(now, self.last_full) >= self.heartbeat_ms)
+        selected = []
+        fast = False
+        for metric_id, value in sample.items():
+            state = self._state(metric_id)
+            due = self._due(state, value, now)
+            if state[self.ALARM] or self._moving(state, value, now):
+                fast = True
+            if full or due:
+                selected.append((metric_id, value))
+                state[self.SENT_VALUE] = value
+                state[self.SENT_AT] = now
+            state[self.LAST_VALUE] = value
+            state[self.LAST_AT] = now
+        self.fast = fast
+        if full:
+            self.last_full = now
+        if selected:
+            self.reports += 1
+        self.values_sent += len(selected)
+        self.values_suppressed += len(sample) - len(selected)
+        return selected, full
+
+    def _due(self, state: list, value: int, now: int) -> bool:
+        low = state[self.LOW]
+        high = state[self.HIGH]
+        alarm = (low is not None and value < low) or (high is not None and value > high)
+        was_alarm = state[self.ALARM]
+        state[self.ALARM] = alarm
+        sent = state[self.SENT_VALUE]
+        if sent is None:
+            return True
+        # Every sample during an alarm, plus the one that clears it
+        if alarm or was_alarm:
+            return True
+        if abs(value - sent) >= state[self.DEADBAND] and value != sent:
+            return True
+        return self._moving(state, value, now)
+
+    def _moving(self, state: list, value: int, now: int) -> bool:
+        """
+        Check whether a value changed faster than its rate limit since the last sample.
+        """
+        rate = state[self.RATE]
+        last = state[self.LAST_VALUE]
+        if rate is None or last is None:
+            return False
+        elapsed = time.ticks_diff(now, state[self.LAST_AT])
+        return elapsed > 0 and abs(value - last) * 60000 >= rate * elapsed
+
+    def snapshot(self) -> list:
+        """
+        Get the reporting state to carry across a deep sleep.
+
+        Times are saved as ages because ticks restart on wake.
+
+        Returns:
+            [full report age ms or None, [[metric id, sent value,
+            sent age ms, last value, last age ms, alarm], ...]]
+        """
+        now = time.ticks_ms()
+        metrics = []
+        for metric_id, state in self.metrics.items():
+            if state[self.SENT_VALUE] is None:
+                continue
+            metrics.append([
+                metric_id,
+                state[self.SENT_VALUE], time.ticks_diff(now, state[self.SENT_AT]),
+                state[self.LAST_VALUE], time.ticks_diff(now, state[self.LAST_AT]),
+                state[self.ALARM],
+            ])
+        full_age = None if self.last_full is None else time.ticks_diff(now, self.last_full)
+        return [full_age, metrics]
+
+    def restore(self, saved: list, slept_ms: int) -> None:
+        """
+        Restore the reporting state saved by snapshot(), so a wake does not
+        force a full report.
+
+        Args:
+            saved: Value returned by snapshot()
+            slept_ms: Time spent asleep since the snapshot
+        """
+        full_age, metrics = saved
+        now = time.ticks_ms()
+        if full_age is not None and full_age + slept_ms < self.heartbeat_ms:
+            self.last_full = time.ticks_add(now, -(full_age + slept_ms))
+        for metric_id, sent, sent_age, last, last_age, alarm in metrics:
+            state = self._state(metric_id)
+            state[self.SENT_VALUE] = sent
+            state[self.SENT_AT] = time.ticks_add(now, -min(sent_age + slept_ms, self.heartbeat_ms))
+            state[self.LAST_VALUE] = last
+            state[self.LAST_AT] = time.ticks_add(now, -min(last_age + slept_ms, self.heartbeat_ms))
+            state[self.ALARM] = alarm
+
+    def stats(self) -> dict:
+        """
+        Get the policy counters.
+
+        Returns:
+            Dict of samples seen, reports made and values sent or suppressed
+        """
+        return {
+            "samples": self.samples,
+            "reports": self.reports,
+            "values_sent": self.values_sent,
+            "values_suppressed": self.values_suppressed,
+        }
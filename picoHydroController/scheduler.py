@@ -0,0 +1,226 @@
+import time
+
+
+class Event:
+    """
+    A scheduled callback held by the Scheduler.
+
+    Events are ordered by their due tick; a non-zero period makes the
+    event re-arm itself after each dispatch.
+    """
+    def __init__(self, due: int, seq: int, callback, period: int):
+        """
+        Initialize a scheduled event.
+
+        Args:
+            due: ticks_ms value at which the callback should run
+            seq: Insertion counter used to break ties between equal due times
+            callback: Zero-argument callable to run
+            period: Repeat interval in milliseconds, or 0 for a one-shot
+        """
+        self.due = due
+        self.seq = seq
+        self.callback = callback
+        self.period = period
+        self.active = True
+
+    def before(self, other) -> bool:
+        """
+        Check whether this event is due before another one.
+
+        ticks_ms wraps around, so due times are compared with ticks_diff
+        rather than directly.
+        """
+        diff = time.ticks_diff(self.due, other.due)
+        if diff != 0:
+            return diff < 0
+        return self.seq < other.seq
+
+
+class Scheduler:
+    """
+    Central timer for device alarms, runtimes and recurring schedules.
+
+    Events live in a binary min-heap ordered on ticks_ms, so registering
+    or dispatching an event costs O(log n) however many devices are
+    registered, and the main loop can sleep exactly until the next one
+    is due instead of polling every device.
+    """
+    def __init__(self):
+        """
+        Initialize an empty scheduler.
+        """
+        self.heap = []
+        self.seq = 0
+        self.dispatched = 0
+        self.max_lateness_ms = 0  # Worst dispatch delay seen past an event's due time
+
+    def _push(self, event: Event) -> None:
+        heap = self.heap
+        heap.append(event)
+        i = len(heap) - 1
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not event.before(heap[parent]):
+                break
+            heap[i] = heap[parent]
+            i = parent
+        heap[i] = event
+
+    def _pop(self) -> Event:
+        heap = self.heap
+        top = heap[0]
+        last = heap.pop()
+        if heap:
+            n = len(heap)
+            i = 0
+            while True:
+                child = 2 * i + 1
+                if child >= n:
+                    break
+                if child + 1 < n and heap[child + 1].before(heap[child]):
+                    child += 1
+                if not heap[child].before(last):
+                    break
+                heap[i] = heap[child]
+                i = child
+            heap[i] = last
+        return top
+
+    def call_at(self, due: int, callback, period: int = 0) -> Event:
+        """
+        Schedule a callback at an absolute tick.
+
+        Args:
+            due: ticks_ms value at which to run the callback
+            callback: Zero-argument callable to run
+            period: Repeat interval in milliseconds, or 0 for a one-shot
+
+        Returns:
+            The scheduled Event, which can be passed to cancel()
+        """
+        self.seq += 1
+        event = Event(due, self.seq, callback, period)
+        self._push(event)
+        return event
+
+    def call_later(self, delay_ms: int, callback) -> Event:
+        """
+        Schedule a one-shot callback after a delay.
+
+        Args:
+            delay_ms: Milliseconds from now to run the callback
+            callback: Zero-argument callable to run
+
+        Returns:
+            The scheduled Event
+        """
+        return self.call_at(time.ticks_add(time.ticks_ms(), delay_ms), callback)
+
+    def call_every(self, period_ms: int, callback, first_delay_ms: int = None) -> Event:
+        """
+        Schedule a recurring callback.
+
+        Args:
+            period_ms: Milliseconds between runs
+            callback: Zero-argument callable to run
+            first_delay_ms: Delay before the first run (defaults to period_ms)
+
+        Returns:
+            The scheduled Event
+        """
+        if first_delay_ms is None:
+            first_delay_ms = period_ms
+        due = time.ticks_add(time.ticks_ms(), first_delay_ms)
+        return self.call_at(due, callback, period_ms)
+
+    def cancel(self, event: Event) -> None:
+        """
+        Cancel a scheduled event. It is discarded when it reaches the top
+        of the heap.
+
+        Args:
+            event: Event returned by one of the call_* methods
+        """
+        event.active = False
+
+    def _discard_cancelled(self) -> None:
+        while self.heap and not self.heap[0].active:
+            self._pop()
+
+    def time_until_next(self, now: int = None):
+        """
+        Get the time until the next event is due.
+
+        Args:
+            now: Current ticks_ms value (read from the clock if omitted)
+
+        Returns:
+            Milliseconds until the next event (0 if overdue), or None if
+            nothing is scheduled
+        """
+        self._discard_cancelled()
+        if not self.heap:
+            return None
+        if now is None:
+            now = time.ticks_ms()
+        return max(0, time.ticks_diff(self.heap[0].due, now))
+
+    def run_pending(self, now: int = None) -> int:
+        """
+        Dispatch every event that is due.
+
+        Args:
+            now: Current ticks_ms value (read from the clock if omitted)
+
+        Returns:
+            Number of callbacks run
+        """
+        if now is None:
+            now = time.ticks_ms()
+        ran = 0
+        heap = self.heap
+        while heap:
+            event = heap[0]
+            if not event.active:
+                self._pop()
+                continue
+            lateness = time.ticks_diff(now, event.due)
+            if lateness < 0:
+                break
+            self._pop()
+            if lateness > self.max_lateness_ms:
+                self.max_lateness_ms = lateness
+            if event.period:
+                # Re-arm from the due time, not from now, so schedules don't drift,
+                # but skip periods missed during a stall instead of bursting
+                event.due = time.ticks_add(event.due, event.period)
+                if time.ticks_diff(event.due, now) <= 0:
+                    event.due = time.ticks_add(now, event.period)
+                self._push(event)
+            else:
+                event.active = False
+            try:
+                event.callback()
+            except Exception as e:
+                print(f"Scheduled callback failed: {e}")
+            ran += 1
+        self.dispatched += ran
+        return ran
+
+    def sleep_until_next(self, max_sleep_ms: int = 1000) -> None:
+        """
+        Sleep until the next event is due, but no longer than max_sleep_ms.
+
+        Args:
+            max_sleep_ms: Upper bound on the sleep so other loop work
+                (network polling) still runs
+        """
+        wait = self.time_until_next()
+        if wait is None or wait > max_sleep_ms:
+            wait = max_sleep_ms
+        if wait > 0:
+            time.sleep_ms(wait)
+
+    def __len__(self) -> int:
+        return len(self.heap)
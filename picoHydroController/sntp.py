@@ -0,0 +1,382 @@
+import socket
+import struct
+import time
+from machine import RTC
+
+
+NTP_PORT = 123
+NTP_TO_UNIX = 2208988800  # Seconds from 1900-01-01 to 1970-01-01
+
+# Standard UTC offset in seconds and whether US daylight saving applies
+TIMEZONES = {
+    "UTC": (0, False),
+    "New_York": (-5 * 3600, True),
+    "Chicago": (-6 * 3600, True),
+    "Denver": (-7 * 3600, True),
+    "Phoenix": (-7 * 3600, False),
+    "Los_Angeles": (-8 * 3600, True),
+    "Anchorage": (-9 * 3600, True),
+    "Honolulu": (-10 * 3600, False),
+}
+
+
+def days_from_civil(year: int, month: int, day: int) -> int:
+    """
+    Convert a calendar date to days since 1970-01-01.
+
+    Args:
+        year: Four digit year
+        month: Month 1-12
+        day: Day of month 1-31
+
+    Returns:
+        Days since the Unix epoch
+    """
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def civil_from_days(days: int) -> tuple:
+    """
+    Convert days since 1970-01-01 to a calendar date.
+
+    Args:
+        days: Days since the Unix epoch
+
+    Returns:
+        Tuple of (year, month, day, weekday) with Monday as weekday 0
+    """
+    weekday = (days + 3) % 7  # 1970-01-01 was a Thursday
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    day = doy - (153 * mp + 2) // 5 + 1
+    month = mp + (3 if mp < 10 else -9)
+    year = yoe + era * 400 + (month <= 2)
+    return year, month, day, weekday
+
+
+def _nth_sunday(year: int, month: int, n: int) -> int:
+    """
+    Get the day number (since 1970-01-01) of the nth Sunday of a month.
+    """
+    first = days_from_civil(year, month, 1)
+    to_sunday = (6 - (first + 3) % 7) % 7
+    return first + to_sunday + 7 * (n - 1)
+
+
+def utc_offset(unix_seconds: int, timezone: str) -> int:
+    """
+    Get the local UTC offset for a zone in the offset table.
+
+    US daylight saving runs from 2:00 local standard time on the second
+    Sunday of March to 2:00 local daylight time on the first Sunday of
+    November.
+
+    Args:
+        unix_seconds: UTC time in seconds since 1970-01-01
+        timezone: Zone name from TIMEZONES (e.g. "Chicago")
+
+    Returns:
+        Offset from UTC in seconds
+    """
+    std_offset, dst = TIMEZONES.get(timezone, (0, False))
+    if not dst:
+        return std_offset
+    local = unix_seconds + std_offset
+    year = civil_from_days(local // 86400)[0]
+    start = _nth_sunday(year, 3, 2) * 86400 + 2 * 3600
+    end = _nth_sunday(year, 11, 1) * 86400 + 3600
+    if start <= local < end:
+        return std_offset + 3600
+    return std_offset
+
+
+def set_rtc(local_seconds: int) -> None:
+    """
+    Set the RTC to a local time.
+
+    The RTC counts whole seconds from the moment it is written, so call
+    this on a second boundary to keep the fraction from being lost.
+
+    Args:
+        local_seconds: Local time in seconds since 1970-01-01
+    """
+    year, month, day, weekday = civil_from_days(local_seconds // 86400)
+    remainder = local_seconds % 86400
+    RTC().datetime((
+        year, month, day, weekday,
+        remainder // 3600, (remainder % 3600) // 60, remainder % 60, 0,
+    ))
+
+
+class TimeSync:
+    """
+    Lightweight SNTP client that keeps the RTC in step with NTP.
+
+    One 48-byte UDP exchange replaces the HTTPS time API request. The
+    server time is corrected by half of the round trip (less the time
+    the server spent processing the request), the local clock's drift
+    against NTP is measured between syncs, and the next sync is
+    scheduled for when that drift is expected to reach max_error_ms.
+    """
+    def __init__(
+        self,
+        timezone: str = "Chicago",
+        host: str = "pool.ntp.org",
+        port: int = NTP_PORT,
+        timeout_ms: int = 500,
+        max_error_ms: int = 250,
+        min_interval_ms: int = 600000,
+        max_interval_ms: int = 86400000,
+    ):
+        """
+        Initialize the client without contacting the server.
+
+        Args:
+            timezone: Zone name from TIMEZONES used when setting the RTC
+            host: NTP server host name or IP address
+            port: NTP server UDP port
+            timeout_ms: Time to wait for the server reply; the socket
+                blocks the loop for this long when a reply is lost
+            max_error_ms: Clock error allowed to build up between syncs
+            min_interval_ms: Shortest time between syncs
+            max_interval_ms: Longest time between syncs
+        """
+        self.timezone = timezone
+        self.host = host
+        self.port = port
+        self.timeout_ms = timeout_ms
+        self.max_error_ms = max_error_ms
+        self.min_interval_ms = min_interval_ms
+        self.max_interval_ms = max_interval_ms
+        self.packet = bytearray(48)
+        self.addr = None  # Resolved server address, looked up again after a failure
+
+        self.synced = False
+        self.restored = False  # Sync state came from a deep sleep snapshot
+        self.last_sync_ms = 0  # NTP time in Unix milliseconds at the last sync
+        self.age_ms = 0  # Time since the last sync, summed so it outlasts a ticks_ms wrap
+        self.age_ticks = 0  # ticks_ms when age_ms was last brought up to date
+        self.drift_ppm = 0  # Local clock drift against NTP, + means running slow
+        self.offset_ms = 0  # Clock step applied at the last sync
+        self.last_rtt_ms = 0
+        self.interval_ms = min_interval_ms
+        self.syncs = 0
+        self.failures = 0
+        self.kisses = 0  # Kiss-o'-death replies: the server asked us to back off
+
+    def _query(self):
+        """
+        Run one SNTP exchange.
+
+        Returns:
+            Tuple of (NTP time in Unix ms at the moment of return,
+            round trip in ms), or None on failure
+        """
+        packet = self.packet
+        for i in range(48):
+            packet[i] = 0
+        packet[0] = 0x23  # LI 0, version 4, mode 3 (client)
+        addr = self.addr
+        if addr is None:
+            # getaddrinfo() blocks, so look the server up once, not on every sync
+            try:
+                addr = socket.getaddrinfo(self.host, self.port)[0][-1]
+            except OSError as e:
+                print(f"NTP lookup failed: {e}")
+                return None
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.settimeout(self.timeout_ms / 1000)
+            sent = time.ticks_ms()
+            sock.sendto(packet, addr)
+            reply = sock.recv(48)
+            received = time.ticks_ms()
+        except OSError as e:
+            print(f"NTP request failed: {e}")
+            self.addr = None
+            return None
+        finally:
+            sock.close()
+        self.addr = addr
+
+        if len(reply) < 48:
+            return None
+        if reply[1] == 0:
+            # Stratum 0 is a kiss-o'-death; its timestamps must not be used
+            self.kisses += 1
+            print(f"NTP server sent kiss-o'-death {bytes(reply[12:16])}")
+            return None
+        rx_s, rx_f, tx_s, tx_f = struct.unpack_from("!IIII", reply, 32)
+        if tx_s == 0:
+            return None
+        rtt = time.ticks_diff(received, sent)
+        server_ms = ((tx_s - rx_s) * 1000) + ((tx_f - rx_f) * 1000 >> 32)
+        transmit_ms = (tx_s - NTP_TO_UNIX) * 1000 + (tx_f * 1000 >> 32)
+        # The reply spent half the network round trip in flight
+        return transmit_ms + max(0, rtt - server_ms) // 2, rtt
+
+    def sync(self, scheduler=None) -> bool:
+        """
+        Query the NTP server, set the RTC and update the drift estimate.
+
+        The RTC is written on the next second boundary, up to a second
+        after the reply. With a scheduler the write is scheduled for then
+        and sync() returns straight away; without one it sleeps.
+
+        Args:
+            scheduler: The Scheduler driving the main loop, or None to block
+
+        Returns:
+            True if the server replied and the clock is being set
+        """
+        result = self._query()
+        if result is None:
+            self.failures += 1
+            return False
+        now_ms, rtt = result
+
+        if self.synced and not self.restored:
+            elapsed = self.sync_age_ms()
+            estimate = self.last_sync_ms + elapsed
+            self.offset_ms = now_ms - estimate
+            if elapsed > 0:
+                self.drift_ppm = self.offset_ms * 1000000 // elapsed
+        self.synced = True
+        self.restored = False
+        self.last_sync_ms = now_ms
+        self.age_ms = 0
+        self.age_ticks = time.ticks_ms()
+        self.last_rtt_ms = rtt
+        self.syncs += 1
+        self.interval_ms = self._next_interval()
+
+        # Wait for the next second to start rather than truncate up to 999 ms away
+        local_ms = now_ms + utc_offset(now_ms // 1000, self.timezone) * 1000
+        wait_ms = -local_ms % 1000
+        if scheduler is None:
+            if wait_ms:
+                time.sleep_ms(wait_ms)
+            set_rtc((local_ms + wait_ms) // 1000)
+            return True
+        replied = time.ticks_ms()
+
+        def write_rtc():
+            # Count from the reply, so a late dispatch costs only its own lateness
+            set_rtc((local_ms + time.ticks_diff(time.ticks_ms(), replied)) // 1000)
+        scheduler.call_later(wait_ms, write_rtc)
+        return True
+
+    def _next_interval(self) -> int:
+        """
+        Get the time until the measured drift uses up the error budget.
+        """
+        if not self.drift_ppm:
+            return self.max_interval_ms if self.syncs > 1 else self.min_interval_ms
+        interval = self.max_error_ms * 1000000 // abs(self.drift_ppm)
+        return max(self.min_interval_ms, min(self.max_interval_ms, interval))
+
+    def sync_age_ms(self):
+        """
+        Get the time since the last successful sync.
+
+        ticks_diff() only spans about 6.2 days before it wraps, so each
+        call folds the ticks since the previous one into age_ms. The
+        main loop checks due() far more often than that.
+
+        Returns:
+            Milliseconds since the last sync, or None if never synced
+        """
+        if not self.synced:
+            return None
+        now = time.ticks_ms()
+        self.age_ms += time.ticks_diff(now, self.age_ticks)
+        self.age_ticks = now
+        return self.age_ms
+
+    def due(self) -> bool:
+        """
+        Check whether the next sync is due.
+
+        Returns:
+            True if never synced or the sync interval has passed
+        """
+        return not self.synced or self.sync_age_ms() >= self.interval_ms
+
+    def start(self, scheduler, retry_ms: int = 60000) -> None:
+        """
+        Sync when due (straight away unless a restored sync is still fresh)
+        and keep re-syncing on the adaptive interval.
+
+        Args:
+            scheduler: The Scheduler driving the main loop
+            retry_ms: Delay before retrying a failed sync; after a
+                kiss-o'-death the retry waits at least min_interval_ms
+        """
+        def run():
+            kisses = self.kisses
+            if self.sync(scheduler):
+                delay = self.interval_ms
+            elif self.kisses != kisses:
+                delay = max(retry_ms, self.min_interval_ms)
+            else:
+                delay = retry_ms
+            scheduler.call_later(delay, run)
+        first = max(0, self.interval_ms - self.sync_age_ms()) if self.synced else 0
+        scheduler.call_later(first, run)
+
+    def snapshot(self):
+        """
+        Get the sync state to carry across a deep sleep.
+
+        Returns:
+            List of (last sync in Unix ms, drift ppm, interval ms, syncs,
+            sync age ms), or None if never synced
+        """
+        if not self.synced:
+            return None
+        return [self.last_sync_ms, self.drift_ppm, self.interval_ms, self.syncs, self.sync_age_ms()]
+
+    def restore(self, state, slept_ms: int) -> None:
+        """
+        Restore the sync state saved by snapshot() before a deep sleep.
+
+        Args:
+            state: Value returned by snapshot()
+            slept_ms: Time spent asleep since the snapshot
+        """
+        if not state:
+            return
+        self.last_sync_ms, self.drift_ppm, self.interval_ms, self.syncs, age = state
+        self.age_ms = age + slept_ms
+        self.age_ticks = time.ticks_ms()
+        self.synced = True
+        # The reboot time is missing from the ticks, so don't measure drift across it
+        self.restored = True
+
+    def stats(self) -> dict:
+        """
+        Get the sync counters and drift estimate.
+
+        Returns:
+            Dict of sync state, drift and interval values
+        """
+        return {
+            "synced": self.synced,
+            "sync_age_ms": self.sync_age_ms(),
+            "drift_ppm": self.drift_ppm,
+            "offset_ms": self.offset_ms,
+            "rtt_ms": self.last_rtt_ms,
+            "interval_ms": self.interval_ms,
+            "syncs": self.syncs,
+            "failures": self.failures,
+            "kisses": self.kisses,
+        }
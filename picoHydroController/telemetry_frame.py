@@ -0,0 +1,138 @@
+import struct
+
+
+# Frame layout, little-endian. telemetry_db/telemetry_frame.py decodes the
+# same layout on the server; keep the two in step.
+#
+#   version     B   FRAME_VERSION
+#   flags       B   FLAG_* bits
+#   device_id   H   numeric rack/device id
+#   boot        H   boot id, incremented on every cold boot
+#   seq         I   sequence number, counting up from 1 within a boot
+#   timestamp   I   RTC time in seconds
+#   count       B   number of metric entries that follow
+#   count x (metric_id B, value i)   value is fixed-point, value / 100
+#   crc         H   CRC-16/CCITT-FALSE over every preceding byte
+#
+# (boot, seq) identifies a frame for server-side dedup and gap detection:
+# unlike the timestamp it never jumps when the RTC is set. Version 1 frames
+# had no boot field.
+FRAME_VERSION = 2
+HEADER_FORMAT = "<BBHHIIB"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+METRIC_FORMAT = "<Bi"
+METRIC_SIZE = struct.calcsize(METRIC_FORMAT)
+CRC_SIZE = 2
+SCALE = 100  # Fixed-point values are hundredths
+
+# Set when the report policy left out metrics that stayed within their
+# deadband; readers carry those forward from earlier frames
+FLAG_PARTIAL = 0x01
+
+# Metric ids; names match the JSON debug payload keys
+TEMPERATURE = 1
+HUMIDITY = 2
+SUPPLY_PUMP = 3
+SALT_PUMP = 4
+LIGHT = 5
+RSSI = 6
+
+# Keys used for the same metrics in the JSON debug payload
+METRIC_NAMES = {
+    TEMPERATURE: "temperature",
+    HUMIDITY: "humidity",
+    SUPPLY_PUMP: "supply_pump",
+    SALT_PUMP: "salt_pump",
+    LIGHT: "light",
+    RSSI: "rssi",
+}
+
+
+def crc16(data, length: int) -> int:
+    """
+    Compute the CRC-16/CCITT-FALSE of the first length bytes of a buffer.
+
+    Args:
+        data: Buffer to checksum
+        length: Number of bytes to include
+
+    Returns:
+        The 16-bit CRC
+    """
+    crc = 0xFFFF
+    for i in range(length):
+        crc ^= data[i] << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+class FrameEncoder:
+    """
+    Packs telemetry into compact fixed-point binary frames.
+
+    Frames are packed into one preallocated buffer, so encoding a sample
+    allocates nothing. A frame carrying temperature and humidity is 27
+    bytes, against roughly 100-150 bytes for the same reading as JSON.
+    """
+    def __init__(self, device_id: int, max_metrics: int = 8, boot: int = 0):
+        """
+        Initialize the encoder.
+
+        Args:
+            device_id: Numeric id of this rack/device (0-65535)
+            max_metrics: Largest number of metrics packed into one frame
+            boot: Boot id (0-65535), see utils.next_boot_id()
+        """
+        self.device_id = device_id
+        self.max_metrics = max_metrics
+        self.boot = boot
+        self.seq = 0
+        self.buf = bytearray(HEADER_SIZE + max_metrics * METRIC_SIZE + CRC_SIZE)
+        self.view = memoryview(self.buf)
+        # Slicing a memoryview allocates a new one, so the view of a frame
+        # with n metrics is cut once here and returned by pack()
+        self.frames = [self.view[:HEADER_SIZE + n * METRIC_SIZE + CRC_SIZE] for n in range(max_metrics + 1)]
+
+    def next_seq(self) -> int:
+        """
+        Advance the sequence number, for messages sent without pack()
+        such as the JSON debug payload.
+
+        Returns:
+            The new sequence number
+        """
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        return self.seq
+
+    def pack(self, timestamp: int, metrics, flags: int = 0) -> memoryview:
+        """
+        Pack one frame and advance the sequence number.
+
+        The returned view aliases the encoder's buffer and is overwritten
+        by the next call; copy it with bytes() before holding on to it.
+
+        Args:
+            timestamp: RTC time in seconds
+            metrics: Sequence of (metric_id, fixed_point_value) pairs, with
+                values already scaled by SCALE
+            flags: FLAG_* bits for the header
+
+        Returns:
+            A memoryview over the packed frame
+        """
+        count = len(metrics)
+        if count > self.max_metrics:
+            raise ValueError("too many metrics for frame")
+        seq = self.next_seq()
+        buf = self.buf
+        struct.pack_into(HEADER_FORMAT, buf, 0, FRAME_VERSION, flags, self.device_id, self.boot, seq, timestamp, count)
+        offset = HEADER_SIZE
+        for metric_id, value in metrics:
+            struct.pack_into(METRIC_FORMAT, buf, offset, metric_id, value)
+            offset += METRIC_SIZE
+        struct.pack_into("<H", buf, offset, crc16(buf, offset))
+        return self.frames[count]
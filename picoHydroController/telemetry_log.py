@@ -0,0 +1,276 @@
+import struct
+
+
+RECORD_MAGIC = 0xA5
+HEADER_FORMAT = "<BBHI"  # magic, topic length, payload length, sequence number
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+class TelemetryLog:
+    """
+    Append-only ring log of telemetry messages on the flash filesystem.
+
+    Messages that cannot be published are written as fixed-size records
+    into a fixed set of segment files, so flash use never grows past
+    segments * records_per_segment * record_size bytes however long an
+    outage lasts. Writes rotate through the segments to spread wear, and
+    once the ring is full the oldest unsent record is overwritten.
+    Records are replayed oldest first, a few at a time, once the broker
+    is reachable again. The replay cursor is written to flash only when
+    replay crosses into another segment or catches up, not after every
+    batch; after a power cut up to a segment of records is replayed
+    twice, which the server drops by boot id and sequence number.
+    """
+    def __init__(
+        self,
+        prefix: str = "tlog",
+        segments: int = 4,
+        records_per_segment: int = 64,
+        record_size: int = 128,
+        sync_every: int = 4,
+    ):
+        """
+        Open the log, recovering the write and replay positions from flash.
+
+        Args:
+            prefix: File name prefix for the segment and cursor files
+            segments: Number of segment files in the ring
+            records_per_segment: Records held by each segment file
+            record_size: Size in bytes of every record including its header
+            sync_every: Number of appends between flushes to flash
+        """
+        self.prefix = prefix
+        self.segments = segments
+        self.records_per_segment = records_per_segment
+        self.record_size = record_size
+        self.capacity = segments * records_per_segment
+        self.sync_every = sync_every
+
+        self.record = bytearray(record_size)  # Reused for every append
+        self.header = bytearray(HEADER_SIZE)  # Reused for every header read
+        self.handle = None  # Open write handle on the current segment
+        self.handle_segment = -1
+        self.unsynced = 0
+
+        self.next_seq = 1  # Sequence number of the next appended record
+        self.write_pos = 0  # Ring index of the next appended record
+        self.read_seq = 1  # Sequence number of the next record to replay
+        self.saved_seq = 1  # read_seq as last written to the cursor file
+        self.dropped = 0  # Unsent records overwritten by newer ones
+        self._recover()
+
+    def _segment_path(self, segment: int) -> str:
+        return f"{self.prefix}{segment}.bin"
+
+    def _cursor_path(self) -> str:
+        return f"{self.prefix}.cur"
+
+    def _recover(self) -> None:
+        """
+        Scan the segment headers to find the newest record and load the
+        replay cursor.
+        """
+        newest_seq = 0
+        newest_pos = -1
+        for segment in range(self.segments):
+            try:
+                f = open(self._segment_path(segment), "rb")
+            except OSError:
+                continue
+            try:
+                for slot in range(self.records_per_segment):
+                    f.seek(slot * self.record_size)
+                    if f.readinto(self.header) != HEADER_SIZE:
+                        break
+                    magic, _, _, seq = struct.unpack(HEADER_FORMAT, self.header)
+                    if magic == RECORD_MAGIC and seq > newest_seq:
+                        newest_seq = seq
+                        newest_pos = segment * self.records_per_segment + slot
+            finally:
+                f.close()
+        if newest_pos >= 0:
+            self.next_seq = newest_seq + 1
+            self.write_pos = (newest_pos + 1) % self.capacity
+        try:
+            with open(self._cursor_path(), "rb") as f:
+                self.read_seq = struct.unpack("<I", f.read(4))[0]
+        except (OSError, ValueError):
+            self.read_seq = 1
+        self._clamp_read_seq()
+        self.saved_seq = self.read_seq
+
+    def _clamp_read_seq(self) -> None:
+        """
+        Skip replay past records that have already been overwritten.
+        """
+        oldest = self.next_seq - self.capacity
+        if self.read_seq < oldest:
+            self.dropped += oldest - self.read_seq
+            self.read_seq = oldest
+        if self.read_seq > self.next_seq:
+            self.read_seq = self.next_seq
+
+    def _position(self, seq: int) -> int:
+        """
+        Get the ring index holding a sequence number still in the log.
+        """
+        return (self.write_pos - (self.next_seq - seq)) % self.capacity
+
+    def _open_segment(self, segment: int):
+        if self.handle_segment == segment:
+            return self.handle
+        self.sync()
+        if self.handle is not None:
+            self.handle.close()
+        path = self._segment_path(segment)
+        try:
+            self.handle = open(path, "r+b")
+        except OSError:
+            self.handle = open(path, "w+b")
+        self.handle_segment = segment
+        return self.handle
+
+    def pending(self) -> int:
+        """
+        Get the number of records waiting to be replayed.
+
+        Returns:
+            Count of stored records not yet replayed
+        """
+        return self.next_seq - self.read_seq
+
+    def append(self, topic: str, payload) -> bool:
+        """
+        Write one message as a fixed-size record.
+
+        Args:
+            topic: MQTT topic of the message
+            payload: Encoded message payload (str or bytes)
+
+        Returns:
+            True if the record was written, False if it does not fit
+        """
+        topic = topic.encode() if isinstance(topic, str) else topic
+        payload = payload.encode() if isinstance(payload, str) else payload
+        body_len = len(topic) + len(payload)
+        if len(topic) > 255 or HEADER_SIZE + body_len > self.record_size:
+            print(f"Telemetry record too large: {body_len} bytes")
+            return False
+
+        record = self.record
+        struct.pack_into(HEADER_FORMAT, record, 0, RECORD_MAGIC, len(topic), len(payload), self.next_seq)
+        record[HEADER_SIZE:HEADER_SIZE + len(topic)] = topic
+        offset = HEADER_SIZE + len(topic)
+        record[offset:offset + len(payload)] = payload
+        for i in range(offset + len(payload), self.record_size):
+            record[i] = 0xFF
+
+        segment = self.write_pos // self.records_per_segment
+        slot = self.write_pos % self.records_per_segment
+        try:
+            f = self._open_segment(segment)
+            f.seek(slot * self.record_size)
+            f.write(record)
+        except OSError as e:
+            print(f"Failed to write telemetry record: {e}")
+            return False
+
+        self.next_seq += 1
+        self.write_pos = (self.write_pos + 1) % self.capacity
+        self._clamp_read_seq()
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+        return True
+
+    def sync(self) -> None:
+        """
+        Flush buffered record writes to flash.
+        """
+        if self.handle is not None and self.unsynced:
+            self.handle.flush()
+        self.unsynced = 0
+
+    def replay(self, send, limit: int = 4) -> int:
+        """
+        Replay the oldest stored records in order.
+
+        Args:
+            send: Callable taking (topic, payload) and returning True once
+                the message has been delivered
+            limit: Maximum number of records to replay in this call
+
+        Returns:
+            Number of records delivered
+        """
+        self.sync()
+        sent = 0
+        current = -1
+        f = None
+        try:
+            while sent < limit and self.read_seq < self.next_seq:
+                pos = self._position(self.read_seq)
+                segment = pos // self.records_per_segment
+                if segment != current:
+                    if f is not None:
+                        f.close()
+                    f = open(self._segment_path(segment), "rb")
+                    current = segment
+                f.seek((pos % self.records_per_segment) * self.record_size)
+                data = f.read(self.record_size)
+                magic, topic_len, payload_len, seq = struct.unpack_from(HEADER_FORMAT, data)
+                if magic != RECORD_MAGIC or seq != self.read_seq:
+                    # Torn or stale record, skip it rather than stall replay
+                    self.dropped += 1
+                    self.read_seq += 1
+                    continue
+                topic = data[HEADER_SIZE:HEADER_SIZE + topic_len].decode()
+                offset = HEADER_SIZE + topic_len
+                if not send(topic, data[offset:offset + payload_len]):
+                    break
+                self.read_seq += 1
+                sent += 1
+        except OSError as e:
+            print(f"Failed to read telemetry record: {e}")
+        finally:
+            if f is not None:
+                f.close()
+        if self.read_seq != self.saved_seq:
+            segment = self._position(self.read_seq) // self.records_per_segment
+            if self.read_seq == self.next_seq or segment != self._position(self.saved_seq) // self.records_per_segment:
+                self._save_cursor()
+        return sent
+
+    def _save_cursor(self) -> None:
+        try:
+            with open(self._cursor_path(), "wb") as f:
+                f.write(struct.pack("<I", self.read_seq))
+        except OSError as e:
+            print(f"Failed to save telemetry cursor: {e}")
+            return
+        self.saved_seq = self.read_seq
+
+    def close(self) -> None:
+        """
+        Flush and close the open segment file and save the replay cursor.
+        """
+        self.sync()
+        if self.read_seq != self.saved_seq:
+            self._save_cursor()
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+            self.handle_segment = -1
+
+    def stats(self) -> dict:
+        """
+        Get the log counters.
+
+        Returns:
+            Dict of pending, dropped and capacity counts
+        """
+        return {
+            "pending": self.pending(),
+            "dropped": self.dropped,
+            "capacity": self.capacity,
+        }
@@ -1,10 +1,8 @@
 from time import sleep
 import ujson as json
 import network
-import requests
 from umqtt.simple import MQTTClient
-import utime
-from machine import RTC
+from sntp import TimeSync
 
 
 def load_env(env_path=".env") -> dict:
@@ -20,6 +18,23 @@ def load_env(env_path=".env") -> dict:
     return env_vars
 
 
+def next_boot_id(path: str = "boot_id") -> int:
+    # Persistent 16-bit boot counter; telemetry (boot, seq) pairs stay unique across reboots
+    boot_id = 0
+    try:
+        with open(path, "r") as f:
+            boot_id = int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        pass
+    boot_id = (boot_id + 1) & 0xFFFF
+    try:
+        with open(path, "w") as f:
+            f.write(str(boot_id))
+    except OSError as e:
+        print(f"Could not save boot id: {e}")
+    return boot_id
+
+
 def publish_mqtt_message(
     client_id: str,
     broker: str,
@@ -39,69 +54,21 @@ def publish_mqtt_message(
         print(f"Failed to publish message: {e}")
 
 
-def connect_wifi(ssid: str, pwd: str) -> bool:
+def connect_wifi(ssid: str, pwd: str, timeout_s: int = 15) -> bool:
     sta_if = network.WLAN(network.STA_IF)
     if not sta_if.isconnected():
         print("Connecting to network...")
         sta_if.active(True)
         sta_if.connect(ssid, pwd)
-        while not sta_if.isconnected():
+        # Give up after timeout_s so a missing access point can't hang the controller
+        for _ in range(timeout_s):
+            if sta_if.isconnected():
+                break
             print("Waiting for connection...")
             sleep(1)
     return sta_if.isconnected()
 
 
-def set_rtc(timezone: str):
-    url = f"https://timeapi.io/api/time/current/zone?timeZone=America%2F{timezone}"
-    days_of_week = {
-        "Monday": 0,
-        "Tuesday": 1,
-        "Wednesday": 2,
-        "Thursday": 3,
-        "Friday": 4,
-        "Saturday": 5,
-        "Sunday": 6,
-    }
-
-    # get current time from API
-    try:
-        initial_pico_time = utime.ticks_ms()
-        api_response = requests.get(url)
-        pico_time_delta_after_response = utime.ticks_diff(
-            utime.ticks_ms(), initial_pico_time
-        )
-        if api_response.status_code == 200:
-            time_data = api_response.json()
-            # convert to milliseconds
-            hours_ms, minutes_ms, seconds_ms = (
-                int(time_data.get("hour")) * 3600000,
-                int(time_data.get("minute")) * 60000,
-                int(time_data.get("seconds")) * 1000,
-            )
-            adjusted_time = (
-                hours_ms + minutes_ms + seconds_ms + pico_time_delta_after_response
-            )
-            dow = days_of_week.get(time_data.get("dayOfWeek"))
-            new_rtc = (
-                time_data.get("year"),
-                time_data.get("month"),
-                time_data.get("day"),
-                dow,
-                int(adjusted_time // 3600000) % 24,
-                int((adjusted_time % 3600000) // 60000) % 60,
-                int((adjusted_time % 60000) // 1000) % 60,
-                int(adjusted_time % 1000),
-            )
-            rtc = RTC()
-            rtc.datetime(new_rtc)
-        else:
-            pass
-    except Exception as e:
-        print(f"Error fetching time data: {e}")
-        return
-
-    import machine
-
-    rtc = machine.RTC()
-    rtc.datetime(time_tuple)
-    
+def set_rtc(timezone: str) -> bool:
+    # One SNTP exchange over UDP; see sntp.TimeSync for drift tracking and re-sync
+    return TimeSync(timezone).sync()
@@ -0,0 +1,237 @@
+import random
+import time
+import network
+
+
+class WifiManager:
+    """
+    Non-blocking Wi-Fi connection manager.
+
+    poll() advances a small state machine and returns immediately, so the
+    control loop keeps driving pumps and lights while the link is down.
+    Each connect attempt has a timeout; failed attempts are retried with
+    exponential backoff plus random jitter so a rack of controllers does
+    not hammer the access point in lockstep.
+    """
+    DOWN = 0
+    CONNECTING = 1
+    UP = 2
+
+    def __init__(
+        self,
+        ssid: str,
+        password: str,
+        connect_timeout_ms: int = 15000,
+        backoff_min_ms: int = 1000,
+        backoff_max_ms: int = 300000,
+        on_connect=None,
+    ):
+        """
+        Initialize the manager without touching the radio.
+
+        Args:
+            ssid: Network name to join
+            password: Network password
+            connect_timeout_ms: Time allowed for one connect attempt
+            backoff_min_ms: Delay before the first retry
+            backoff_max_ms: Upper bound on the retry delay
+            on_connect: Optional zero-argument callable run each time the
+                link comes up (e.g. to sync the RTC)
+        """
+        self.ssid = ssid
+        self.password = password
+        self.connect_timeout_ms = connect_timeout_ms
+        self.backoff_min_ms = backoff_min_ms
+        self.backoff_max_ms = backoff_max_ms
+        self.on_connect = on_connect
+        self.sta_if = network.WLAN(network.STA_IF)
+
+        now = time.ticks_ms()
+        self.state = self.DOWN
+        self.backoff_ms = backoff_min_ms
+        self.next_attempt = now
+        self.attempt_started = now
+        self.offline_since = now
+        self.suspended = False
+        self.scheduler = None  # Set by start()
+        self.poll_interval_ms = 250
+        self.event = None  # Recurring poll Event from start()
+
+        # Counters
+        self.attempts = 0
+        self.connects = 0
+        self.reconnects = 0  # Link losses after having been connected
+        self.last_connect_ms = 0  # Latency of the most recent successful attempt
+        self.max_connect_ms = 0
+        self.total_connect_ms = 0
+        self.offline_ms = 0  # Time offline, not counting the current outage
+
+    def is_connected(self) -> bool:
+        """
+        Check whether the link is up as of the last poll.
+
+        Returns:
+            True if connected
+        """
+        return self.state == self.UP
+
+    def rssi(self):
+        """
+        Get the received signal strength of the current link.
+
+        Returns:
+            RSSI in dBm, or None when not connected
+        """
+        if self.state != self.UP:
+            return None
+        try:
+            return self.sta_if.status('rssi')
+        except Exception:
+            return None
+
+    def _start_attempt(self, now: int) -> None:
+        self.sta_if.active(True)
+        try:
+            self.sta_if.connect(self.ssid, self.password)
+        except OSError as e:
+            print(f"Wi-Fi connect failed to start: {e}")
+            self._schedule_retry(now)
+            return
+        self.attempts += 1
+        self.attempt_started = now
+        self.state = self.CONNECTING
+
+    def _schedule_retry(self, now: int) -> None:
+        jitter = random.getrandbits(16) % (self.backoff_ms // 2 + 1)
+        self.next_attempt = time.ticks_add(now, self.backoff_ms + jitter)
+        self.backoff_ms = min(self.backoff_ms * 2, self.backoff_max_ms)
+        self.state = self.DOWN
+
+    def _attempt_failed(self) -> bool:
+        status = self.sta_if.status()
+        return status in (
+            network.STAT_WRONG_PASSWORD,
+            network.STAT_NO_AP_FOUND,
+            network.STAT_CONNECT_FAIL,
+        )
+
+    def poll(self) -> bool:
+        """
+        Advance the connection state machine without blocking.
+
+        Returns:
+            True if the link is up
+        """
+        if self.suspended:
+            return False
+        now = time.ticks_ms()
+        if self.state == self.UP:
+            if self.sta_if.isconnected():
+                return True
+            print("Wi-Fi link lost")
+            self.reconnects += 1
+            self.offline_since = now
+            self.backoff_ms = self.backoff_min_ms
+            self.state = self.DOWN
+            self.next_attempt = now
+
+        if self.state == self.DOWN:
+            if time.ticks_diff(now, self.next_attempt) >= 0:
+                self._start_attempt(now)
+            return False
+
+        # CONNECTING
+        elapsed = time.ticks_diff(now, self.attempt_started)
+        if self.sta_if.isconnected():
+            self.state = self.UP
+            self.connects += 1
+            self.last_connect_ms = elapsed
+            self.total_connect_ms += elapsed
+            if elapsed > self.max_connect_ms:
+                self.max_connect_ms = elapsed
+            self.offline_ms += time.ticks_diff(now, self.offline_since)
+            self.backoff_ms = self.backoff_min_ms
+            print(f"Wi-Fi connected in {elapsed} ms")
+            if self.on_connect is not None:
+                try:
+                    self.on_connect()
+                except Exception as e:
+                    print(f"Wi-Fi on_connect failed: {e}")
+            return True
+        if elapsed >= self.connect_timeout_ms or self._attempt_failed():
+            print(f"Wi-Fi connect attempt failed after {elapsed} ms")
+            self.sta_if.disconnect()
+            self._schedule_retry(now)
+        return False
+
+    def start(self, scheduler, interval_ms: int = 250):
+        """
+        Run poll() in the background on a scheduler.
+
+        Args:
+            scheduler: The Scheduler driving the main loop
+            interval_ms: Milliseconds between polls
+
+        Returns:
+            The recurring Event
+        """
+        self.scheduler = scheduler
+        self.poll_interval_ms = interval_ms
+        self.event = scheduler.call_every(interval_ms, self.poll, 0)
+        return self.event
+
+    def suspend(self) -> None:
+        """
+        Power the radio down until resume(), e.g. before a sleep.
+
+        Unlike a lost link this is not counted as a reconnect or as time
+        offline, and the background poll stops so it cannot wake the loop.
+        """
+        if self.suspended:
+            return
+        if self.state != self.UP:
+            self.offline_ms += time.ticks_diff(time.ticks_ms(), self.offline_since)
+        if self.event is not None:
+            self.scheduler.cancel(self.event)
+            self.event = None
+        self.sta_if.disconnect()
+        self.sta_if.active(False)
+        self.state = self.DOWN
+        self.suspended = True
+
+    def resume(self) -> None:
+        """
+        Power the radio up and start connecting straight away.
+        """
+        if not self.suspended:
+            return
+        now = time.ticks_ms()
+        self.suspended = False
+        self.offline_since = now
+        self.next_attempt = now
+        self.backoff_ms = self.backoff_min_ms
+        if self.scheduler is not None:
+            self.event = self.scheduler.call_every(self.poll_interval_ms, self.poll, 0)
+
+    def stats(self) -> dict:
+        """
+        Get link state and connection counters.
+
+        Returns:
+            Dict of link state, RSSI, latency and offline-time counters
+        """
+        offline_ms = self.offline_ms
+        if self.state != self.UP and not self.suspended:
+            offline_ms += time.ticks_diff(time.ticks_ms(), self.offline_since)
+        return {
+            "connected": self.state == self.UP,
+            "suspended": self.suspended,
+            "rssi": self.rssi(),
+            "attempts": self.attempts,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "last_connect_ms": self.last_connect_ms,
+            "max_connect_ms": self.max_connect_ms,
+            "avg_connect_ms": self.total_connect_ms // self.connects if self.connects else 0,
+            "offline_ms": offline_ms,
+        }
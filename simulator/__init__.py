@@ -0,0 +1,190 @@
+"""Host-side simulator for the picoHydroController firmware.
+
+install() puts stub versions of the MicroPython modules the controller
+imports (machine, utime, network, umqtt.simple, ujson, uasyncio) ahead
+of everything else on sys.path, adds the MicroPython time helpers
+(ticks_ms, sleep_ms, ...) to CPython's time module and gc.mem_free()/
+mem_alloc() to its gc module, all backed by one simulation. The
+controller code then runs unmodified on Linux, and because sleeping only
+advances the virtual clock, days of rack operation run in seconds.
+
+    sim = simulator.install()
+    sim.add_i2c_device(1, 0x38, AHT21Model(sim.clock, temperature=24.0))
+    sim.run_main(duration_ms=24 * 3600 * 1000)
+"""
+
+import gc
+import os
+import sys
+import time
+
+from .clock import SimulationEnd, ticks_add, ticks_diff
+from .core import MachineReset, Simulation, current, set_current
+from .devices import AHT21Model
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUBS_DIR = os.path.join(REPO_ROOT, "simulator", "stubs")
+CONTROLLER_DIR = os.path.join(REPO_ROOT, "picoHydroController")
+
+# Modules provided by the stubs or the controller, dropped on reinstall so
+# every simulation imports fresh copies bound to its own clock
+SIMULATED_MODULES = (
+    "machine", "utime", "network", "ujson", "uasyncio", "umqtt", "umqtt.simple",
+)
+
+_saved = {}  # (module, attribute) -> original value, or None if it was absent
+
+
+def _patch(module, patches):
+    for name, value in patches.items():
+        if (module, name) not in _saved:
+            _saved[(module, name)] = getattr(module, name, None)
+        setattr(module, name, value)
+
+
+def _patch_time(clock):
+    """Give CPython's time module the MicroPython ticks/sleep helpers."""
+    _patch(time, {
+        "ticks_ms": clock.ticks_ms,
+        "ticks_us": clock.ticks_us,
+        "ticks_cpu": clock.ticks_us,
+        "ticks_add": ticks_add,
+        "ticks_diff": ticks_diff,
+        "sleep_ms": clock.sleep_ms,
+        "sleep_us": clock.sleep_us,
+        "sleep": clock.sleep,
+    })
+
+
+def _patch_gc(simulation):
+    """Add MicroPython's gc.mem_free()/mem_alloc(), reporting simulation.heap_*."""
+    _patch(gc, {
+        "mem_alloc": lambda: simulation.heap_used,
+        "mem_free": lambda: simulation.heap_size - simulation.heap_used,
+    })
+
+
+def _restore():
+    for (module, name), value in _saved.items():
+        if value is None:
+            delattr(module, name)
+        else:
+            setattr(module, name, value)
+    _saved.clear()
+
+
+class SimulationRun(Simulation):
+    """A Simulation that can load and drive the controller code."""
+
+    def __init__(self, workdir=None, **kwargs):
+        super().__init__(**kwargs)
+        self.workdir = workdir
+
+    def write_env(self, values):
+        """Write the .env file the controller's load_env() reads."""
+        with open(os.path.join(self.workdir, ".env"), "w") as f:
+            for key, value in values.items():
+                f.write(f"{key}={value}\n")
+
+    def import_controller(self, module="main"):
+        """Import a controller module fresh, from the simulation workdir."""
+        for name in list(sys.modules):
+            if name == module or name in _controller_modules():
+                del sys.modules[name]
+        previous = os.getcwd()
+        os.chdir(self.workdir)
+        try:
+            return __import__(module)
+        finally:
+            os.chdir(previous)
+
+    def run_for(self, duration_ms, function, *args):
+        """Call function until duration_ms of virtual time has passed."""
+        self.clock.end_us = self.clock.now_us + int(duration_ms * 1000)
+        previous = os.getcwd()
+        os.chdir(self.workdir)
+        try:
+            while True:
+                function(*args)
+        except SimulationEnd:
+            pass
+        finally:
+            os.chdir(previous)
+            self.clock.end_us = None
+
+    def run_main(self, duration_ms, env=None):
+        """Run the controller's main() for duration_ms of virtual time.
+
+        A machine.deepsleep() resets the chip: the controller modules are
+        imported afresh, as on a real boot, and the run carries on.
+        """
+        if env is not None:
+            self.write_env(env)
+        end_us = self.clock.now_us + int(duration_ms * 1000)
+        while True:
+            main = self.import_controller("main")
+            try:
+                self.run_for((end_us - self.clock.now_us) / 1000, main.main)
+                return main
+            except MachineReset:
+                self.reset()
+
+
+def _controller_modules():
+    return {
+        os.path.splitext(name)[0]
+        for name in os.listdir(CONTROLLER_DIR)
+        if name.endswith(".py")
+    }
+
+
+def install(workdir=None, **kwargs):
+    """Activate a fresh simulation and make the stubs importable.
+
+    Args:
+        workdir: Directory standing in for the Pico filesystem (.env,
+            telemetry log); defaults to a new temporary directory
+        **kwargs: Passed to Simulation (epoch, tick_offset_ms)
+
+    Returns:
+        The active SimulationRun
+    """
+    if workdir is None:
+        import tempfile
+
+        workdir = tempfile.mkdtemp(prefix="bhcs-sim-")
+    simulation = SimulationRun(workdir, **kwargs)
+    set_current(simulation)
+    for name in SIMULATED_MODULES:
+        sys.modules.pop(name, None)
+    for path in (CONTROLLER_DIR, STUBS_DIR, REPO_ROOT):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+    _patch_time(simulation.clock)
+    _patch_gc(simulation)
+    return simulation
+
+
+def uninstall():
+    """Undo install(): restore the time and gc modules, drop the stub paths and
+    forget the controller modules (telemetry_db has a same-named codec)."""
+    _restore()
+    for path in (CONTROLLER_DIR, STUBS_DIR):
+        if path in sys.path:
+            sys.path.remove(path)
+    for name in SIMULATED_MODULES + tuple(_controller_modules()):
+        sys.modules.pop(name, None)
+    set_current(None)
+
+
+__all__ = [
+    "AHT21Model",
+    "MachineReset",
+    "Simulation",
+    "SimulationEnd",
+    "SimulationRun",
+    "current",
+    "install",
+    "uninstall",
+]
@@ -0,0 +1,53 @@
+"""In-memory MQTT broker for the simulator."""
+
+from collections import deque
+
+
+def topic_matches(pattern, topic):
+    """Match an MQTT topic against a subscription pattern with + and #."""
+    pattern_parts = pattern.split("/")
+    topic_parts = topic.split("/")
+    for i, part in enumerate(pattern_parts):
+        if part == "#":
+            return True
+        if i >= len(topic_parts) or (part != "+" and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+class MessageBus:
+    """Records every published message and routes it to subscribers."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.up = True  # Set False to simulate a broker outage
+        self.messages = []  # (ticks_ms at publish, topic, payload)
+        self.subscriptions = []  # (pattern, inbox deque)
+        self.connects = 0
+
+    def publish(self, topic, payload):
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(payload, str):
+            payload = payload.encode()
+        payload = bytes(payload)
+        self.messages.append((self.clock.now_us // 1000, topic.decode(), payload))
+        for pattern, inbox in self.subscriptions:
+            if topic_matches(pattern, topic.decode()):
+                inbox.append((topic, payload))
+
+    def subscribe(self, pattern):
+        inbox = deque()
+        self.subscriptions.append((pattern, inbox))
+        return inbox
+
+    def unsubscribe(self, inbox):
+        self.subscriptions = [sub for sub in self.subscriptions if sub[1] is not inbox]
+
+    def inject(self, topic, payload):
+        """Publish as if from another client, e.g. a remote command."""
+        self.publish(topic, payload)
+
+    def on_topic(self, pattern):
+        """Return the recorded messages whose topic matches pattern."""
+        return [message for message in self.messages if topic_matches(pattern, message[1])]
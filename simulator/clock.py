@@ -0,0 +1,89 @@
+"""Virtual time for the simulator.
+
+All simulated time is kept in microseconds since the start of the run.
+Sleeping advances the clock instantly and fires any machine.Timer
+callbacks that fall due on the way, so hours of controller time pass in
+milliseconds of wall time.
+"""
+
+import heapq
+
+# MicroPython ticks wrap at 2**30 on the rp2 port
+TICKS_PERIOD = 1 << 30
+TICKS_MASK = TICKS_PERIOD - 1
+TICKS_HALF = TICKS_PERIOD >> 1
+
+
+class SimulationEnd(BaseException):
+    """Raised when the clock reaches the end of the run.
+
+    Derives from BaseException so controller code that catches Exception
+    cannot swallow it.
+    """
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MASK
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALF) & TICKS_MASK) - TICKS_HALF
+
+
+class VirtualClock:
+    """Monotonic virtual clock with a timer queue."""
+
+    def __init__(self, epoch=1767225600, tick_offset_ms=0):
+        self.now_us = 0
+        self.end_us = None
+        self.epoch = epoch  # Unix seconds at the start of the run
+        self.rtc_offset_us = 0  # How far the RTC has been set away from epoch + elapsed
+        self.tick_offset_ms = tick_offset_ms  # Start ticks near a wrap to exercise ticks_diff
+        self.timers = []
+        self.seq = 0
+
+    def ticks_ms(self):
+        return (self.now_us // 1000 + self.tick_offset_ms) & TICKS_MASK
+
+    def ticks_us(self):
+        return (self.now_us + self.tick_offset_ms * 1000) & TICKS_MASK
+
+    def time(self):
+        """RTC time in seconds."""
+        return (self.epoch * 1000000 + self.rtc_offset_us + self.now_us) // 1000000
+
+    def schedule(self, delay_us, callback):
+        """Run callback once the clock has advanced delay_us. Returns a handle."""
+        self.seq += 1
+        entry = [self.now_us + max(0, delay_us), self.seq, callback]
+        heapq.heappush(self.timers, entry)
+        return entry
+
+    def cancel(self, entry):
+        entry[2] = None
+
+    def advance_us(self, delta_us):
+        """Move time forward, firing timer callbacks at their due times."""
+        target = self.now_us + max(0, delta_us)
+        while self.timers and self.timers[0][0] <= target:
+            due, _, callback = heapq.heappop(self.timers)
+            if callback is None:
+                continue
+            self._move_to(due)
+            callback()
+        self._move_to(target)
+
+    def _move_to(self, when_us):
+        if self.end_us is not None and when_us >= self.end_us:
+            self.now_us = max(self.now_us, self.end_us)
+            raise SimulationEnd()
+        self.now_us = max(self.now_us, when_us)
+
+    def sleep_ms(self, ms):
+        self.advance_us(int(ms * 1000))
+
+    def sleep_us(self, us):
+        self.advance_us(int(us))
+
+    def sleep(self, seconds):
+        self.advance_us(int(seconds * 1000000))
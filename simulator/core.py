@@ -0,0 +1,61 @@
+"""Shared simulation state used by the stub modules."""
+
+from .bus import MessageBus
+from .clock import VirtualClock
+from .devices import WifiModel
+
+
+class MachineReset(BaseException):
+    """Raised by machine.deepsleep() when the simulated chip resets."""
+
+
+class Simulation:
+    """Everything the stub MicroPython modules read and write."""
+
+    def __init__(self, epoch=1767225600, tick_offset_ms=0):
+        self.clock = VirtualClock(epoch, tick_offset_ms)
+        self.bus = MessageBus(self.clock)
+        self.wifi = WifiModel()
+        self.i2c_devices = {}  # bus id -> {address: device model}
+        self.pins = {}  # pin number -> list of (ticks_ms, value) transitions
+        self.heap_size = 192 * 1024  # MicroPython heap reported by gc.mem_free()/mem_alloc()
+        self.heap_used = 24 * 1024
+        self.timers = set()  # Armed machine.Timer stubs, cancelled by a reset
+        self.reset_cause = 1  # machine.PWRON_RESET
+        self.boots = 1
+        self.light_sleep_ms = 0
+        self.deep_sleep_ms = 0
+
+    def add_i2c_device(self, bus, address, device):
+        self.i2c_devices.setdefault(bus, {})[address] = device
+        return device
+
+    def pin_history(self, number):
+        return self.pins.get(number, [])
+
+    def reset(self):
+        """Reset the simulated chip: timers stop, GPIOs go low and ticks restart at 0."""
+        for timer in list(self.timers):
+            timer.deinit()
+        now_ms = self.clock.now_us // 1000
+        for history in self.pins.values():
+            if history and history[-1][1]:
+                history.append((now_ms, 0))
+        self.clock.tick_offset_ms = -now_ms
+        self.boots += 1
+
+
+_current = None
+
+
+def current():
+    """Return the active simulation, creating a default one if needed."""
+    global _current
+    if _current is None:
+        _current = Simulation()
+    return _current
+
+
+def set_current(simulation):
+    global _current
+    _current = simulation
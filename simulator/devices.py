@@ -0,0 +1,72 @@
+"""Scriptable models of the hardware the controller talks to."""
+
+
+def aht21_crc8(data):
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+class AHT21Model:
+    """Register-level model of an AHT21 temperature/humidity sensor.
+
+    temperature and humidity are constants or callables taking the
+    simulated time in seconds, so a test can script a day/night cycle or
+    a step change. Measurements report busy for conversion_ms after the
+    trigger command, like the real part.
+    """
+
+    STATUS_CALIBRATED = 0x18
+    STATUS_BUSY = 0x80
+
+    def __init__(self, clock, temperature=22.0, humidity=55.0, conversion_ms=80):
+        self.clock = clock
+        self.temperature = temperature
+        self.humidity = humidity
+        self.conversion_ms = conversion_ms
+        self.busy_until_us = 0
+        self.data = bytes(5)
+        self.measurements = 0
+        self.corrupt_next = 0  # Number of upcoming reads to return with a bad CRC
+
+    def _value(self, source):
+        return source(self.clock.now_us / 1000000) if callable(source) else source
+
+    def write(self, data):
+        if data[:1] == b"\xAC":
+            humidity = min(max(self._value(self.humidity), 0.0), 100.0)
+            temperature = min(max(self._value(self.temperature), -50.0), 150.0)
+            humidity_raw = min(int(humidity / 100 * (1 << 20)), (1 << 20) - 1)
+            temperature_raw = min(int((temperature + 50) / 200 * (1 << 20)), (1 << 20) - 1)
+            self.data = bytes((
+                humidity_raw >> 12,
+                (humidity_raw >> 4) & 0xFF,
+                ((humidity_raw & 0x0F) << 4) | (temperature_raw >> 16),
+                (temperature_raw >> 8) & 0xFF,
+                temperature_raw & 0xFF,
+            ))
+            self.busy_until_us = self.clock.now_us + self.conversion_ms * 1000
+            self.measurements += 1
+
+    def read(self, length):
+        status = self.STATUS_CALIBRATED
+        if self.clock.now_us < self.busy_until_us:
+            status |= self.STATUS_BUSY
+        frame = bytes((status,)) + self.data
+        frame += bytes((aht21_crc8(frame),))
+        if self.corrupt_next:
+            self.corrupt_next -= 1
+            frame = frame[:-1] + bytes((frame[-1] ^ 0xFF,))
+        return frame[:length]
+
+
+class WifiModel:
+    """Access point availability and link quality seen by network.WLAN."""
+
+    def __init__(self, connect_delay_ms=1500, rssi=-58):
+        self.available = True
+        self.connect_delay_ms = connect_delay_ms
+        self.rssi = rssi
@@ -0,0 +1,60 @@
+"""Local stand-in SNTP server that serves the simulation's virtual time."""
+
+import socket
+import struct
+import threading
+
+NTP_TO_UNIX = 2208988800
+
+
+class LocalNTPServer:
+    """Answers SNTP requests on 127.0.0.1 with the virtual clock's time.
+
+    offset_s shifts the served time, and delay_ms is added to the
+    virtual clock per request to model network latency: half of it
+    before the server stamps the request, half on the way back. With
+    kiss_code set (e.g. "RATE") every reply is a kiss-o'-death.
+    """
+
+    def __init__(self, clock, offset_s=0.0, delay_ms=0, kiss_code=None):
+        self.clock = clock
+        self.offset_s = offset_s
+        self.delay_ms = delay_ms
+        self.kiss_code = kiss_code
+        self.requests = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.host, self.port = self.sock.getsockname()
+        self.thread = threading.Thread(target=self._serve, name="sim-ntp", daemon=True)
+        self.thread.start()
+
+    def _timestamp(self):
+        now = self.clock.epoch + self.clock.now_us / 1000000 + self.offset_s + NTP_TO_UNIX
+        seconds = int(now)
+        return seconds, int((now - seconds) * (1 << 32))
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(48)
+            except OSError:
+                return
+            if len(data) < 48:
+                continue
+            self.requests += 1
+            # The client is blocked in recv, so nothing else moves the clock meanwhile
+            self.clock.now_us += self.delay_ms * 500
+            seconds, fraction = self._timestamp()
+            self.clock.now_us += self.delay_ms * 500
+            reply = bytearray(48)
+            reply[0] = 0x24  # LI 0, version 4, mode 4 (server)
+            reply[1] = 1  # Stratum 1
+            if self.kiss_code:
+                reply[1] = 0  # Stratum 0 with the kiss code as the reference id
+                reply[12:16] = self.kiss_code.encode()
+            reply[24:32] = data[40:48]  # Originate timestamp
+            struct.pack_into("!IIII", reply, 32, seconds, fraction, seconds, fraction)
+            self.sock.sendto(reply, addr)
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,140 @@
+"""Lumped model of one fodder tray, driven by the controller's GPIO pins."""
+
+import math
+
+
+class TrayPlant:
+    """Water balance, humidity and heat of one tray under the rack's pumps and lights.
+
+    The substrate holds up to capacity_ml of water. Supply pump runs add
+    flow_ml_s, and anything past capacity drains away as runoff. The
+    sprouts and the substrate lose water at et_ml_h scaled by how wet the
+    substrate is, how warm it is and whether the lights are on. The air
+    the AHT21 sees is the ambient humidity plus rh_gain times the wet
+    fraction, and the lights warm it by light_heat_c with a lag.
+
+    The pin states come from the simulation's GPIO history, so the model
+    sees exactly what the controller switched. Pass temperature() and
+    humidity() to AHT21Model. stats() reports the water, salt and energy
+    used and how long the tray spent too dry or waterlogged.
+    """
+
+    def __init__(self, pins, ambient_temperature=22.0, ambient_humidity=50.0, supply_pin=1, salt_pin=2,
+                 light_pin=3, capacity_ml=1500.0, moisture=0.6, flow_ml_s=25.0, dose_ml_s=2.0,
+                 et_ml_h=300.0, rh_gain=25.0, light_heat_c=4.0, heat_lag_s=900.0, pump_w=18.0,
+                 light_w=60.0, dry=0.35, wet=0.95, step_s=10.0):
+        self.pins = pins
+        self.ambient_temperature = ambient_temperature
+        self.ambient_humidity = ambient_humidity
+        self.supply_pin = supply_pin
+        self.salt_pin = salt_pin
+        self.light_pin = light_pin
+        self.capacity_ml = capacity_ml
+        self.water = capacity_ml * moisture
+        self.flow_ml_s = flow_ml_s
+        self.dose_ml_s = dose_ml_s
+        self.et_ml_h = et_ml_h
+        self.rh_gain = rh_gain
+        self.light_heat_c = light_heat_c
+        self.heat_lag_s = heat_lag_s
+        self.pump_w = pump_w
+        self.light_w = light_w
+        self.dry = dry
+        self.wet = wet
+        self.step_s = step_s
+        self.now = 0.0  # Seconds simulated so far
+        self.heat = 0.0  # Degrees the lights have added
+        self.cursors = {}  # Pin -> index of its first transition after now
+
+        # Totals
+        self.pumped_ml = 0.0
+        self.drained_ml = 0.0
+        self.used_ml = 0.0
+        self.salt_ml = 0.0
+        self.energy_wh = 0.0
+        self.dry_s = 0.0
+        self.wet_s = 0.0
+        self.moisture_s = 0.0  # Integral of the wet fraction, for the mean
+
+    def _value(self, source, seconds):
+        return source(seconds) if callable(source) else source
+
+    def _on_ms(self, pin, start_ms, end_ms):
+        """Milliseconds a pin was high between start_ms and end_ms."""
+        history = self.pins.get(pin) or ()
+        i = self.cursors.get(pin, 0)
+        while i < len(history) and history[i][0] <= start_ms:
+            i += 1
+        self.cursors[pin] = i
+        state = history[i - 1][1] if i else 0
+        at = start_ms
+        on = 0
+        while i < len(history) and history[i][0] < end_ms:
+            when, value = history[i]
+            if state:
+                on += when - at
+            at = when
+            state = value
+            i += 1
+        if state:
+            on += end_ms - at
+        return on
+
+    def advance(self, seconds):
+        """Run the model forward to the given simulated time."""
+        while self.now < seconds:
+            dt = min(self.step_s, seconds - self.now)
+            start_ms = int(self.now * 1000)
+            end_ms = int((self.now + dt) * 1000)
+            supply_s = self._on_ms(self.supply_pin, start_ms, end_ms) / 1000
+            salt_s = self._on_ms(self.salt_pin, start_ms, end_ms) / 1000
+            light_s = self._on_ms(self.light_pin, start_ms, end_ms) / 1000
+
+            fraction = self.water / self.capacity_ml
+            temperature = self._value(self.ambient_temperature, self.now) + self.heat
+            et = self.et_ml_h * dt / 3600 * fraction * (1 + 0.04 * (temperature - 20))
+            et *= 1 + 0.5 * light_s / dt
+            inflow = self.flow_ml_s * supply_s
+            self.water = max(0.0, self.water - et) + inflow
+            if self.water > self.capacity_ml:
+                self.drained_ml += self.water - self.capacity_ml
+                self.water = self.capacity_ml
+            target = self.light_heat_c * light_s / dt
+            self.heat += (target - self.heat) * (1 - math.exp(-dt / self.heat_lag_s))
+
+            self.pumped_ml += inflow
+            self.used_ml += et
+            self.salt_ml += self.dose_ml_s * salt_s
+            self.energy_wh += (self.pump_w * (supply_s + salt_s) + self.light_w * light_s) / 3600
+            fraction = self.water / self.capacity_ml
+            self.moisture_s += fraction * dt
+            if fraction < self.dry:
+                self.dry_s += dt
+            elif fraction > self.wet:
+                self.wet_s += dt
+            self.now += dt
+
+    def temperature(self, seconds):
+        self.advance(seconds)
+        return self._value(self.ambient_temperature, seconds) + self.heat
+
+    def humidity(self, seconds):
+        self.advance(seconds)
+        rh = self._value(self.ambient_humidity, seconds) + self.rh_gain * self.water / self.capacity_ml
+        return min(rh, 100.0)
+
+    def stats(self):
+        hours = self.now / 3600 or 1
+        return {
+            "pumped_l": round(self.pumped_ml / 1000, 3),
+            "drained_l": round(self.drained_ml / 1000, 3),
+            "used_l": round(self.used_ml / 1000, 3),
+            "salt_ml": round(self.salt_ml, 1),
+            "salt_ml_per_l": round(self.salt_ml * 1000 / self.pumped_ml, 2) if self.pumped_ml else None,
+            "energy_wh": round(self.energy_wh, 2),
+            "mean_moisture": round(self.moisture_s / self.now, 3) if self.now else None,
+            "moisture": round(self.water / self.capacity_ml, 3),
+            "dry_h": round(self.dry_s / 3600, 2),
+            "wet_h": round(self.wet_s / 3600, 2),
+            "water_l_per_day": round(self.pumped_ml / 1000 * 24 / hours, 3),
+        }
@@ -0,0 +1,105 @@
+"""Run the controller in the simulator and summarise what it did.
+
+    python3 -m simulator.run --hours 48
+    python3 -m simulator.run --hours 72 --plant --control
+"""
+
+import argparse
+import json
+import math
+import time
+
+import simulator
+from simulator import AHT21Model
+from simulator.ntp import LocalNTPServer
+from simulator.plant import TrayPlant
+
+DEFAULT_ENV = {
+    "MQTT_SERVER": "sim-broker",
+    "MQTT_PORT": "1883",
+    "MQTT_USER": "sim",
+    "MQTT_PASSWORD": "sim",
+    "WIFI_SSID": "sim-ap",
+    "WIFI_PASSWORD": "sim",
+    "DEVICE_ID": "1",
+}
+
+
+def diurnal(mean, swing, peak_hour=15):
+    """Daily sine cycle peaking at peak_hour, for sensor models."""
+    def value(seconds):
+        return mean + swing * math.cos(2 * math.pi * (seconds / 3600 - peak_hour) / 24)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--no-report-policy", action="store_true",
+                        help="publish every sample instead of applying the deadband policy")
+    parser.add_argument("--low-power", choices=("light", "deep"),
+                        help="duty-cycle the controller with lightsleep or deepsleep")
+    parser.add_argument("--sample-interval", type=int, metavar="MS",
+                        help="milliseconds between sensor rounds")
+    parser.add_argument("--plant", action="store_true",
+                        help="drive the AHT21 from a tray model that responds to the pumps and lights")
+    parser.add_argument("--control", action="store_true",
+                        help="turn on the closed-loop control engine (CONTROL_ENGINE=1)")
+    parser.add_argument("--wifi-outage", type=float, nargs=2, metavar=("START_H", "END_H"),
+                        help="take the access point down between these hours")
+    args = parser.parse_args()
+
+    sim = simulator.install()
+    plant = None
+    if args.plant:
+        plant = TrayPlant(sim.pins, diurnal(22.0, 4.0), diurnal(50.0, -5.0))
+        sim.add_i2c_device(1, 0x38, AHT21Model(sim.clock, plant.temperature, plant.humidity))
+    else:
+        sim.add_i2c_device(1, 0x38, AHT21Model(sim.clock, diurnal(22.0, 4.0), diurnal(60.0, -10.0)))
+    if args.wifi_outage:
+        start, end = (int(hours * 3600 * 1000000) for hours in args.wifi_outage)
+        sim.clock.schedule(start, lambda: setattr(sim.wifi, "available", False))
+        sim.clock.schedule(end, lambda: setattr(sim.wifi, "available", True))
+
+    ntp = LocalNTPServer(sim.clock)
+    env = dict(DEFAULT_ENV, NTP_SERVER=ntp.host, NTP_PORT=ntp.port)
+    if args.no_report_policy:
+        env["REPORT_POLICY"] = "0"
+    if args.low_power:
+        env["LOW_POWER"] = args.low_power
+    if args.sample_interval:
+        env["SAMPLE_INTERVAL_MS"] = args.sample_interval
+    if args.control:
+        env["CONTROL_ENGINE"] = "1"
+
+    started = time.perf_counter()
+    main = sim.run_main(args.hours * 3600 * 1000, env=env)
+    power = main.power.stats() if main.power is not None else None
+    engine = main.engine.stats() if main.engine is not None else None
+    if plant is not None:
+        plant.advance(sim.clock.now_us / 1000000)
+    wall = time.perf_counter() - started
+    simulator.uninstall()
+    ntp.close()
+
+    supply_pump = sim.pin_history(1)
+    print(json.dumps({
+        "simulated_hours": args.hours,
+        "wall_seconds": round(wall, 3),
+        "speedup": round(args.hours * 3600 / wall) if wall else None,
+        "supply_pump_runs": sum(1 for _, value in supply_pump if value),
+        "mqtt_messages": len(sim.bus.messages),
+        "status_messages": len(sim.bus.on_topic("home/garden/+/status")),
+        "mqtt_connects": sim.bus.connects,
+        "ntp_requests": ntp.requests,
+        "boots": sim.boots,
+        "light_sleep_s": sim.light_sleep_ms // 1000,
+        "deep_sleep_s": sim.deep_sleep_ms // 1000,
+        "power": power,
+        "control": engine,
+        "plant": plant.stats() if plant is not None else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
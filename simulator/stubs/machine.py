@@ -0,0 +1,149 @@
+"""Simulated machine module: Pin, I2C, RTC, Timer and sleep on the virtual clock."""
+
+import calendar
+import time as _time
+
+from simulator.core import MachineReset, current
+
+PWRON_RESET = 1
+WDT_RESET = 3
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self._value = 0
+        current().pins.setdefault(id, [])
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        value = 1 if value else 0
+        if value != self._value or not current().pins[self.id]:
+            current().pins[self.id].append((current().clock.now_us // 1000, value))
+        self._value = value
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+
+class I2C:
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+        self.devices = current().i2c_devices.setdefault(id, {})
+
+    def _device(self, addr):
+        device = self.devices.get(addr)
+        if device is None:
+            raise OSError(19, "ENODEV")  # What the rp2 port raises on a NACK
+        return device
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def writeto(self, addr, buf, stop=True):
+        self._device(addr).write(bytes(buf))
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self._device(addr).read(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        data = self._device(addr).read(len(buf))
+        buf[:len(data)] = data
+
+
+class RTC:
+    def datetime(self, datetimetuple=None):
+        clock = current().clock
+        if datetimetuple is None:
+            t = _time.gmtime(clock.time())
+            return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_wday, t.tm_hour, t.tm_min, t.tm_sec, 0)
+        year, month, day, _, hour, minute, second = datetimetuple[:7]
+        target = calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+        # Like the real RTC, the written second starts now; the fraction is dropped
+        clock.rtc_offset_us = target * 1000000 - clock.epoch * 1000000 - clock.now_us
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self._entry = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=-1, hard=True):
+        self.deinit()
+        if freq > 0:
+            period = 1000 / freq
+        self.mode = mode
+        self.period_us = int(period * 1000)
+        self.callback = callback
+        self._arm()
+
+    def _arm(self):
+        self._entry = current().clock.schedule(self.period_us, self._fire)
+        current().timers.add(self)
+
+    def _fire(self):
+        self._entry = None
+        current().timers.discard(self)
+        if self.mode == self.PERIODIC:
+            self._arm()
+        if self.callback is not None:
+            self.callback(self)
+
+    def deinit(self):
+        if self._entry is not None:
+            current().clock.cancel(self._entry)
+            self._entry = None
+        current().timers.discard(self)
+
+
+def freq(hz=None):
+    return 150000000
+
+
+def unique_id():
+    return b"\xe6\x61\x41\x04\x03\x2b\x5c\x2a"
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def reset_cause():
+    return current().reset_cause
+
+
+def lightsleep(time_ms=None):
+    simulation = current()
+    simulation.light_sleep_ms += time_ms
+    simulation.clock.sleep_ms(time_ms)
+
+
+def deepsleep(time_ms=None):
+    # As on the rp2 port: sleep, then reset the chip
+    simulation = current()
+    simulation.deep_sleep_ms += time_ms
+    simulation.clock.sleep_ms(time_ms)
+    simulation.reset_cause = WDT_RESET
+    raise MachineReset()
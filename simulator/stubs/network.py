@@ -0,0 +1,63 @@
+"""Simulated network module: a WLAN station driven by the WifiModel."""
+
+from simulator.core import current
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+STAT_CONNECT_FAIL = -1
+STAT_NO_AP_FOUND = -2
+STAT_WRONG_PASSWORD = -3
+
+
+class WLAN:
+    def __init__(self, interface_id=STA_IF):
+        self.interface_id = interface_id
+        self._active = False
+        self._state = STAT_IDLE
+        self._connect_at = 0
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._state = STAT_IDLE
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        if not self._active:
+            raise OSError("WLAN interface not active")
+        self._state = STAT_CONNECTING
+        self._connect_at = current().clock.now_us + current().wifi.connect_delay_ms * 1000
+
+    def disconnect(self):
+        self._state = STAT_IDLE
+
+    def _update(self):
+        wifi = current().wifi
+        now = current().clock.now_us
+        if self._state == STAT_GOT_IP and not wifi.available:
+            self._state = STAT_IDLE
+        elif self._state == STAT_CONNECTING and now >= self._connect_at:
+            self._state = STAT_GOT_IP if wifi.available else STAT_NO_AP_FOUND
+
+    def isconnected(self):
+        self._update()
+        return self._state == STAT_GOT_IP
+
+    def status(self, param=None):
+        self._update()
+        if param == "rssi":
+            return current().wifi.rssi
+        return self._state
+
+    def ifconfig(self, *args):
+        return ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+    def config(self, *args, **kwargs):
+        if args and args[0] == "mac":
+            return b"\x28\xcd\xc1\x00\x00\x01"
+        return None
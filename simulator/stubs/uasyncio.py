@@ -0,0 +1,22 @@
+"""Simulated uasyncio module.
+
+Sleeps advance the virtual clock before yielding to the event loop, so
+coroutines see the same ticks_ms progression they would on the device.
+Time spent by concurrently sleeping tasks adds up rather than
+overlapping, which is conservative for timing measurements.
+"""
+
+import asyncio as _asyncio
+from asyncio import *  # noqa: F401,F403
+
+from simulator.core import current
+
+
+async def sleep_ms(ms):
+    current().clock.sleep_ms(ms)
+    await _asyncio.sleep(0)
+
+
+async def sleep(seconds):
+    current().clock.sleep(seconds)
+    await _asyncio.sleep(0)
@@ -0,0 +1,3 @@
+"""Simulated ujson module."""
+
+from json import dumps, loads, dump, load  # noqa: F401
@@ -0,0 +1,88 @@
+"""Simulated umqtt.simple client connected to the in-memory MessageBus."""
+
+from simulator.core import current
+
+
+class MQTTException(Exception):
+    pass
+
+
+class _Socket:
+    def __init__(self, client):
+        self.client = client
+
+    def close(self):
+        self.client._close()
+
+    def setblocking(self, flag):
+        pass
+
+
+class MQTTClient:
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
+                 ssl=None, ssl_params={}):
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.keepalive = keepalive
+        self.cb = None
+        self.sock = None
+        self.inboxes = []
+
+    def _check_link(self):
+        sim = current()
+        if not sim.wifi.available or not sim.bus.up:
+            self._close()
+            raise OSError(113, "EHOSTUNREACH")
+
+    def _close(self):
+        for inbox in self.inboxes:
+            current().bus.unsubscribe(inbox)
+        self.inboxes = []
+        self.sock = None
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def connect(self, clean_session=True):
+        self._check_link()
+        self.sock = _Socket(self)
+        current().bus.connects += 1
+        return False
+
+    def disconnect(self):
+        self._close()
+
+    def ping(self):
+        if self.sock is None:
+            raise OSError(9, "EBADF")
+        self._check_link()
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        if self.sock is None:
+            raise OSError(9, "EBADF")
+        self._check_link()
+        current().bus.publish(topic, msg)
+
+    def subscribe(self, topic, qos=0):
+        if self.sock is None:
+            raise OSError(9, "EBADF")
+        self._check_link()
+        if isinstance(topic, bytes):
+            topic = topic.decode()
+        self.inboxes.append(current().bus.subscribe(topic))
+
+    def check_msg(self):
+        if self.sock is None:
+            raise OSError(9, "EBADF")
+        self._check_link()
+        for inbox in self.inboxes:
+            if inbox:
+                topic, payload = inbox.popleft()
+                if self.cb is not None:
+                    self.cb(topic, payload)
+                return None
+        return None
+
+    def wait_msg(self):
+        return self.check_msg()
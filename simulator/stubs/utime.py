@@ -0,0 +1,46 @@
+"""Simulated utime module backed by the virtual clock."""
+
+import time as _time
+
+from simulator.clock import ticks_add, ticks_diff  # noqa: F401 (re-exported)
+from simulator.core import current
+
+
+def ticks_ms():
+    return current().clock.ticks_ms()
+
+
+def ticks_us():
+    return current().clock.ticks_us()
+
+
+def ticks_cpu():
+    return current().clock.ticks_us()
+
+
+def sleep(seconds):
+    current().clock.sleep(seconds)
+
+
+def sleep_ms(ms):
+    current().clock.sleep_ms(ms)
+
+
+def sleep_us(us):
+    current().clock.sleep_us(us)
+
+
+def time():
+    return current().clock.time()
+
+
+def time_ns():
+    return current().clock.time() * 1000000000
+
+
+def gmtime(secs=None):
+    t = _time.gmtime(time() if secs is None else secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+
+localtime = gmtime
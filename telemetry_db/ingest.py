@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+"""MQTT to Postgres telemetry ingestion daemon.
+
+Subscribes to the controllers' status topics, decodes JSON and binary
+telemetry frames, and writes readings to Postgres in micro-batches with
+COPY over a pooled connection. The hand-off queue between the MQTT thread
+and the writer is bounded: when the database falls behind, the MQTT
+callback blocks, paho stops reading the socket and the broker holds the
+backlog instead of this process.
+
+Redelivered and replayed messages are dropped by a per-device sequence
+tracker before they are queued, and the insert skips any row already
+stored, so ingest is idempotent (see sequences.py).
+
+With --workers N the daemon runs N worker processes, each with its own
+MQTT client, row queue, batch writer and connection pool. By default
+every worker subscribes to the full topic and keeps only the racks that
+hash to it, so each rack's messages stay on one worker and its dedup and
+gap counters stay exact. --shard-mode share uses an MQTT shared
+subscription instead: the broker spreads messages over the workers,
+which saves each worker from receiving every message but splits a rack
+across workers, so duplicates are left to the database and gap
+counting is off. A signal to the parent stops every worker, which
+disconnects from the broker and drains its queue before exiting.
+
+Requires: paho-mqtt>=2, psycopg>=3, psycopg-pool
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import paho.mqtt.client as mqtt
+import psycopg
+from psycopg_pool import ConnectionPool
+
+from rollups import create_rollups, expire_rollups, mark_late_rows, refresh_rollups
+from schema import PARTITION_DAYS, READINGS_COLUMNS, READINGS_TABLE, create_schema, maintain
+from sequences import SequenceTracker, create_sequences, load_sequences, save_sequences
+from telemetry_frame import decode_frame, is_binary_frame
+
+DEFAULT_TOPIC = "home/garden/+/status"
+# Message keys that describe the reading rather than being metrics
+JSON_META_KEYS = ("device", "timestamp", "seq", "boot", "status")
+# COPY lands in this per-session table; rows move to readings skipping duplicates
+STAGE_TABLE = f"{READINGS_TABLE}_stage"
+# Ranges of the frame header fields and the seq/boot columns
+MAX_SEQ = 2**32
+MAX_BOOT = 2**31
+MAX_TIMESTAMP = 2**32
+# How far back a replayed unsynced message is looked for by its sequence number
+UNSYNCED_REPLAY_WINDOW = timedelta(days=7)
+# Longest wait between retries while the database is unreachable
+RETRY_MAX_S = 30
+
+
+def device_from_topic(topic):
+    """Return the rack name segment of home/garden/<rack>/status."""
+    parts = topic.split("/")
+    return parts[2] if len(parts) > 2 else topic
+
+
+def shard_of(device, shards):
+    """Return the worker index that owns a rack, stable across processes and restarts."""
+    return zlib.crc32(device.encode()) % shards
+
+
+def _number(value):
+    """Whether a JSON value is a finite int or float (bool is not a number here)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _check_field(name, value, limit):
+    """Raise ValueError unless value is None or an integer in [0, limit)."""
+    if value is None:
+        return
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value < limit:
+        raise ValueError(f"bad {name}: {value!r}")
+
+
+def decode_payload(topic, payload, received=None):
+    """Decode one MQTT message into readings rows.
+
+    Rows are (time, device, metric, value, seq, boot, unsynced) tuples
+    matching READINGS_COLUMNS. A message without a timestamp (the
+    controller clock was not set yet) gets the receive time and unsynced
+    True. Raises ValueError on a malformed payload, including a timestamp,
+    seq or boot of the wrong type or out of range.
+    """
+    received = received if received is not None else time.time()
+    device = device_from_topic(topic)
+    if is_binary_frame(payload):
+        frame = decode_frame(payload)
+        timestamp = frame["timestamp"]
+        seq = frame["seq"]
+        boot = frame["boot"]
+        metrics = frame["metrics"]
+    else:
+        try:
+            message = json.loads(payload)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ValueError(f"bad JSON payload: {e}") from e
+        if not isinstance(message, dict):
+            raise ValueError("JSON payload is not an object")
+        timestamp = message.get("timestamp")
+        seq = message.get("seq")
+        boot = message.get("boot", 0 if seq is not None else None)
+        # Non-numeric keys are not metrics; NaN and infinity are not readings
+        metrics = {
+            key: float(value)
+            for key, value in message.items()
+            if key not in JSON_META_KEYS and _number(value)
+        }
+    unsynced = not timestamp
+    if unsynced:
+        timestamp = received
+    elif not _number(timestamp) or not 0 < timestamp < MAX_TIMESTAMP:
+        raise ValueError(f"bad timestamp: {timestamp!r}")
+    _check_field("seq", seq, MAX_SEQ)
+    _check_field("boot", boot, MAX_BOOT)
+    when = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return [(when, device, metric, value, seq, boot, unsynced) for metric, value in metrics.items()]
+
+
+class IngestMetrics:
+    """Thread-safe counters for throughput, lag and batch sizes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.messages = 0
+        self.rows = 0
+        self.batches = 0
+        self.decode_errors = 0
+        self.write_errors = 0
+        self.dead_letters = 0  # Rows the database rejected
+        self.duplicates = 0  # Messages dropped by the sequence tracker
+        self.db_duplicates = 0  # Rows the insert found already stored
+        self.last_batch_rows = 0
+        self.max_batch_rows = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.blocked_ms = 0.0
+
+    def record_batch(self, rows, lag_ms):
+        with self.lock:
+            self.batches += 1
+            self.rows += rows
+            self.last_batch_rows = rows
+            self.max_batch_rows = max(self.max_batch_rows, rows)
+            self.last_lag_ms = lag_ms
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self, queue_depth=0):
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                "uptime_s": round(elapsed, 1),
+                "messages": self.messages,
+                "rows": self.rows,
+                "rows_per_s": round(self.rows / elapsed, 1),
+                "batches": self.batches,
+                "avg_batch_rows": round(self.rows / self.batches, 1) if self.batches else 0,
+                "last_batch_rows": self.last_batch_rows,
+                "max_batch_rows": self.max_batch_rows,
+                "last_lag_ms": round(self.last_lag_ms, 1),
+                "max_lag_ms": round(self.max_lag_ms, 1),
+                "queue_depth": queue_depth,
+                "blocked_ms": round(self.blocked_ms, 1),
+                "decode_errors": self.decode_errors,
+                "write_errors": self.write_errors,
+                "dead_letters": self.dead_letters,
+                "duplicates": self.duplicates,
+                "db_duplicates": self.db_duplicates,
+            }
+
+
+class BatchWriter(threading.Thread):
+    """Drains the row queue and writes micro-batches with COPY.
+
+    Each batch is copied into a temporary staging table and moved into
+    readings with INSERT ... ON CONFLICT DO NOTHING, so rows already
+    stored (a replay older than the tracker's window, or any repeat after
+    a restart) are skipped instead of failing the batch. Connection errors
+    are retried until the database is back; a batch the database rejects
+    is split until the bad rows are found, and those go to the dead_letter
+    file while the rest commit.
+    """
+
+    def __init__(self, pool, rows, metrics, batch_size=1000, batch_interval=1.0, dead_letter=None):
+        super().__init__(name="batch-writer", daemon=True)
+        self.pool = pool
+        self.rows = rows
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.dead_letter = dead_letter
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not (self.stopping.is_set() and self.rows.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def _next_batch(self):
+        """Collect rows until the batch is full or the interval runs out."""
+        batch = []
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.rows.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        # Each queue item is (received monotonic time, row)
+        oldest = batch[0][0]
+        inserted, rejected = self._insert_isolating(batch)
+        if inserted + rejected < len(batch):
+            self.metrics.increment("db_duplicates", len(batch) - inserted - rejected)
+        self.metrics.record_batch(len(batch), (time.monotonic() - oldest) * 1000)
+
+    def _insert(self, batch):
+        """Insert a batch in one transaction and return the rows stored."""
+        columns = ", ".join(READINGS_COLUMNS)
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} "
+                    f"(LIKE {READINGS_TABLE} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                )
+                with cur.copy(f"COPY {STAGE_TABLE} ({columns}) FROM STDIN") as copy:
+                    for _, row in batch:
+                        copy.write_row(row)
+                # The unique index includes time, which for an unsynced row is the
+                # receive time and differs on every replay; match those by seq
+                cur.execute(
+                    f"INSERT INTO {READINGS_TABLE} ({columns}) "
+                    f"SELECT {columns} FROM {STAGE_TABLE} s "
+                    "WHERE NOT (s.unsynced AND s.seq IS NOT NULL AND EXISTS ("
+                    f"SELECT 1 FROM {READINGS_TABLE} r WHERE r.device = s.device AND r.boot = s.boot "
+                    "AND r.seq = s.seq AND r.metric = s.metric AND r.time > s.time - %s AND r.time <= s.time)) "
+                    "ON CONFLICT DO NOTHING",
+                    (UNSYNCED_REPLAY_WINDOW,),
+                )
+                inserted = cur.rowcount
+                # Replays older than the rollup lookback would otherwise never be rolled up
+                mark_late_rows(cur, STAGE_TABLE)
+                return inserted
+
+    def _insert_retrying(self, batch):
+        """Insert a batch, waiting out connection errors however long they last.
+
+        The queue fills while this waits, which blocks the MQTT callback:
+        an outage turns into backpressure on the broker, not lost rows.
+        """
+        delay = 1
+        while True:
+            try:
+                return self._insert(batch)
+            except psycopg.OperationalError as e:
+                self.metrics.increment("write_errors")
+                print(f"Database unavailable writing {len(batch)} rows, retrying in {delay}s: {e}",
+                      file=sys.stderr)
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_S)
+
+    def _insert_isolating(self, batch):
+        """Insert a batch, splitting it to find rows the database rejects.
+
+        Returns (rows stored, rows sent to the dead-letter file).
+        """
+        try:
+            return self._insert_retrying(batch), 0
+        except Exception as e:
+            self.metrics.increment("write_errors")
+            if len(batch) == 1:
+                self._dead_letter(batch[0][1], e)
+                return 0, 1
+        half = len(batch) // 2
+        first = self._insert_isolating(batch[:half])
+        second = self._insert_isolating(batch[half:])
+        return first[0] + second[0], first[1] + second[1]
+
+    def _dead_letter(self, row, error):
+        """Keep a row the database refused, so it can be fixed and loaded by hand."""
+        self.metrics.increment("dead_letters")
+        print(f"Rejected row {row!r}: {error}", file=sys.stderr)
+        if not self.dead_letter:
+            return
+        record = dict(zip(READINGS_COLUMNS, row), error=str(error))
+        record["time"] = record["time"].isoformat()
+        try:
+            with open(self.dead_letter, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"Error writing dead letter: {e}", file=sys.stderr)
+
+    def stop(self):
+        self.stopping.set()
+
+
+def create_tables(conn, args):
+    """Create the readings, rollup and sequence tables before any worker starts."""
+    create_schema(conn, args.partition_interval)
+    create_rollups(conn)
+    create_sequences(conn)
+
+
+class TelemetryIngest:
+    """Wires the MQTT subscription to the batch writer.
+
+    One instance is one worker; with a single worker it is the whole
+    daemon. Worker 0 also runs partition maintenance and rollups.
+    """
+
+    def __init__(self, args, worker=0, workers=1, stopping=None, setup=True):
+        self.args = args
+        self.worker = worker
+        self.workers = workers
+        self.name = f"worker {worker}" if workers > 1 else "ingest"
+        # Racks are split by hash unless the broker shares the subscription out
+        self.sharded = workers > 1 and args.shard_mode == "hash"
+        self.track_sequences = workers == 1 or self.sharded
+        self.metrics = IngestMetrics()
+        self.sequences = SequenceTracker(args.dedup_window)
+        self.rows = queue.Queue(maxsize=args.queue_size)
+        self.pool = ConnectionPool(args.dsn, min_size=1, max_size=args.pool_size, open=True)
+        with self.pool.connection() as conn:
+            if setup:
+                create_tables(conn, args)
+            if self.track_sequences:
+                load_sequences(conn, self.sequences, owns=self.owns)
+        self.writer = BatchWriter(
+            self.pool, self.rows, self.metrics, args.batch_size, args.batch_interval, args.dead_letter
+        )
+        client_id = args.client_id if workers == 1 else f"{args.client_id}-{worker}"
+        self.client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2, client_id=client_id, clean_session=False
+        )
+        if args.mqtt_user:
+            self.client.username_pw_set(args.mqtt_user, args.mqtt_password)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.topic = args.topic
+        if workers > 1 and args.shard_mode == "share":
+            self.topic = f"$share/{args.share_group}/{args.topic}"
+        self.stopping = stopping if stopping is not None else threading.Event()
+
+    def owns(self, device):
+        """Whether this worker ingests a rack's messages."""
+        return not self.sharded or shard_of(device, self.workers) == self.worker
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            print(f"MQTT connect failed: {reason_code}", file=sys.stderr)
+            return
+        print(f"Connected to MQTT broker, {self.name} subscribing to {self.topic}")
+        client.subscribe(self.topic, qos=1)
+
+    def _on_message(self, client, userdata, msg):
+        # Another worker owns this rack; skip it before paying for the decode
+        if self.sharded and not self.owns(device_from_topic(msg.topic)):
+            return
+        self.metrics.increment("messages")
+        try:
+            rows = decode_payload(msg.topic, msg.payload)
+        except ValueError as e:
+            self.metrics.increment("decode_errors")
+            print(f"Skipping message on {msg.topic}: {e}", file=sys.stderr)
+            return
+        except Exception as e:
+            # paho re-raises callback errors and would stop the network loop
+            self.metrics.increment("decode_errors")
+            print(f"Skipping message on {msg.topic}: unexpected {type(e).__name__}: {e}", file=sys.stderr)
+            return
+        # Every row of a message carries its device, seq and boot
+        if rows and self.track_sequences and not self.sequences.observe(rows[0][1], rows[0][5], rows[0][4]):
+            self.metrics.increment("duplicates")
+            return
+        received = time.monotonic()
+        for row in rows:
+            # Blocks when the writer is behind; this is the backpressure path
+            if self.rows.full():
+                started = time.monotonic()
+                self.rows.put((received, row))
+                self.metrics.increment("blocked_ms", (time.monotonic() - started) * 1000)
+            else:
+                self.rows.put((received, row))
+
+    def report(self):
+        label = "Ingest metrics" if self.workers == 1 else f"Ingest metrics ({self.name})"
+        print(f"{label}:", json.dumps(self.metrics.snapshot(self.rows.qsize())))
+
+    def refresh_rollups(self):
+        """Fold newly closed buckets into the rollup tables."""
+        try:
+            with self.pool.connection() as conn:
+                refresh_rollups(conn)
+                expire_rollups(conn)
+        except Exception as e:
+            print(f"Error refreshing rollups: {e}", file=sys.stderr)
+
+    def save_sequences(self):
+        """Write the changed per-device sequence counters for the gap report."""
+        try:
+            with self.pool.connection() as conn:
+                save_sequences(conn, self.sequences)
+        except Exception as e:
+            print(f"Error saving sequence counters: {e}", file=sys.stderr)
+
+    def maintain_partitions(self):
+        """Pre-create upcoming partitions and expire old ones."""
+        try:
+            with self.pool.connection() as conn:
+                maintain(conn, self.args.retention_days, self.args.partition_interval)
+        except Exception as e:
+            print(f"Error maintaining partitions: {e}", file=sys.stderr)
+
+    def serve_metrics(self):
+        ingest = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/gaps"):
+                    # Per-device sequence counters: /gaps or /gaps/<rack>
+                    device = self.path[len("/gaps/"):] or None
+                    body = json.dumps(ingest.sequences.report(device)).encode()
+                else:
+                    body = json.dumps(ingest.metrics.snapshot(ingest.rows.qsize())).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        # Worker i serves on metrics_port + i
+        server = ThreadingHTTPServer(("0.0.0.0", self.args.metrics_port + self.worker), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        return server
+
+    def run(self):
+        self.writer.start()
+        if self.args.metrics_port:
+            self.serve_metrics()
+        self.client.connect(self.args.mqtt_host, self.args.mqtt_port, keepalive=60)
+        self.client.loop_start()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: self.stopping.set())
+        # [interval, callable, next due] for each periodic job
+        jobs = [
+            [self.args.report_interval, self.report, time.monotonic() + self.args.report_interval],
+        ]
+        if self.track_sequences:
+            jobs.append([self.args.report_interval, self.save_sequences,
+                         time.monotonic() + self.args.report_interval])
+        if self.worker == 0:
+            jobs.append([self.args.maintenance_interval, self.maintain_partitions, time.monotonic()])
+            jobs.append([self.args.rollup_interval, self.refresh_rollups, time.monotonic()])
+        try:
+            while True:
+                job = min(jobs, key=lambda job: job[2])
+                if self.stopping.wait(max(0.0, job[2] - time.monotonic())):
+                    break
+                job[1]()
+                job[2] = time.monotonic() + job[0]
+            print(f"Shutting down {self.name}, draining {self.rows.qsize()} queued rows...")
+        finally:
+            # Stop taking messages first; unacknowledged ones stay with the broker
+            self.client.disconnect()
+            self.client.loop_stop()
+            self.writer.stop()
+            self.writer.join()
+            if self.track_sequences:
+                self.save_sequences()
+            self.pool.close()
+            self.report()
+
+
+def run_worker(args, worker, workers, stopping):
+    """Entry point of one worker process."""
+    # The parent turns Ctrl-C into a coordinated stop; don't die half way through a batch
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    TelemetryIngest(args, worker, workers, stopping, setup=False).run()
+
+
+class IngestSupervisor:
+    """Starts the worker processes, restarts any that die and stops them together."""
+
+    def __init__(self, args):
+        self.args = args
+        self.stopping = multiprocessing.Event()
+        self.processes = {}  # worker index -> Process
+
+    def _spawn(self, worker):
+        process = multiprocessing.Process(
+            target=run_worker, name=f"ingest-worker-{worker}",
+            args=(self.args, worker, self.args.workers, self.stopping),
+        )
+        process.start()
+        self.processes[worker] = process
+
+    def run(self):
+        # Create tables once, before the workers race to do it
+        with psycopg.connect(self.args.dsn) as conn:
+            create_tables(conn, self.args)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.stopping.set())
+        for worker in range(self.args.workers):
+            self._spawn(worker)
+        print(f"Started {self.args.workers} ingest workers ({self.args.shard_mode} sharding)")
+        while not self.stopping.wait(1.0):
+            for worker, process in list(self.processes.items()):
+                if not process.is_alive():
+                    print(f"Ingest worker {worker} exited with {process.exitcode}, restarting",
+                          file=sys.stderr)
+                    self._spawn(worker)
+        print(f"Stopping {len(self.processes)} ingest workers, waiting up to {self.args.drain_timeout} s to drain")
+        deadline = time.monotonic() + self.args.drain_timeout
+        for worker, process in self.processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f"Ingest worker {worker} did not drain in time, terminating", file=sys.stderr)
+                process.terminate()
+                process.join()
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mqtt-host", default=env("MQTT_SERVER", "localhost"))
+    parser.add_argument("--mqtt-port", type=int, default=int(env("MQTT_PORT", "1883")))
+    parser.add_argument("--mqtt-user", default=env("MQTT_USER"))
+    parser.add_argument("--mqtt-password", default=env("MQTT_PASSWORD"))
+    parser.add_argument("--client-id", default=env("INGEST_CLIENT_ID", "telemetry-ingest"))
+    parser.add_argument("--topic", default=DEFAULT_TOPIC)
+    parser.add_argument("--dsn", default=env("DATABASE_URL", "postgresql://localhost/telemetry"))
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per COPY")
+    parser.add_argument("--batch-interval", type=float, default=1.0, help="max seconds a row waits")
+    parser.add_argument("--queue-size", type=int, default=20000, help="rows buffered before backpressure")
+    parser.add_argument("--dead-letter", default="ingest_dead_letter.jsonl",
+                        help="append rows the database rejects to this file ('' to only log them)")
+    parser.add_argument("--metrics-port", type=int, default=0, help="serve metrics JSON on this port")
+    parser.add_argument("--workers", type=int, default=1, help="ingest worker processes")
+    parser.add_argument("--shard-mode", choices=("hash", "share"), default="hash",
+                        help="split racks across workers by hash, or with an MQTT shared subscription")
+    parser.add_argument("--share-group", default="telemetry-ingest", help="shared subscription group name")
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="seconds the workers get to drain on shutdown")
+    parser.add_argument("--dedup-window", type=int, default=8192,
+                        help="sequence numbers per device checked for duplicates in memory")
+    parser.add_argument("--report-interval", type=float, default=60.0)
+    parser.add_argument("--partition-interval", choices=sorted(PARTITION_DAYS), default="day")
+    parser.add_argument("--retention-days", type=int, default=365)
+    parser.add_argument("--maintenance-interval", type=float, default=3600.0,
+                        help="seconds between partition maintenance runs")
+    parser.add_argument("--rollup-interval", type=float, default=60.0,
+                        help="seconds between rollup refreshes")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.workers > 1:
+        IngestSupervisor(args).run()
+    else:
+        TelemetryIngest(args).run()
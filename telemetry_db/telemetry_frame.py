@@ -0,0 +1,103 @@
+"""Server-side codec for the binary telemetry frames sent by the controllers.
+
+The layout mirrors picoHydroController/telemetry_frame.py; keep the two in step.
+"""
+
+import struct
+
+FRAME_VERSION = 2
+# Version 1 frames predate the boot id; they decode with boot 0
+HEADER_FORMATS = {1: "<BBHIIB", 2: "<BBHHIIB"}
+HEADER_FORMAT = HEADER_FORMATS[FRAME_VERSION]
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+METRIC_FORMAT = "<Bi"
+METRIC_SIZE = struct.calcsize(METRIC_FORMAT)
+CRC_SIZE = 2
+SCALE = 100
+
+# Metrics missing from the frame stayed within their deadband and carry
+# forward from earlier frames (see rollups.query_filled)
+FLAG_PARTIAL = 0x01
+
+METRIC_NAMES = {
+    1: "temperature",
+    2: "humidity",
+    3: "supply_pump",
+    4: "salt_pump",
+    5: "light",
+    6: "rssi",
+}
+METRIC_IDS = {name: metric_id for metric_id, name in METRIC_NAMES.items()}
+
+
+def crc16(data: bytes) -> int:
+    """Return the CRC-16/CCITT-FALSE of data."""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def is_binary_frame(payload: bytes) -> bool:
+    """Tell a binary frame from a JSON debug payload, which starts with '{'."""
+    return len(payload) > 0 and payload[0] in HEADER_FORMATS
+
+
+def decode_frame(payload: bytes) -> dict:
+    """Decode a binary telemetry frame.
+
+    Raises ValueError if the frame is truncated, has an unknown version or
+    fails its CRC check.
+    """
+    if not payload:
+        raise ValueError("telemetry frame too short")
+    version = payload[0]
+    header_format = HEADER_FORMATS.get(version)
+    if header_format is None:
+        raise ValueError(f"unsupported telemetry frame version {version}")
+    header_size = struct.calcsize(header_format)
+    if len(payload) < header_size + CRC_SIZE:
+        raise ValueError("telemetry frame too short")
+    if version == 1:
+        _, flags, device_id, seq, timestamp, count = struct.unpack_from(header_format, payload)
+        boot = 0
+    else:
+        _, flags, device_id, boot, seq, timestamp, count = struct.unpack_from(header_format, payload)
+    end = header_size + count * METRIC_SIZE
+    if len(payload) != end + CRC_SIZE:
+        raise ValueError("telemetry frame length does not match metric count")
+    (crc,) = struct.unpack_from("<H", payload, end)
+    if crc != crc16(payload[:end]):
+        raise ValueError("telemetry frame CRC mismatch")
+
+    metrics = {}
+    for offset in range(header_size, end, METRIC_SIZE):
+        metric_id, value = struct.unpack_from(METRIC_FORMAT, payload, offset)
+        name = METRIC_NAMES.get(metric_id, f"metric_{metric_id}")
+        metrics[name] = value / SCALE
+    return {
+        "device_id": device_id,
+        "flags": flags,
+        "boot": boot,
+        "seq": seq,
+        "timestamp": timestamp,
+        "metrics": metrics,
+    }
+
+
+def encode_frame(device_id: int, seq: int, timestamp: int, metrics: dict, flags: int = 0,
+                 boot: int = 0) -> bytes:
+    """Encode a frame from metric names to float values.
+
+    Used by server-side tools and load generators; the controller packs
+    frames with its own allocation-free encoder.
+    """
+    body = struct.pack(HEADER_FORMAT, FRAME_VERSION, flags, device_id, boot, seq, timestamp, len(metrics))
+    for name, value in metrics.items():
+        body += struct.pack(METRIC_FORMAT, METRIC_IDS[name], round(value * SCALE))
+    return body + struct.pack("<H", crc16(body))
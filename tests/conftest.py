@@ -0,0 +1,32 @@
+"""Shared fixtures: a simulated Pico per test (see simulator/) and the server modules."""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TELEMETRY_DB = os.path.join(REPO_ROOT, "telemetry_db")
+sys.path.insert(0, REPO_ROOT)
+
+import simulator  # noqa: E402
+
+
+@pytest.fixture
+def sim():
+    simulation = simulator.install()
+    yield simulation
+    simulator.uninstall()
+
+
+@pytest.fixture
+def telemetry_db():
+    """Import server modules by their bare names, as the daemons run them."""
+    modules = [name[:-3] for name in os.listdir(TELEMETRY_DB) if name.endswith(".py")]
+    sys.path.insert(0, TELEMETRY_DB)
+    yield importlib.import_module
+    sys.path.remove(TELEMETRY_DB)
+    # The controller has a telemetry_frame of its own
+    for name in modules:
+        sys.modules.pop(name, None)
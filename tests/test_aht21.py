@@ -0,0 +1,106 @@
+"""AHT21 fixed-point decode and CRC checks against the simulated sensor."""
+
+import pytest
+
+from simulator import AHT21Model
+
+ADDRESS = 0x38
+
+
+def frame(periphials, status, humidity_raw, temperature_raw):
+    """Build a 7-byte measurement with a valid CRC."""
+    data = bytearray((
+        status,
+        humidity_raw >> 12,
+        (humidity_raw >> 4) & 0xFF,
+        ((humidity_raw & 0x0F) << 4) | (temperature_raw >> 16),
+        (temperature_raw >> 8) & 0xFF,
+        temperature_raw & 0xFF,
+        0,
+    ))
+    data[6] = periphials.crc8(data, 6)
+    return data
+
+
+@pytest.fixture
+def sensor(sim):
+    model = sim.add_i2c_device(0, ADDRESS, AHT21Model(sim.clock, temperature=24.5, humidity=61.3))
+    periphials = sim.import_controller("periphials")
+    from machine import I2C
+
+    return periphials, model, periphials.AHT21(I2C(0), ADDRESS)
+
+
+def test_crc8_check_value(sensor):
+    periphials, _, _ = sensor
+    # CRC-8 with poly 0x31 and init 0xFF has check value 0xF7 over "123456789"
+    assert periphials.crc8(b"123456789", 9) == 0xF7
+
+
+@pytest.mark.parametrize("humidity_raw, temperature_raw", [
+    (0x00000, 0x00000),
+    (0x80000, 0x58000),
+    (0x9CE2B, 0x5F5C2),
+    (0xFFFFF, 0xFFFFF),
+])
+def test_decode_fixed_matches_float_path(sensor, humidity_raw, temperature_raw):
+    periphials, _, aht = sensor
+    data = frame(periphials, 0x18, humidity_raw, temperature_raw)
+    assert aht.decode_fixed(data)
+    # The fixed-point path truncates to hundredths
+    assert abs(aht.humidity_c100 / 100 - aht.get_humidity(data)) < 0.01
+    assert abs(aht.temperature_c100 / 100 - aht.get_temperature(data)) < 0.01
+
+
+def test_known_frame(sensor):
+    periphials, _, aht = sensor
+    assert aht.decode_fixed(frame(periphials, 0x18, 0x80000, 0x58000))
+    assert aht.humidity_c100 == 5000
+    assert aht.temperature_c100 == 1875
+
+
+def test_corrupted_crc_is_rejected(sensor):
+    periphials, _, aht = sensor
+    data = frame(periphials, 0x18, 0x80000, 0x58000)
+    data[6] ^= 0x01
+    assert not aht.decode_fixed(data)
+    assert aht.crc_errors == 1
+    assert (aht.humidity_c100, aht.temperature_c100) == (0, 0)
+
+
+def test_busy_bit_is_not_a_crc_error(sensor):
+    periphials, _, aht = sensor
+    assert not aht.decode_fixed(frame(periphials, 0x98, 0x80000, 0x58000))
+    assert aht.crc_errors == 0
+
+
+def test_read_through_simulated_bus(sim, sensor):
+    _, model, aht = sensor
+    import time
+
+    assert aht.trigger()
+    # Still converting
+    assert not aht.collect()
+    time.sleep_ms(model.conversion_ms)
+    assert aht.collect()
+    assert aht.temperature_c100 == pytest.approx(2450, abs=1)
+    assert aht.humidity_c100 == pytest.approx(6130, abs=1)
+
+    model.corrupt_next = 1
+    assert aht.trigger()
+    time.sleep_ms(model.conversion_ms)
+    assert not aht.collect()
+    assert aht.crc_errors == 1
+
+
+def test_async_driver_shares_the_decode(sim, sensor):
+    periphials, _, _ = sensor
+    import asyncio
+
+    from machine import I2C
+
+    aht = periphials.AsyncAHT21(I2C(0), ADDRESS)
+    assert asyncio.run(aht.request_status())
+    assert asyncio.run(aht.read()) is not None
+    assert aht.temperature_c100 == pytest.approx(2450, abs=1)
+    assert aht.humidity_c100 == pytest.approx(6130, abs=1)
@@ -0,0 +1,155 @@
+"""Remote commands from MQTT through the rings to the devices and back as acks."""
+
+import json
+import time
+
+import pytest
+
+
+class FakePublisher:
+    def __init__(self):
+        self.published = []
+        self.flushes = 0
+
+    def subscribe(self, topic, callback):
+        self.callback = callback
+
+    def publish(self, topic, message):
+        self.published.append((topic, message))
+
+    def flush(self):
+        self.flushes += 1
+
+
+class FakeLink:
+    connected = True
+
+    def is_connected(self):
+        return self.connected
+
+
+@pytest.fixture
+def rack(sim):
+    core = sim.import_controller("control_core")
+    periphials = sim.import_controller("periphials")
+    channel_module = sim.import_controller("command_channel")
+    scheduler = sim.import_controller("scheduler").Scheduler()
+    pump = periphials.Pump(1)
+    light = periphials.Lights(3)
+    commands = core.RecordRing(4)
+    acks = core.RecordRing(4)
+    control = core.ControlCore(
+        periphials.I2CBusManager(), {3: pump, 5: light}, core.RecordRing(4), commands,
+        scheduler=scheduler, max_pump_on_ms=300000, acks=acks,
+    )
+    publisher = FakePublisher()
+    link = FakeLink()
+    channel = channel_module.CommandChannel(
+        publisher, commands, {"supply_pump": 3, "light": 5}, "rack", max_pending=3,
+        wifi=link, max_run_ms={"supply_pump": 300000},
+    )
+    channel.start()
+
+    class Rack:
+        pass
+
+    rack = Rack()
+    rack.__dict__.update(core=core, pump=pump, light=light, commands=commands, acks=acks, control=control,
+                         publisher=publisher, link=link, channel=channel, scheduler=scheduler)
+    return rack
+
+
+def send(rack, device, payload):
+    if not isinstance(payload, str):
+        payload = json.dumps(payload)
+    rack.publisher.callback("rack/cmd/" + device, payload.encode())
+
+
+def deliver_acks(rack):
+    rack.control.apply_commands()
+    while True:
+        record = rack.acks.pop()
+        if record is None:
+            break
+        rack.channel.handle_record(record)
+
+
+def last_ack(rack):
+    topic, ack = rack.publisher.published[-1]
+    assert topic == "rack/ack"
+    return ack
+
+
+def test_run_is_applied_and_acked(rack):
+    send(rack, "supply_pump", {"action": "run", "duration_ms": 5000, "id": 17})
+    deliver_acks(rack)
+    assert rack.pump.on and rack.pump.deadline
+    ack = last_ack(rack)
+    assert (ack["id"], ack["device"], ack["action"], ack["ok"]) == (17, "supply_pump", "run", True)
+    assert rack.channel.pending == []
+
+
+@pytest.mark.parametrize("device, command, error", [
+    ("supply_pump", {"action": "run", "duration_ms": 300001}, "duration_ms too long"),
+    ("supply_pump", {"action": "schedule", "duration_ms": 3600000, "period_ms": 7200000}, "duration_ms too long"),
+    ("light", {"action": "run", "duration_ms": 2**29}, "duration_ms too long"),
+    ("light", {"action": "run", "duration_ms": 2**40}, "duration_ms too long"),
+    ("light", {"action": "schedule", "duration_ms": 60000, "period_ms": 2**29}, "period_ms too long"),
+    ("light", {"action": "run", "duration_ms": 0}, "duration_ms must be positive"),
+    ("light", {"action": "schedule", "duration_ms": 60000, "period_ms": 60000}, "period_ms must exceed duration_ms"),
+    ("light", {"action": "blink"}, "unknown action"),
+    ("heater", "on", "unknown device"),
+])
+def test_out_of_range_commands_are_refused(rack, device, command, error):
+    send(rack, device, command)
+    ack = last_ack(rack)
+    assert ack["ok"] is False and ack["error"] == error
+    assert len(rack.commands) == 0
+    assert rack.channel.rejected == 1
+
+
+def test_longest_light_run_fits_the_ticks_range(rack):
+    send(rack, "light", {"action": "run", "duration_ms": rack.core.MAX_COMMAND_MS})
+    deliver_acks(rack)
+    assert rack.light.on and last_ack(rack)["ok"] is True
+
+
+def test_malformed_payload_is_refused(rack):
+    send(rack, "light", "{not json")
+    assert last_ack(rack)["ok"] is False
+    send(rack, "light", "[1, 2]")
+    assert last_ack(rack)["error"] == "command must be a JSON object"
+
+
+def test_busy_when_too_many_commands_are_pending(rack):
+    for _ in range(3):
+        send(rack, "light", "on")
+    send(rack, "light", "off")
+    assert last_ack(rack)["error"] == "busy"
+    deliver_acks(rack)
+    assert rack.channel.acked == 3
+    assert not rack.channel.pending
+
+
+def test_unacknowledged_commands_time_out(rack):
+    send(rack, "light", {"action": "run", "duration_ms": 1000, "id": 4})
+    time.sleep_ms(2000)
+    rack.channel.expire()
+    ack = last_ack(rack)
+    assert (ack["id"], ack["ok"], ack["error"]) == (4, False, "timeout")
+    # The late ack from the control loop is not published twice
+    published = len(rack.publisher.published)
+    deliver_acks(rack)
+    assert len(rack.publisher.published) == published
+
+
+def test_acks_wait_for_the_link(rack):
+    rack.link.connected = False
+    send(rack, "light", "on")
+    deliver_acks(rack)
+    assert last_ack(rack)["ok"] is True
+    assert rack.publisher.flushes == 0
+    rack.link.connected = True
+    send(rack, "light", "off")
+    deliver_acks(rack)
+    assert rack.publisher.flushes == 1
@@ -0,0 +1,203 @@
+"""Control engine loops against a stand-in ControlCore, plus one short closed-loop plant run."""
+
+import time
+
+import pytest
+
+from simulator import AHT21Model
+from simulator.ntp import LocalNTPServer
+from simulator.plant import TrayPlant
+from simulator.run import DEFAULT_ENV, diurnal
+
+SUPPLY, SALT, LIGHT = 3, 4, 5
+TEMPERATURE, HUMIDITY = 1, 2
+
+
+class Device:
+    def __init__(self):
+        self.on = False
+
+
+class Control:
+    """The parts of ControlCore the loops read and call."""
+
+    def __init__(self):
+        self.devices = {SUPPLY: Device(), SALT: Device(), LIGHT: Device()}
+        self.on_ms = {code: 0 for code in self.devices}
+        self.plans = {}
+        self.readings = {}
+        self.readings_at = {}
+        self.inhibited = set()
+        self.runs = []
+
+    def start_run(self, code, duration_ms):
+        self.runs.append((code, duration_ms))
+        self.on_ms[code] += duration_ms
+        return True
+
+    def set_duration(self, code, duration_ms):
+        self.plans[code][0] = duration_ms
+
+    def inhibit(self, code, hold):
+        if hold:
+            self.inhibited.add(code)
+        else:
+            self.inhibited.discard(code)
+
+
+@pytest.fixture
+def engine(sim):
+    return sim.import_controller("control_engine")
+
+
+def test_pid_integral_stops_growing_at_saturation(engine):
+    pid = engine.PID(kp=1000, ki=100, kd=0, setpoint=6500, out_min=1000, out_max=15000, bias=5000)
+    # Far below setpoint for long enough to drive the output to its limit
+    for _ in range(50):
+        output = pid.update(4000, 60000)
+    assert output == 15000
+    held = pid.integral
+    for _ in range(50):
+        assert pid.update(4000, 60000) == 15000
+    assert pid.integral == held
+    assert abs(pid.integral) <= pid.integral_max
+    # With no wound-up integral to unwind, a reversed error pulls the output off the limit at once
+    assert pid.update(9000, 60000) < 15000
+
+
+def test_pid_rate_limit(engine):
+    pid = engine.PID(kp=100000, ki=0, kd=0, setpoint=6500, out_min=0, out_max=20000, bias=5000, rate=10)
+    assert pid.update(6500, 0) == 5000
+    # A huge error may only move the output 10 per second
+    assert pid.update(4000, 60000) == 5600
+
+
+def test_duty_cap_refills_up_to_capacity(sim, engine):
+    cap = engine.DutyCap(20, 3600000)
+    now = time.ticks_ms()
+    assert cap.available(now) == 72000
+    cap.take(72000)
+    assert cap.available(now) == 0
+    now = time.ticks_add(now, 10000)
+    assert cap.available(now) == 200
+    now = time.ticks_add(now, 10 * 3600000)
+    assert cap.available(now) == 72000
+
+
+def test_dose_loop_ratio_and_min_interval(sim, engine):
+    control = Control()
+    loop = engine.DoseLoop(control, SALT, SUPPLY, ratio_permille=40, min_interval_ms=600000)
+    now = time.ticks_ms()
+    loop.update(now)
+    control.on_ms[SUPPLY] += 50000
+    loop.update(now)
+    assert control.runs == [(SALT, 2000)]
+
+    # Owed again, but within the minimum interval
+    control.on_ms[SUPPLY] += 50000
+    now = time.ticks_add(now, 300000)
+    loop.update(now)
+    assert len(control.runs) == 1
+
+    # Never while the source is running
+    now = time.ticks_add(now, 300000)
+    control.devices[SUPPLY].on = True
+    loop.update(now)
+    assert len(control.runs) == 1
+    control.devices[SUPPLY].on = False
+    loop.update(now)
+    assert control.runs[-1] == (SALT, 2000)
+    assert loop.dosed_ms == control.on_ms[SUPPLY] * 40 // 1000
+
+
+def test_dose_loop_respects_duty_cap(sim, engine):
+    control = Control()
+    cap = engine.DutyCap(1, 3600000)  # 3.6 s an hour
+    loop = engine.DoseLoop(control, SALT, SUPPLY, ratio_permille=100, min_interval_ms=0, cap=cap)
+    now = time.ticks_ms()
+    loop.update(now)
+    control.on_ms[SUPPLY] += 100000
+    loop.update(now)
+    assert control.runs == [(SALT, 3600)]
+    assert loop.owed == 6400
+    loop.update(now)
+    assert loop.capped == 1 and len(control.runs) == 1
+
+
+def test_rule_loop_hysteresis_and_hold(sim, engine):
+    control = Control()
+    loop = engine.RuleLoop(control, LIGHT, TEMPERATURE, high=3000, low=2800, min_hold_ms=600000)
+    now = time.ticks_ms()
+    control.readings[TEMPERATURE] = 2900
+    loop.update(now)
+    assert LIGHT not in control.inhibited
+
+    control.readings[TEMPERATURE] = 3100
+    loop.update(now)
+    assert LIGHT in control.inhibited
+
+    # Cooled below low, but the hold has not lasted long enough
+    control.readings[TEMPERATURE] = 2700
+    loop.update(time.ticks_add(now, 300000))
+    assert LIGHT in control.inhibited
+
+    # Hold long enough, but still inside the hysteresis band
+    control.readings[TEMPERATURE] = 2900
+    loop.update(time.ticks_add(now, 700000))
+    assert LIGHT in control.inhibited
+
+    control.readings[TEMPERATURE] = 2700
+    loop.update(time.ticks_add(now, 700000))
+    assert LIGHT not in control.inhibited
+    assert loop.holds == 1
+
+
+class SlowLoop:
+    def __init__(self, sim, name, order, cost_us):
+        self.sim = sim
+        self.name = name
+        self.order = order
+        self.cost_us = cost_us
+
+    def update(self, now):
+        self.order.append(self.name)
+        self.sim.clock.advance_us(self.cost_us)
+
+
+def test_tick_defers_loops_past_the_budget(sim, engine):
+    order = []
+    control_engine = engine.ControlEngine(Control(), budget_us=2000)
+    for name in "abcde":
+        control_engine.add(SlowLoop(sim, name, order, 800))
+
+    control_engine.tick()
+    # The third update takes the tick past 2000 us; d and e wait
+    assert order == ["a", "b", "c"]
+    assert control_engine.deferred == 2
+    assert control_engine.over_budget == 1
+
+    order.clear()
+    control_engine.tick()
+    # The deferred loops go first next time
+    assert order == ["d", "e", "a"]
+    assert control_engine.deferred == 4
+
+
+def test_closed_loop_plant_run(sim):
+    plant = TrayPlant(sim.pins, diurnal(22.0, 4.0), diurnal(50.0, -5.0))
+    sim.add_i2c_device(1, 0x38, AHT21Model(sim.clock, plant.temperature, plant.humidity))
+    ntp = LocalNTPServer(sim.clock)
+    try:
+        env = dict(DEFAULT_ENV, NTP_SERVER=ntp.host, NTP_PORT=ntp.port, CONTROL_ENGINE="1")
+        sim.run_main(6 * 3600 * 1000, env=env)
+    finally:
+        ntp.close()
+    plant.advance(sim.clock.now_us / 1000000)
+    stats = plant.stats()
+    # Open loop pumps 4.5 L in 6 h and keeps the tray waterlogged
+    assert 0.5 < stats["pumped_l"] < 2.5
+    assert stats["drained_l"] == 0
+    assert stats["wet_h"] == 0 and stats["dry_h"] == 0
+    # DOSE_PER_MILLE=40 at 2 mL/s of salt against 25 mL/s of water is 3.2 mL/L,
+    # less whatever dose is still owed when the run ends
+    assert 2.4 < stats["salt_ml_per_l"] < 3.6
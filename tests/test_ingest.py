@@ -0,0 +1,137 @@
+"""Ingest decoding and the batch writer's retry and bad-row isolation, without a database."""
+
+import json
+import queue
+
+import pytest
+
+pytest.importorskip("paho.mqtt.client")
+pytest.importorskip("psycopg_pool")
+psycopg = pytest.importorskip("psycopg")
+
+TOPIC = "home/garden/south_rack_barley/status"
+NOW = 1767225600
+
+
+@pytest.fixture
+def ingest(telemetry_db):
+    return telemetry_db("ingest")
+
+
+@pytest.fixture
+def frames(telemetry_db):
+    return telemetry_db("telemetry_frame")
+
+
+def test_binary_frame(ingest, frames):
+    payload = frames.encode_frame(7, 42, NOW, {"temperature": 22.41, "humidity": 58.73}, boot=3)
+    rows = ingest.decode_payload(TOPIC, payload)
+    assert {row[2]: row[3] for row in rows} == {"temperature": 22.41, "humidity": 58.73}
+    when, device, _, _, seq, boot, unsynced = rows[0]
+    assert (when.timestamp(), device, seq, boot, unsynced) == (NOW, "south_rack_barley", 42, 3, False)
+
+
+def test_json_payload_keeps_only_finite_numbers(ingest):
+    payload = json.dumps({
+        "device": "SOUTH_RACK_BARLEY", "status": "active", "timestamp": NOW, "seq": 5,
+        "temperature": 22.4, "humidity": 58, "light": True, "note": "x", "rssi": float("nan"),
+    })
+    rows = ingest.decode_payload(TOPIC, payload)
+    assert sorted((row[2], row[3]) for row in rows) == [("humidity", 58.0), ("temperature", 22.4)]
+    # A JSON seq without a boot belongs to boot 0
+    assert {(row[4], row[5]) for row in rows} == {(5, 0)}
+
+
+def test_missing_timestamp_uses_the_receive_time(ingest):
+    rows = ingest.decode_payload(TOPIC, json.dumps({"seq": 1, "boot": 2, "temperature": 20}), received=NOW + 5)
+    assert rows[0][0].timestamp() == NOW + 5
+    assert rows[0][6] is True
+
+
+@pytest.mark.parametrize("message", [
+    {"timestamp": "soon", "temperature": 20},
+    {"timestamp": -1, "temperature": 20},
+    {"timestamp": 2**32, "temperature": 20},
+    {"timestamp": NOW, "seq": -1, "temperature": 20},
+    {"timestamp": NOW, "seq": 2**32, "temperature": 20},
+    {"timestamp": NOW, "seq": 1.5, "temperature": 20},
+    {"timestamp": NOW, "seq": True, "temperature": 20},
+    {"timestamp": NOW, "seq": 1, "boot": 2**31, "temperature": 20},
+    [1, 2],
+])
+def test_bad_fields_are_rejected(ingest, message):
+    with pytest.raises(ValueError):
+        ingest.decode_payload(TOPIC, json.dumps(message))
+
+
+@pytest.mark.parametrize("payload", [b"\xff\xfe", b"{not json", b"\x02\x00\x01"])
+def test_malformed_payloads_are_rejected(ingest, payload):
+    with pytest.raises(ValueError):
+        ingest.decode_payload(TOPIC, payload)
+
+
+def test_corrupted_frame_is_rejected(ingest, frames):
+    payload = bytearray(frames.encode_frame(7, 1, NOW, {"temperature": 20.0}))
+    payload[-3] ^= 0x01
+    with pytest.raises(ValueError, match="CRC"):
+        ingest.decode_payload(TOPIC, bytes(payload))
+
+
+def test_shards_are_stable_and_cover_every_worker(ingest):
+    racks = [f"rack_{i}" for i in range(200)]
+    assert [ingest.shard_of(rack, 4) for rack in racks] == [ingest.shard_of(rack, 4) for rack in racks]
+    assert {ingest.shard_of(rack, 4) for rack in racks} == {0, 1, 2, 3}
+    assert ingest.device_from_topic(TOPIC) == "south_rack_barley"
+
+
+class Rejecting:
+    """BatchWriter whose database refuses some rows and is unreachable for a while."""
+
+    def __init__(self, ingest, bad=(), outages=0, dead_letter=None):
+        class Writer(ingest.BatchWriter):
+            def _insert(writer, batch):
+                writer.calls.append(len(batch))
+                if writer.outages:
+                    writer.outages -= 1
+                    raise psycopg.OperationalError("connection refused")
+                if any(row[3] in bad for _, row in batch):
+                    raise psycopg.errors.NumericValueOutOfRange("value out of range")
+                writer.stored.extend(row for _, row in batch)
+                return len(batch)
+
+        self.metrics = ingest.IngestMetrics()
+        self.writer = Writer(None, queue.Queue(), self.metrics, dead_letter=dead_letter)
+        self.writer.calls = []
+        self.writer.stored = []
+        self.writer.outages = outages
+
+
+def batch(ingest, values):
+    rows = ingest.decode_payload(TOPIC, json.dumps({"timestamp": NOW, "seq": 1, "temperature": 0}))
+    when, device, metric, _, seq, boot, unsynced = rows[0]
+    return [(0.0, (when, device, metric, float(value), seq, boot, unsynced)) for value in values]
+
+
+def test_bad_rows_are_isolated_and_dead_lettered(ingest, tmp_path):
+    dead_letter = tmp_path / "dead.jsonl"
+    rejecting = Rejecting(ingest, bad={3.0, 6.0}, dead_letter=str(dead_letter))
+    rejecting.writer._write(batch(ingest, range(8)))
+    assert sorted(row[3] for row in rejecting.writer.stored) == [0, 1, 2, 4, 5, 7]
+    snapshot = rejecting.metrics.snapshot()
+    assert (snapshot["dead_letters"], snapshot["rows"], snapshot["db_duplicates"]) == (2, 8, 0)
+    records = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [record["value"] for record in records] == [3.0, 6.0]
+    assert records[0]["device"] == "south_rack_barley" and "out of range" in records[0]["error"]
+    # Bisecting 8 rows around 2 bad ones takes far fewer than one insert per row
+    assert len(rejecting.writer.calls) < 16
+
+
+def test_connection_errors_are_retried_not_dropped(ingest, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(ingest.time, "sleep", sleeps.append)
+    rejecting = Rejecting(ingest, outages=7)
+    rejecting.writer._write(batch(ingest, range(4)))
+    assert len(rejecting.writer.stored) == 4
+    assert rejecting.metrics.snapshot()["dead_letters"] == 0
+    # Backoff doubles up to RETRY_MAX_S
+    assert sleeps == [1, 2, 4, 8, 16, 30, 30]
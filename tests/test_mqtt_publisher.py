@@ -0,0 +1,48 @@
+"""Publisher batching and connection gating over the simulated broker."""
+
+import time
+
+import pytest
+
+
+class FakeLink:
+    connected = False
+
+    def is_connected(self):
+        return self.connected
+
+
+@pytest.fixture
+def link():
+    return FakeLink()
+
+
+@pytest.fixture
+def publisher(sim, link):
+    module = sim.import_controller("mqtt_publisher")
+    return module.MQTTPublisher("rack", "sim-broker", 1883, "sim", "sim", batch_size=2,
+                                flush_interval_ms=1000, link=link)
+
+
+def test_subscriber_does_not_reconnect_while_the_link_is_down(sim, link, publisher):
+    publisher.subscribe("rack/cmd/+", lambda topic, payload: None)
+    for _ in range(10):
+        time.sleep_ms(1000)
+        publisher.poll()
+    assert sim.bus.connects == 0 and publisher.client is None
+
+    link.connected = True
+    time.sleep_ms(1000)
+    publisher.poll()
+    assert sim.bus.connects == 1 and publisher.client is not None
+
+
+def test_full_batch_waits_for_the_link(sim, link, publisher):
+    publisher.publish("rack/status", b"1")
+    publisher.publish("rack/status", b"2")
+    assert sim.bus.connects == 0 and publisher.count == 2
+
+    link.connected = True
+    publisher.publish("rack/status", b"3")
+    assert sim.bus.connects == 1
+    assert publisher.count == 0 and publisher.published == 3
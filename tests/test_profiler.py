@@ -0,0 +1,43 @@
+"""Profiler wrappers record every call and keep the wrapped behaviour."""
+
+import pytest
+
+
+@pytest.fixture
+def profiler(sim):
+    return sim.import_controller("profiler").Profiler()
+
+
+@pytest.mark.parametrize("arity", [-1, 0, 1, 2, 3])
+def test_wrap_times_each_call(profiler, arity):
+    args = tuple(range(arity if arity >= 0 else 2))
+    timed = profiler.wrap("probe", arity)(lambda *args: sum(args))
+    assert timed(*args) == sum(args)
+    assert timed(*args) == sum(args)
+    assert profiler.counts[profiler.probes["probe"]] == 2
+
+
+def test_wrap_records_calls_that_raise(profiler):
+    def fail(a):
+        raise OSError(a)
+
+    timed = profiler.wrap("fail", 1)(fail)
+    with pytest.raises(OSError):
+        timed(5)
+    assert profiler.counts[profiler.probes["fail"]] == 1
+
+
+def test_instrument_with_arity_binds_as_a_method(profiler):
+    class Sensor:
+        def collect(self):
+            return self
+
+    profiler.instrument(Sensor, "collect", "sensor.collect", 1)
+    sensor = Sensor()
+    assert sensor.collect() is sensor
+    assert profiler.counts[profiler.probes["sensor.collect"]] == 1
+
+
+def test_wrap_rejects_unsupported_arity(profiler):
+    with pytest.raises(ValueError):
+        profiler.wrap("wide", 4)(print)
@@ -0,0 +1,118 @@
+"""Read API latest-value state with its ETags, and the series query cache, without a database."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("paho.mqtt.client")
+pytest.importorskip("psycopg_pool")
+pytest.importorskip("psycopg")
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def read_api(telemetry_db):
+    return telemetry_db("read_api")
+
+
+@pytest.fixture
+def clock(read_api, monkeypatch):
+    class Clock:
+        now = 1000.0
+
+        def monotonic(self):
+            return self.now
+
+    clock = Clock()
+    monkeypatch.setattr(read_api.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def row(seconds, device, metric, value):
+    return (T0 + timedelta(seconds=seconds), device, metric, value, 1, 0, False)
+
+
+def test_latest_keeps_the_newest_reading(read_api):
+    state = read_api.LatestState()
+    assert state.update([row(10, "north", "temperature", 21.5), row(10, "north", "humidity", 60.0)]) == 2
+    # A replayed older reading does not roll the value back
+    assert state.update([row(5, "north", "temperature", 19.0)]) == 0
+    body, _ = state.snapshot("north")
+    assert body == {"north": {
+        "humidity": {"time": "2026-01-01T00:00:10+00:00", "value": 60.0},
+        "temperature": {"time": "2026-01-01T00:00:10+00:00", "value": 21.5},
+    }}
+
+
+def test_etags_follow_changes(read_api):
+    state = read_api.LatestState()
+    state.update([row(10, "north", "temperature", 21.5), row(10, "south", "temperature", 22.0)])
+    everything = state.etag()
+    north = state.etag("north")
+    south = state.etag("south")
+    assert north != south
+    assert state.snapshot()[1] == everything
+    assert state.snapshot("north")[1] == north
+
+    state.update([row(5, "north", "temperature", 19.0)])
+    assert state.etag() == everything  # Ignored rows change nothing
+
+    state.update([row(20, "north", "temperature", 21.7)])
+    assert state.etag() != everything
+    assert state.etag("north") != north
+    assert state.etag("south") == south
+
+
+def test_unknown_device(read_api):
+    state = read_api.LatestState()
+    assert state.etag("north") is None
+    assert state.snapshot("north") == (None, None)
+
+
+def test_etags_do_not_match_across_restarts(read_api):
+    first = read_api.LatestState()
+    second = read_api.LatestState()
+    second.epoch = first.epoch + 1
+    for state in (first, second):
+        state.update([row(10, "north", "temperature", 21.5)])
+    assert first.etag() != second.etag()
+
+
+def test_etag_matches(read_api):
+    assert read_api.etag_matches('"1-2"', '"1-2"')
+    assert read_api.etag_matches('"0-1", W/"1-2"', '"1-2"')
+    assert read_api.etag_matches("*", '"1-2"')
+    assert not read_api.etag_matches('"1-3"', '"1-2"')
+    assert not read_api.etag_matches(None, '"1-2"')
+
+
+def test_cache_entries_expire_after_their_ttl(read_api, clock):
+    cache = read_api.QueryCache()
+    etag = cache.put("a", b"[1]", ttl=30)
+    assert cache.get("a") == (etag, b"[1]")
+    clock.now += 29.9
+    assert cache.get("a") is not None
+    clock.now += 0.1
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"], stats["entries"]) == (2, 1, 1, 0)
+
+
+def test_cache_evicts_the_least_recently_used(read_api, clock):
+    cache = read_api.QueryCache(max_entries=2)
+    cache.put("a", b"a", ttl=60)
+    cache.put("b", b"b", ttl=60)
+    cache.get("a")  # Now "b" is the least recently used
+    cache.put("c", b"c", ttl=60)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evicted"] == 1
+
+
+def test_cache_etag_depends_on_the_body(read_api, clock):
+    cache = read_api.QueryCache()
+    assert cache.put("a", b"[1]", ttl=60) == cache.put("b", b"[1]", ttl=60)
+    assert cache.put("a", b"[2]", ttl=60) != cache.put("b", b"[1]", ttl=60)
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,118 @@
+"""Report-by-exception: deadbands, heartbeats, alarms and the fast sampling they request."""
+
+import pytest
+
+TEMPERATURE, HUMIDITY = 1, 2
+
+
+@pytest.fixture
+def policy(sim):
+    report_policy = sim.import_controller("report_policy")
+    policy = report_policy.ReportPolicy(heartbeat_ms=900000)
+    policy.configure(TEMPERATURE, deadband=20, low=1500, high=3000, rate=50)
+    policy.configure(HUMIDITY, deadband=100)
+    return policy
+
+
+def test_first_sample_is_a_full_report(policy):
+    metrics, full = policy.select({TEMPERATURE: 2000, HUMIDITY: 5000}, now=0)
+    assert full
+    assert metrics == [(TEMPERATURE, 2000), (HUMIDITY, 5000)]
+
+
+def test_changes_inside_the_deadband_are_suppressed(policy):
+    policy.select({TEMPERATURE: 2000, HUMIDITY: 5000}, now=0)
+    assert policy.select({TEMPERATURE: 2010, HUMIDITY: 5050}, now=60000) == ([], False)
+    # Drift is measured from the last value sent, not the last sample
+    assert policy.select({TEMPERATURE: 2020, HUMIDITY: 5099}, now=120000) == ([(TEMPERATURE, 2020)], False)
+    assert policy.select({TEMPERATURE: 2020, HUMIDITY: 5100}, now=180000) == ([(HUMIDITY, 5100)], False)
+    assert policy.stats()["values_suppressed"] == 4
+
+
+def test_heartbeat_reports_everything(policy):
+    policy.select({TEMPERATURE: 2000, HUMIDITY: 5000}, now=0)
+    assert policy.select({TEMPERATURE: 2000, HUMIDITY: 5000}, now=899999) == ([], False)
+    metrics, full = policy.select({TEMPERATURE: 2000, HUMIDITY: 5000}, now=900000)
+    assert full
+    assert len(metrics) == 2
+    assert policy.select({TEMPERATURE: 2000, HUMIDITY: 5000}, now=960000) == ([], False)
+
+
+def test_alarm_reports_every_sample_and_the_one_that_clears_it(policy):
+    policy.select({TEMPERATURE: 2900}, now=0)
+    sent = []
+    for i, value in enumerate((3005, 3006, 3006, 2995, 2994), start=1):
+        metrics, _ = policy.select({TEMPERATURE: value}, now=i * 600000 // 5)
+        sent.append(metrics)
+    assert sent == [[(TEMPERATURE, 3005)], [(TEMPERATURE, 3006)], [(TEMPERATURE, 3006)],
+                    [(TEMPERATURE, 2995)], []]
+
+
+def test_fast_change_is_reported_inside_the_deadband(policy):
+    policy.select({TEMPERATURE: 2000}, now=0)
+    policy.select({TEMPERATURE: 2019}, now=60000)  # 19 per minute, under the rate limit
+    assert policy.select({TEMPERATURE: 2000}, now=72000) == ([(TEMPERATURE, 2000)], False)
+    assert policy.fast
+
+
+def test_fast_follows_alarm_and_rate(policy):
+    policy.select({TEMPERATURE: 2000, HUMIDITY: 5000}, now=0)
+    assert not policy.fast
+    policy.select({TEMPERATURE: 1400, HUMIDITY: 5000}, now=600000)
+    assert policy.fast  # Below the alarm band
+    policy.select({TEMPERATURE: 1400, HUMIDITY: 5000}, now=1200000)
+    assert policy.fast
+    policy.select({TEMPERATURE: 1600, HUMIDITY: 5000}, now=2400000)
+    assert not policy.fast  # Back in band, moving 10 per minute
+
+
+def test_first_sample_in_alarm_requests_fast_sampling(policy):
+    policy.select({TEMPERATURE: 3500}, now=0)
+    assert policy.fast
+
+
+def test_disabled_policy_reports_every_sample_in_full(sim):
+    policy = sim.import_controller("report_policy").ReportPolicy(enabled=False)
+    for now in (0, 1000, 2000):
+        assert policy.select({TEMPERATURE: 2000}, now=now) == ([(TEMPERATURE, 2000)], True)
+
+
+def test_restore_does_not_force_a_full_report(sim, policy):
+    policy.select({TEMPERATURE: 2000, HUMIDITY: 5000})
+    saved = policy.snapshot()
+    report_policy = sim.import_controller("report_policy")
+    woken = report_policy.ReportPolicy(heartbeat_ms=900000)
+    woken.configure(TEMPERATURE, deadband=20, low=1500, high=3000, rate=50)
+    woken.configure(HUMIDITY, deadband=100)
+    woken.restore(saved, 300000)
+    assert woken.select({TEMPERATURE: 2005, HUMIDITY: 5000}) == ([], False)
+    overslept = report_policy.ReportPolicy(heartbeat_ms=900000)
+    overslept.restore(saved, 900000)
+    assert overslept.select({TEMPERATURE: 2005, HUMIDITY: 5000})[1]
+
+
+def test_control_core_switches_sampling_interval(sim):
+    core = sim.import_controller("control_core")
+    periphials = sim.import_controller("periphials")
+    control = core.ControlCore(periphials.I2CBusManager(), {}, core.RecordRing(4), core.RecordRing(4))
+    rounds = []
+    control.after_collect = rounds.append
+    control.start_sampling(60000)
+
+    def run(ms):
+        for _ in range(ms // 1000):
+            control.scheduler.run_pending()
+            control.step()
+            sim.clock.sleep_ms(1000)
+
+    run(120000)
+    assert len(rounds) == 2
+    control.set_sample_interval(10000)
+    run(60000)
+    assert control.sample_event.period == 10000
+    assert len(rounds) == 8
+    control.set_sample_interval(60000)
+    run(120000)
+    assert control.stats()["sample_interval_ms"] == 60000
+    # The round already armed at the fast interval still runs
+    assert [b - a for a, b in zip(rounds, rounds[1:])][-3:] == [10000, 10000, 60000]
@@ -0,0 +1,66 @@
+"""Scheduler dispatch and the turn-offs devices schedule on it."""
+
+import time
+
+import pytest
+
+
+@pytest.fixture
+def scheduler(sim):
+    return sim.import_controller("scheduler").Scheduler()
+
+
+@pytest.fixture
+def lights(sim):
+    return sim.import_controller("periphials").Lights(3)
+
+
+def run_for(scheduler, ms):
+    """Advance the virtual clock a second at a time, dispatching as the loop would."""
+    for _ in range(ms // 1000):
+        time.sleep_ms(1000)
+        scheduler.run_pending()
+
+
+def test_events_run_in_due_order(scheduler):
+    ran = []
+    scheduler.call_later(300, lambda: ran.append("c"))
+    scheduler.call_later(100, lambda: ran.append("a"))
+    scheduler.call_later(200, lambda: ran.append("b"))
+    cancelled = scheduler.call_later(150, lambda: ran.append("x"))
+    scheduler.cancel(cancelled)
+    time.sleep_ms(300)
+    assert scheduler.run_pending() == 3
+    assert ran == ["a", "b", "c"]
+    assert scheduler.time_until_next() is None
+
+
+def test_longer_run_replaces_a_shorter_one(scheduler, lights):
+    lights._start_run(scheduler, 60000)
+    run_for(scheduler, 10000)
+    lights._start_run(scheduler, 3600000)
+    # The first run's turn-off at 60 s must not end the second run
+    run_for(scheduler, 60000)
+    assert lights.on and lights.pin.value() == 1
+    run_for(scheduler, 3540000)
+    assert not lights.on and lights.pin.value() == 0
+
+
+def test_shorter_run_replaces_a_longer_one(scheduler, lights):
+    lights._start_run(scheduler, 3600000)
+    lights._start_run(scheduler, 5000)
+    run_for(scheduler, 5000)
+    assert not lights.on
+    assert scheduler.time_until_next() is None
+
+
+def test_off_and_on_cancel_the_pending_turn_off(scheduler, lights):
+    lights._start_run(scheduler, 60000)
+    lights.device_off()
+    assert scheduler.time_until_next() is None
+
+    lights._start_run(scheduler, 60000)
+    # A plain "on" holds the device on until it is switched off
+    lights.device_on()
+    run_for(scheduler, 120000)
+    assert lights.on
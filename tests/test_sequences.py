@@ -0,0 +1,122 @@
+"""Duplicate suppression and gap accounting in the ingest sequence tracker."""
+
+import pytest
+
+from telemetry_db import sequences
+
+
+@pytest.fixture
+def tracker():
+    return sequences.SequenceTracker(window=8, boots_kept=2)
+
+
+def counters(tracker, device="rack", boot=1):
+    return dict(zip(sequences.COUNTERS, tracker.streams[(device, boot)].row()))
+
+
+def feed(tracker, seqs, device="rack", boot=1):
+    return [tracker.observe(device, boot, seq) for seq in seqs]
+
+
+def test_in_order_stream(tracker):
+    assert feed(tracker, range(1, 6)) == [True] * 5
+    assert counters(tracker) == {"first_seq": 1, "last_seq": 5, "received": 5, "duplicates": 0,
+                                 "missing": 0, "late": 0, "stale": 0}
+
+
+def test_duplicates_inside_the_window_are_dropped(tracker):
+    feed(tracker, [1, 2, 3])
+    assert feed(tracker, [3, 1, 2]) == [False, False, False]
+    assert counters(tracker)["duplicates"] == 3
+    assert counters(tracker)["received"] == 3
+
+
+def test_late_arrival_fills_the_gap(tracker):
+    feed(tracker, [1, 2, 5])
+    assert counters(tracker)["missing"] == 2
+    assert feed(tracker, [4, 3, 4]) == [True, True, False]
+    c = counters(tracker)
+    assert (c["missing"], c["late"], c["duplicates"]) == (0, 2, 1)
+
+
+def test_jump_past_the_window_resets_the_mask(tracker):
+    feed(tracker, [1, 2])
+    feed(tracker, [100])
+    c = counters(tracker)
+    assert (c["last_seq"], c["missing"]) == (100, 97)
+    # Only the new high-water mark is marked seen
+    assert tracker.streams[("rack", 1)].mask == 1
+    assert feed(tracker, [99, 99]) == [True, False]
+
+
+def test_stale_arrival_counts_as_a_fill(tracker):
+    feed(tracker, [1, 2, 50])
+    assert counters(tracker)["missing"] == 47
+    # 10 is older than the window: unchecked, but no longer counted as lost
+    assert feed(tracker, [10]) == [True]
+    c = counters(tracker)
+    assert (c["stale"], c["missing"], c["received"]) == (1, 46, 4)
+    assert sequences.loss(c["missing"], c["first_seq"], c["last_seq"]) == pytest.approx(46 / 50)
+
+
+def test_replay_of_a_whole_outage_leaves_no_loss(tracker):
+    feed(tracker, [1])
+    feed(tracker, [40])
+    # The store-and-forward backlog arrives after the live message, mostly past the window
+    feed(tracker, range(2, 40))
+    c = counters(tracker)
+    assert c["missing"] == 0
+    assert c["received"] == 40
+    assert c["stale"] + c["late"] == 38
+
+
+def test_stale_missing_never_goes_negative(tracker):
+    feed(tracker, range(1, 21))
+    feed(tracker, [3, 4])
+    c = counters(tracker)
+    assert (c["stale"], c["missing"]) == (2, 0)
+
+
+def test_arrival_before_the_first_widens_the_stream(tracker):
+    feed(tracker, [5, 6])
+    assert feed(tracker, [3]) == [True]
+    c = counters(tracker)
+    assert (c["first_seq"], c["missing"], c["late"]) == (3, 1, 0)
+
+
+def test_restored_stream_passes_old_numbers_through(tracker):
+    tracker.restore([("rack", 1, 1, 100, 95, 0, 5, 0, 0)])
+    # The saved high-water mark itself is known to have arrived
+    assert feed(tracker, [100, 90]) == [False, True]
+    c = counters(tracker)
+    assert (c["stale"], c["missing"], c["duplicates"]) == (1, 4, 1)
+    assert feed(tracker, [101, 101]) == [True, False]
+
+
+def test_least_recently_active_boot_is_evicted(tracker):
+    feed(tracker, [1], boot=1)
+    feed(tracker, [1], boot=2)
+    tracker.streams[("rack", 1)].touched = 0
+    tracker.streams[("rack", 2)].touched = 1
+    feed(tracker, [1], boot=3)
+    assert set(tracker.streams) == {("rack", 2), ("rack", 3)}
+    assert tracker.boots["rack"] == [2, 3]
+    # Other devices keep their own boots
+    feed(tracker, [1], device="other", boot=1)
+    assert ("other", 1) in tracker.streams
+
+
+def test_unchecked_sequence_types_pass(tracker):
+    assert tracker.observe("rack", 1, None)
+    assert tracker.observe("rack", "1", 5)
+    assert tracker.streams == {}
+
+
+def test_take_dirty_returns_each_change_once(tracker):
+    feed(tracker, [1, 2])
+    feed(tracker, [1], boot=2)
+    rows = tracker.take_dirty()
+    assert sorted(row[:2] for row in rows) == [("rack", 1), ("rack", 2)]
+    assert tracker.take_dirty() == []
+    feed(tracker, [3])
+    assert [row[:4] for row in tracker.take_dirty()] == [("rack", 1, 1, 3)]
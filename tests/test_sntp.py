@@ -0,0 +1,183 @@
+"""SNTP client tests against the simulator's local stand-in time server."""
+
+import calendar
+import datetime
+import socket
+
+import pytest
+
+from simulator.ntp import LocalNTPServer
+
+
+class RecordingScheduler:
+    def __init__(self):
+        self.calls = []
+
+    def call_later(self, delay_ms, callback):
+        self.calls.append((delay_ms, callback))
+
+
+def true_ms(sim, offset_s=0.0):
+    return sim.clock.epoch * 1000 + sim.clock.now_us // 1000 + int(offset_s * 1000)
+
+
+def utc(text):
+    return calendar.timegm(tuple(map(int, text.replace("T", "-").replace(":", "-").split("-"))) + (0, 0, 0))
+
+
+@pytest.fixture
+def sntp(sim):
+    return sim.import_controller("sntp")
+
+
+@pytest.fixture
+def server(sim):
+    servers = []
+
+    def start(**kwargs):
+        servers.append(LocalNTPServer(sim.clock, **kwargs))
+        return servers[-1]
+
+    yield start
+    for s in servers:
+        s.close()
+
+
+def client(sntp, ntp, **kwargs):
+    return sntp.TimeSync(timezone="UTC", host=ntp.host, port=ntp.port, **kwargs)
+
+
+def test_offset_is_applied_to_the_rtc(sim, sntp, server):
+    sim.clock.now_us = 123456
+    sync = client(sntp, server(offset_s=2.75))
+    assert sync.sync()
+    # The RTC must tick over exactly when the served time does, not up to 999 ms late
+    for _ in range(20):
+        assert sim.clock.time() == true_ms(sim, 2.75) // 1000
+        sim.clock.sleep_ms(130)
+
+
+def test_scheduled_rtc_write_does_not_block(sim, sntp, server):
+    scheduler = sim.import_controller("scheduler").Scheduler()
+    sim.clock.now_us = 123456
+    sync = client(sntp, server(offset_s=2.75))
+    before = sim.clock.time()
+    started = sim.clock.now_us
+    assert sync.sync(scheduler)
+    # Only the exchange itself ran; the RTC write waits for the second boundary
+    assert sim.clock.now_us - started < 50000
+    assert sim.clock.time() == before
+    wait = scheduler.time_until_next()
+    assert 0 < wait < 1000
+    sim.clock.sleep_ms(wait)
+    scheduler.run_pending()
+    for _ in range(20):
+        assert sim.clock.time() == true_ms(sim, 2.75) // 1000
+        sim.clock.sleep_ms(130)
+
+
+def test_server_address_is_looked_up_once(sim, sntp, server, monkeypatch):
+    sync = client(sntp, server())
+    assert sync.sync()
+    lookups = []
+    monkeypatch.setattr(sntp.socket, "getaddrinfo", lambda *args: lookups.append(args))
+    sim.clock.sleep_ms(1000)
+    assert sync.sync()
+    assert lookups == []
+
+
+def test_half_round_trip_correction(sim, sntp, server):
+    ntp = server(offset_s=-1.5, delay_ms=400)
+    sync = client(sntp, ntp)
+    now_ms, rtt = sync._query()
+    assert rtt == 400
+    # The reply is 200 ms old when it arrives; uncorrected it would be 200 ms behind
+    assert abs(now_ms - true_ms(sim, -1.5)) <= 1
+
+
+def test_drift_is_measured_between_syncs(sim, sntp, server):
+    ntp = server()
+    sync = client(sntp, ntp)
+    assert sync.sync()
+    sim.clock.sleep_ms(3600000)
+    ntp.offset_s = 0.036  # The local clock lost 36 ms in an hour
+    assert sync.sync()
+    assert sync.offset_ms == pytest.approx(36, abs=1)
+    assert sync.drift_ppm == pytest.approx(10, abs=1)
+    # 250 ms of error at 10 ppm takes about 7 hours
+    assert sync.interval_ms == pytest.approx(25000000, rel=0.1)
+
+
+def test_kiss_o_death_is_not_used(sim, sntp, server):
+    sync = client(sntp, server(offset_s=3600, kiss_code="RATE"))
+    before = sim.clock.time()
+    assert not sync.sync()
+    assert (sync.kisses, sync.failures, sync.synced) == (1, 1, False)
+    assert sim.clock.time() == before
+
+    scheduler = RecordingScheduler()
+    sync.start(scheduler, retry_ms=60000)
+    delay, run = scheduler.calls.pop()
+    run()
+    # The retry backs off to the minimum interval instead of hammering the server
+    assert scheduler.calls[-1][0] == sync.min_interval_ms
+
+
+def test_timeout_falls_back_to_the_running_clock(sim, sntp, server):
+    sync = client(sntp, server(offset_s=5), timeout_ms=100)
+    assert sync.sync()
+    rtc = sim.clock.time() - sim.clock.now_us // 1000000
+    silent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    silent.bind(("127.0.0.1", 0))
+    try:
+        # Point the client at a server that never answers
+        sync.port = silent.getsockname()[1]
+        sync.addr = None
+        sim.clock.sleep_ms(sync.interval_ms)
+        assert sync.due()
+        assert not sync.sync()
+    finally:
+        silent.close()
+    # The RTC keeps its last setting and the previous sync still counts
+    assert sync.failures == 1
+    assert sync.synced and sync.syncs == 1
+    assert sim.clock.time() - sim.clock.now_us // 1000000 == rtc
+
+    scheduler = RecordingScheduler()
+    sync.start(scheduler, retry_ms=60000)
+    scheduler.calls.pop()[1]()
+    assert scheduler.calls[-1][0] == 60000
+
+
+def test_sync_age_survives_ticks_wrap(sim, sntp, server):
+    # Start just short of the ticks_ms wrap
+    sim.clock.tick_offset_ms = (1 << 30) - 5000
+    sync = client(sntp, server())
+    assert sync.sync()
+    for _ in range(8 * 24):
+        sim.clock.sleep_ms(3600000)
+        assert sync.due()
+    assert sync.sync_age_ms() == pytest.approx(8 * 86400000, abs=1000)
+
+
+@pytest.mark.parametrize("when, zone, hours", [
+    ("2026-03-08T07:59:59", "Chicago", -6),
+    ("2026-03-08T08:00:00", "Chicago", -5),
+    ("2026-11-01T06:59:59", "Chicago", -5),
+    ("2026-11-01T07:00:00", "Chicago", -6),
+    ("2026-03-08T09:59:59", "Los_Angeles", -8),
+    ("2026-03-08T10:00:00", "Los_Angeles", -7),
+    ("2026-11-01T05:59:59", "New_York", -4),
+    ("2026-11-01T06:00:00", "New_York", -5),
+    ("2026-07-01T12:00:00", "Phoenix", -7),
+    ("2026-07-01T12:00:00", "UTC", 0),
+])
+def test_dst_boundaries(sntp, when, zone, hours):
+    assert sntp.utc_offset(utc(when), zone) == hours * 3600
+
+
+def test_civil_date_round_trip(sntp):
+    for days in range(-800, 40000, 37):
+        date = datetime.date(1970, 1, 1) + datetime.timedelta(days=days)
+        assert sntp.civil_from_days(days) == (date.year, date.month, date.day, date.weekday())
+        assert sntp.days_from_civil(date.year, date.month, date.day) == days
@@ -0,0 +1,34 @@
+"""Controller frame encoder against the server-side decoder."""
+
+import pytest
+
+from telemetry_db import telemetry_frame as server_frame
+
+
+@pytest.fixture
+def frame(sim):
+    return sim.import_controller("telemetry_frame")
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 8])
+def test_pack_round_trips(frame, count):
+    encoder = frame.FrameEncoder(7, boot=3)
+    metrics = [(metric_id, 2241 + metric_id) for metric_id in range(1, count + 1)]
+    decoded = server_frame.decode_frame(bytes(encoder.pack(1767225600, metrics)))
+    assert (decoded["device_id"], decoded["boot"], decoded["seq"]) == (7, 3, 1)
+    assert decoded["timestamp"] == 1767225600
+    assert sorted(decoded["metrics"].values()) == [(2241 + i) / 100 for i in range(1, count + 1)]
+
+
+def test_pack_reuses_its_views(frame):
+    encoder = frame.FrameEncoder(1)
+    metrics = ((frame.TEMPERATURE, 2241), (frame.HUMIDITY, 5873))
+    first = encoder.pack(1767225600, metrics)
+    assert encoder.pack(1767225601, metrics) is first
+    assert len(first) == 27
+
+
+def test_pack_rejects_too_many_metrics(frame):
+    encoder = frame.FrameEncoder(1, max_metrics=1)
+    with pytest.raises(ValueError):
+        encoder.pack(0, ((1, 0), (2, 0)))